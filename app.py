@@ -1,29 +1,40 @@
+import time
+INICIO_RERUN = time.perf_counter()
+
 import streamlit as st
-from sqlalchemy import create_engine, text
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import PromptTemplate
-import datetime
-import json
-import re
-import pandas as pd
 import locale  # Para formatar moeda
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cache_sql import CacheGeracaoSQL, calcular_versao_dicionario
+from intencao import ClassificadorIntencao
+from dicionario import TABELAS_DICIONARIO, DicionarioSobDemanda, mapeamento_do_snapshot, sincronizar_dicionario
+from cache_resultados import CacheResultados
+from consulta_sql import ParserBlocosSQL
+from exportacao import exportar_consulta
+from governador import Governador
+from especulacao import EstatisticasEspeculacao, FluxoEspeculativo
+from historico import HistoricoConversa, resumir_resultado
+from mensagens import (
+    PASTA_SESSOES, ArmazemResultados, com_nomes_de_exibicao, limpar_sessoes_antigas, rotulo_do_bloco,
+)
+from pipeline import ConsultaBloqueada, criar_pipeline
+from rastreamento import Rastreador, rastrear, span, submeter_com_rastro
+from recursos import (
+    CONFIG_POOL, MedidorLatencia, consulta_excedeu_timeout, criar_engine, criar_llm, ler_prompt_template,
+    montar_connection_string,
+)
+from prompt import CacheContextoGemini
+from replica import ReplicaAnalitica
 
 # =======================================
-# 0️⃣ REGRAS DE EXEMPLO (Substitua pelo seu arquivo)
+# 0️⃣ REGRAS DE NEGÓCIO DO PROTHEUS
 # =======================================
-# Como eu não tenho seu arquivo 'regras_protheus', adicionei exemplos.
-# Substitua estas linhas pelo seu 'from regras_protheus import ...'
-REGRAS_NEGOCIO = """
-- O campo D_E_L_E_T_ = ' ' sempre indica um registro ativo.
-- O campo E_N_D_E_R_E_C_O (sem 'Ç') é usado para endereço.
-- Use a filial '01' como padrão para tabelas exclusivas (modo 'E').
-"""
-REGRAS_PROTHEUS = {
-    "SA1": "Cadastro de Clientes (Modo C)",
-    "SB1": "Cadastro de Produtos (Modo C)",
-    "SC5": "Cabeçalho de Pedidos de Venda (Modo E)",
-    "SD2": "Itens de Venda da Nota Fiscal (Modo E)"
-}
+# Relacionamentos, modos e chaves usados também na recuperação de esquema
+from regras_protheus import REGRAS_NEGOCIO, REGRAS_PROTHEUS
+from texto import estimar_tokens
+
 # =======================================
 # 1️⃣ CONFIGURAÇÕES E CONEXÕES
 # =======================================
@@ -44,164 +55,237 @@ except KeyError as e:
     st.stop()
 
 
-CONNECTION_STRING = (
-    f"mssql+pyodbc://{DB_USER}:{DB_PASS}@{DB_HOST}/"
-    f"{DB_NAME}?driver=ODBC+Driver+17+for+SQL+Server"
-)
+CONNECTION_STRING = montar_connection_string(DB_USER, DB_PASS, DB_HOST, DB_NAME)
+
+# Recursos do processo: criados uma única vez e compartilhados por todas as sessões.
+# (O Streamlit reexecuta este script a cada interação; nada abaixo deve ser recriado.)
+
+@st.cache_resource(show_spinner=False)
+def obter_engine(connection_string):
+    """Engine com pool (pre-ping + recycle); a conexão de teste roda só na criação."""
+    return criar_engine(connection_string)
+
+@st.cache_resource(show_spinner=False)
+def obter_llm(api_key):
+    # Modelo Único (Eficiência)
+    return criar_llm(api_key, modelo="gemini-2.5-flash")
+
+@st.cache_resource(show_spinner=False)
+def obter_medidor(nome):
+    """Um medidor por métrica (rerun, primeiro token, primeira linha), compartilhado pelas sessões."""
+    return MedidorLatencia()
 
 # Bloco try-except para a conexão inicial
 try:
-    db_engine = create_engine(CONNECTION_STRING)
-    # Testa a conexão
-    with db_engine.connect() as conn:
-        pass
+    db_engine = obter_engine(CONNECTION_STRING)
 except Exception as e:
     st.error(f"Falha ao conectar ao banco de dados: {e}")
     st.stop()
 
+llm = obter_llm(GOOGLE_API_KEY)
+medidor_rerun = obter_medidor("rerun")
+medidor_primeiro_token = obter_medidor("primeiro_token")
+medidor_primeira_linha = obter_medidor("primeira_linha")
+
+@st.cache_resource(show_spinner=False)
+def obter_rastreador():
+    """Spans por etapa de cada resposta; JSONL rotativo em .cache/rastros/."""
+    return Rastreador(caminho=".cache/rastros/rastros.jsonl", max_bytes=10 * 1024 * 1024, arquivos=5)
+
+rastreador = obter_rastreador()
 
-# Modelo Único (Eficiência)
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=GOOGLE_API_KEY, temperature=0.0)
+CAMINHO_SNAPSHOT_DICIONARIO = ".cache/dicionario_sx3.json"
 
 # =======================================
 # 2️⃣ LEITURA DO DICIONÁRIO SX3/SIX (OTIMIZADO)
 # =======================================
 
-@st.cache_data(ttl=3600, show_spinner=False)
+@st.cache_resource(ttl=300, show_spinner=False)
 def obter_mapeamento_protheus(_engine):
     """
-    Busca o dicionário de dados (SX3) de forma OTIMIZADA para o LLM.
-    Cria um mapeamento simples {tabela: {campo: "Tipo: ..., Descrição: ..."}}
+    Dicionário de dados (SX3) de forma OTIMIZADA para o LLM: {tabela: {campo: "Tipo: ..., Descrição: ..."}},
+    junto com os índices do SIX: {tabela: [[campos do índice], ...]}.
+    Parte do snapshot local em disco e relê, numa única query, só as tabelas
+    cujas marcas d'água (R_E_C_N_O_/S_T_A_M_P_) mudaram. O TTL curto serve
+    apenas para reconsultar as marcas d'água, não para recarregar tudo.
+    Retorna (mapeamento, índices, versão); cache_resource evita copiar o dicionário a cada rerun.
     """
-    tabelas = ["SC5", "SC6", "SD2", "SF2", "SB1", "SB2", "SA1", "SA2"]
-    mapeamento = {}
-    
-    with _engine.connect() as conn:
-        for tabela in tabelas:
-            try:
-                # 1. Query otimizada: Trazemos apenas o que o LLM precisa
-                query = text(f"""
-                    SELECT 
-                        X3_CAMPO, 
-                        X3_TIPO, 
-                        X3_TITULO, 
-                        X3_DESCRIC 
-                    FROM SX3010
-                    WHERE X3_ARQUIVO = '{tabela[:3]}' AND D_E_L_E_T_ = ' '
-                    ORDER BY X3_ORDEM
-                """)
-                rows = conn.execute(query).fetchall()
-                
-                if not rows:
-                    st.toast(f"ℹ️ Dicionário: Nenhum campo encontrado para {tabela} no SX3.", icon="ℹ️")
-                    continue
-
-                # 2. Cria o dicionário interno da tabela
-                mapeamento_tabela = {}
-                for r in rows:
-                    campo = r[0].strip()
-                    tipo = r[1].strip()
-                    titulo = r[2].strip()
-                    descricao = r[3].strip() # X3_DESCRIC
-
-                    # 3. Combina título e descrição para dar o máximo de contexto
-                    contexto_campo = titulo
-                    if descricao and descricao.strip() != titulo:
-                        contexto_campo = f"{titulo} ({descricao})"
-                    
-                    # 4. Cria a entrada final, muito mais leve
-                    mapeamento_tabela[campo] = f"Tipo: {tipo}, Descrição: {contexto_campo}"
-
-                mapeamento[tabela] = mapeamento_tabela
-                
-            except Exception as e:
-                st.error(f"Erro ao ler dicionário para {tabela}: {e}")
-                continue
-    return mapeamento
+    try:
+        mapeamento, indices, relidas = sincronizar_dicionario(_engine, TABELAS_DICIONARIO, CAMINHO_SNAPSHOT_DICIONARIO)
+    except Exception as e:
+        st.error(f"Erro ao ler dicionário SX3/SIX: {e}")
+        mapeamento, indices = mapeamento_do_snapshot(TABELAS_DICIONARIO, CAMINHO_SNAPSHOT_DICIONARIO)
+        relidas = []
+
+    for tabela in TABELAS_DICIONARIO:
+        if tabela not in mapeamento:
+            st.toast(f"ℹ️ Dicionário: Nenhum campo encontrado para {tabela} no SX3.", icon="ℹ️")
+    if relidas:
+        st.toast(f"📚 Dicionário atualizado: {', '.join(relidas)}", icon="📚")
+
+    # Versão do dicionário: muda sempre que o SX3 ou as regras mudarem (invalida o cache de SQL)
+    versao = calcular_versao_dicionario(mapeamento, REGRAS_NEGOCIO, REGRAS_PROTHEUS, indices)
+    return mapeamento, indices, versao
 
 with st.spinner("📚 Lendo dicionário SX3/SIX..."):
-    MAPEAMENTO_TABELAS = obter_mapeamento_protheus(db_engine)
+    MAPEAMENTO_TABELAS, INDICES_TABELAS, VERSAO_DICIONARIO = obter_mapeamento_protheus(db_engine)
     if not MAPEAMENTO_TABELAS:
+        obter_mapeamento_protheus.clear()
         st.error("Falha crítica: O mapeamento de tabelas está vazio. Verifique a conexão e a tabela SX3010.")
         st.stop()
 
-mapeamento_formatado = json.dumps(MAPEAMENTO_TABELAS, indent=2, ensure_ascii=False)
+@st.cache_resource(show_spinner=False)
+def obter_dicionario_sob_demanda(_engine):
+    """
+    Demais tabelas do ERP (SE1, SE2, SD1, SF1, SC7...): só o catálogo do SX2 é lido aqui;
+    SX3/SIX/SX9 de cada tabela vêm na primeira pergunta que precisa dela (LRU limitado).
+    """
+    if not bool(st.secrets.get("DICIONARIO_SOB_DEMANDA", True)):
+        return None
+    dicionario = DicionarioSobDemanda(_engine, max_tabelas=int(st.secrets.get("DICIONARIO_MAX_TABELAS", 32)))
+    try:
+        dicionario.carregar_catalogo()
+    except Exception as e:
+        logging.warning("Catálogo do SX2 indisponível, usando só as tabelas carregadas: %s", e)
+        return None
+    return dicionario
+
+dicionario_sob_demanda = obter_dicionario_sob_demanda(db_engine)
+
+@st.cache_resource(show_spinner=False)
+def obter_cache_sql():
+    """Cache de SQL gerado, compartilhado por todas as sessões do processo."""
+    return CacheGeracaoSQL(caminho=".cache/geracao_sql.sqlite", max_itens=500, ttl_segundos=7 * 24 * 3600)
+
+cache_sql = obter_cache_sql()
 
 # =======================================
 # 3️⃣ PROMPTS DE COMPORTAMENTO
 # =======================================
 
-intent_prompt = """
-Você é um classificador de intenção para um assistente de negócios do Protheus.
-Analise a pergunta do usuário e responda **apenas** com uma palavra:
-- "sql" → se a pergunta requer **dados reais** do banco (consultas sobre pedidos, vendas, produtos, estoques, valores, contagens, listagens, agregações, períodos, filiais, clientes, etc.)
-- "texto" → se a pergunta requer uma **resposta conceitual, explicativa, saudação, teste ou ajuda de procedimento**.
-
-Regras:
-- Perguntas curtas como "teste", "oi", "funciona?" → "texto"
-- Pedidos de definição ou explicação ("o que é SC5?", "como cadastrar produto?") → "texto"
-- Perguntas com "total", "quantidade", "por filial", "mês", "ano", "vendas" → "sql"
-- Em caso de dúvida → "texto"
-
-Pergunta:
-{pergunta}
+@st.cache_resource(show_spinner=False)
+def obter_prompt_template():
+    """Prompt principal (arquivo externo), lido uma vez por processo; o pipeline o divide em prefixo e sufixo."""
+    return ler_prompt_template("prompt_template.txt")
 
-Retorne apenas: sql ou texto
-"""
+conteudo_prompt, prompt_encontrado = obter_prompt_template()
+if not prompt_encontrado:
+    st.error("Erro: Arquivo 'prompt_template.txt' não encontrado.")
 
-short_answer_prompt = """
-Você é um assistente conversacional para usuários de negócio do Protheus.
-Responda em **português claro**, de forma **curta, direta e amigável**.
+@st.cache_resource(show_spinner=False)
+def obter_cache_contexto(api_key):
+    """Cache de contexto do Gemini para o prefixo estático do prompt (desligável em st.secrets)."""
+    if not bool(st.secrets.get("CACHE_CONTEXTO", True)):
+        return None
+    try:
+        return CacheContextoGemini(api_key, modelo="gemini-2.5-flash", ttl_segundos=3600)
+    except Exception as e:
+        logging.warning("Cache de contexto do Gemini indisponível: %s", e)
+        return None
 
-Regras:
-1. Máximo de **2 frases curtas**.
-2. Tom profissional e simpático — sem jargões técnicos.
-3. Se for uma saudação ou teste (ex: "teste", "oi"), diga algo leve, como "Tudo certo — pronto pra ajudar! 😊"
-4. Se for explicação, resuma (ex: "SC5 é o cabeçalho de pedidos, com cliente e valores.").
-5. Nunca gere SQL aqui.
+cache_contexto = obter_cache_contexto(GOOGLE_API_KEY)
 
-Pergunta:
-{pergunta}
-"""
+# =======================================
+# 4️⃣ EXECUÇÃO, SEGURANÇA E EXIBIÇÃO
+# =======================================
 
-# Carrega o prompt principal de um arquivo externo
-try:
-    prompt_template_content = open("prompt_template.txt", encoding="utf-8").read()
-except FileNotFoundError:
-    st.error("Erro: Arquivo 'prompt_template.txt' não encontrado.")
-    # Define um template de fallback caso o arquivo não exista
-    prompt_template_content = """
-    ERRO: prompt_template.txt não encontrado.
-    Pergunta: {pergunta}
-    Gere um SQL simples baseado nesta pergunta, usando {mapeamento}.
+@st.cache_resource(show_spinner=False)
+def configurar_locale():
+    """Tenta configurar o locale para R$ (Reais), uma vez por processo."""
+    for nome in ('pt_BR.UTF-8', 'Portuguese_Brazil.1252'):
+        try:
+            locale.setlocale(locale.LC_ALL, nome)
+            return True
+        except locale.Error:
+            continue
+    return False
+
+if not configurar_locale():
+    st.toast("Não foi possível configurar o locale 'pt_BR' para formatar moeda.", icon="⚠️")
+
+# Execução concorrente dos blocos SQL: timeout por consulta (configurável em st.secrets)
+TIMEOUT_CONSULTA_SEGUNDOS = int(st.secrets.get("SQL_TIMEOUT", 30))
+MAX_CONSULTAS_PARALELAS = int(st.secrets.get("SQL_MAX_PARALELAS", 4))
+
+@st.cache_resource(show_spinner=False)
+def obter_executor_consultas(max_workers):
+    """Pool de threads do processo, menor que o pool de conexões do engine."""
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="consulta_sql")
+
+executor_consultas = obter_executor_consultas(min(MAX_CONSULTAS_PARALELAS, CONFIG_POOL["pool_size"]))
+
+# Especulação: quando o classificador local não decide, o SQL começa a ser gerado
+# junto com a classificação pelo LLM (mais quota em troca de uma latência de LLM a menos)
+ESPECULAR_SQL = bool(st.secrets.get("ESPECULAR_SQL", True))
+
+# Histórico do chat: memória de resultados por sessão e mensagens renderizadas por completo a cada rerun
+MAX_MB_RESULTADOS_SESSAO = int(st.secrets.get("SESSAO_MAX_MB", 16))
+MENSAGENS_ABERTAS = int(st.secrets.get("MENSAGENS_ABERTAS", 4))
+
+# Exportação: o Streamlit guarda em memória o arquivo do botão de download enquanto ele
+# estiver na tela; acima deste tamanho o arquivo não é oferecido pelo navegador
+MAX_MB_DOWNLOAD = int(st.secrets.get("DOWNLOAD_MAX_MB", 200))
+
+@st.cache_resource(show_spinner=False)
+def limpar_resultados_de_sessoes_antigas():
+    """Remove, uma vez por processo, os resultados em disco de sessões encerradas há mais de um dia."""
+    return limpar_sessoes_antigas(PASTA_SESSOES)
+
+@st.cache_resource(show_spinner=False)
+def obter_executor_llm():
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="especulacao_llm")
+
+@st.cache_resource(show_spinner=False)
+def obter_estatisticas_especulacao():
+    return EstatisticasEspeculacao()
+
+executor_llm = obter_executor_llm()
+estatisticas_especulacao = obter_estatisticas_especulacao()
+
+@st.cache_resource(show_spinner=False)
+def obter_governador(dialeto):
     """
+    Governador de custo (plano estimado via SHOWPLAN_XML); só existe no SQL Server.
+    Limites configuráveis em st.secrets["GOVERNADOR"]; decisões no log "governador".
+    """
+    if dialeto != "mssql":
+        return None
+    logger_governador = logging.getLogger("governador")
+    if not logger_governador.handlers:
+        logger_governador.addHandler(logging.StreamHandler())
+        logger_governador.setLevel(logging.INFO)
+    return Governador(limites=dict(st.secrets.get("GOVERNADOR", {})))
 
-prompt_template = PromptTemplate(
-    input_variables=["regras", "mapeamento", "data_hoje", "pergunta", "historico"],
-    template=prompt_template_content
-)
+governador = obter_governador(db_engine.dialect.name)
 
-sql_chain = prompt_template | llm
+@st.cache_resource(show_spinner=False)
+def obter_cache_resultados():
+    """Resultados compartilhados entre sessões; TTL por tabela conforme REGRAS_PROTHEUS."""
+    return CacheResultados(REGRAS_PROTHEUS, max_bytes=256 * 1024 * 1024)
 
-# =======================================
-# 4️⃣ EXECUÇÃO, SEGURANÇA E EXIBIÇÃO
-# =======================================
+cache_resultados = obter_cache_resultados()
 
-# Tenta configurar o locale para R$ (Reais)
-try:
-    locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
-except locale.Error:
+@st.cache_resource(show_spinner=False)
+def obter_replica(_engine, _cache_resultados):
+    """
+    Réplica analítica (DuckDB sobre Parquet) para agregações, opcional: st.secrets["REPLICA_ANALITICA"]
+    com ativa = true e, se quiser, pasta, tabelas, intervalo_segundos e max_defasagem_segundos.
+    Sincroniza numa thread do processo; consultas de detalhe continuam no SQL Server.
+    """
+    config = dict(st.secrets.get("REPLICA_ANALITICA", {}))
+    if not config.pop("ativa", False):
+        return None
+    intervalo = config.pop("intervalo_segundos", 300)
     try:
-        locale.setlocale(locale.LC_ALL, 'Portuguese_Brazil.1252')
-    except locale.Error:
-        st.toast("Não foi possível configurar o locale 'pt_BR' para formatar moeda.", icon="⚠️")
+        replica = ReplicaAnalitica(**{"pasta": ".cache/replica", **config})
+    except ImportError:
+        logging.warning("Réplica analítica configurada, mas o duckdb não está instalado.")
+        return None
+    # Dados novos, alterados ou excluídos no ERP: os resultados em cache dessas tabelas ficaram velhos
+    replica.iniciar_sincronizacao_periodica(_engine, intervalo, ao_alterar=_cache_resultados.invalidar_tabela)
+    return replica
 
-# (Segurança)
-FORBIDDEN_KEYWORDS = [
-    'DELETE', 'UPDATE', 'INSERT', 'DROP', 'TRUNCATE', 
-    'ALTER', 'GRANT', 'REVOKE', 'EXEC', 'EXECUTE', 'CREATE',
-    'MERGE', 'COMMIT', 'ROLLBACK'
-]
+replica_analitica = obter_replica(db_engine, cache_resultados)
 
 def formatar_moeda(valor):
     """Tenta formatar um valor numérico como moeda (R$)."""
@@ -210,53 +294,30 @@ def formatar_moeda(valor):
     except Exception:
         return f"R$ {valor:,.2f}"
 
-def classificar_intencao(pergunta):
-    resposta = llm.invoke(intent_prompt.format(pergunta=pergunta)).content.strip().lower()
-    return "sql" if "sql" in resposta else "texto"
-
-def gerar_resposta_texto(pergunta):
-    return llm.invoke(short_answer_prompt.format(pergunta=pergunta)).content.strip()
-
-def gerar_sql_real(pergunta, historico):
-    data_hoje = datetime.date.today().strftime("%Y-%m-%d")
-    entrada = {
-        "regras": REGRAS_NEGOCIO + "\n\n" + json.dumps(REGRAS_PROTHEUS, ensure_ascii=False, indent=2),
-        "mapeamento": mapeamento_formatado,
-        "data_hoje": data_hoje,
-        "pergunta": pergunta,
-        "historico": historico,
-    }
-    resposta = sql_chain.invoke(entrada).content
-    sql_blocks = re.findall(r"```sql\s+(.*?)```", resposta, flags=re.DOTALL | re.IGNORECASE)
-    return resposta, sql_blocks
-
-def validar_e_executar_sql(sql_query):
-    """
-    (Segurança) Valida a query antes de executar.
-    Levanta um ValueError se a query for insegura.
-    """
-    sql_upper = sql_query.upper()
+@st.cache_resource(show_spinner=False)
+def obter_classificador_intencao():
+    return ClassificadorIntencao(limiar=0.85)
 
-    if not sql_upper.strip().startswith('SELECT'):
-        raise ValueError("Ação não permitida. Apenas consultas 'SELECT' são autorizadas.")
+classificador_intencao = obter_classificador_intencao()
 
-    for keyword in FORBIDDEN_KEYWORDS:
-        if keyword in sql_upper:
-            raise ValueError(f"Ação não permitida. A consulta contém a palavra-chave bloqueada: '{keyword}'.")
-    
-    try:
-        with db_engine.connect() as conn:
-            result = conn.execute(text(sql_query))
-            rows = result.mappings().all()
-            return pd.DataFrame(rows)
-    except Exception as e:
-        raise e
+@st.cache_resource(show_spinner=False)
+def obter_pipeline(versao):
+    """Etapas do chatbot (sem Streamlit) montadas para a versão atual do dicionário."""
+    return criar_pipeline(
+        db_engine, llm, conteudo_prompt, MAPEAMENTO_TABELAS, INDICES_TABELAS, versao, REGRAS_NEGOCIO, REGRAS_PROTHEUS,
+        cache_sql, cache_resultados, classificador=classificador_intencao, governador=governador,
+        cache_contexto=cache_contexto, dicionario=dicionario_sob_demanda, replica=replica_analitica,
+        timeout_consulta=TIMEOUT_CONSULTA_SEGUNDOS,
+    )
+
+pipeline = obter_pipeline(VERSAO_DICIONARIO)
 
-def exibir_dados_de_forma_inteligente(df):
+@rastrear("renderizacao")
+def exibir_dados_de_forma_inteligente(df, ha_mais=False):
     """
     (Exibição Inteligente)
-    Decide a melhor forma de exibir o dataframe no Streamlit
-    e retorna o conteúdo em markdown para salvar no histórico.
+    Decide a melhor forma de exibir o dataframe no Streamlit.
+    (O histórico guarda o resultado em Arrow, não o markdown: ver mensagens.py)
     """
     
     # --- OPÇÃO 1: KPI (Metric) ---
@@ -272,38 +333,188 @@ def exibir_dados_de_forma_inteligente(df):
                 st.metric(label=nome_coluna, value=f"{valor}")
         else:
             st.metric(label=nome_coluna, value=valor)
-        
-        # Conteúdo para salvar no histórico
-        return f"**{nome_coluna}:** {valor}\n"
+        return
 
     # --- OPÇÃO 2: TABELA MODERNA (Data Editor) ---
-    st.info("Visualização da tabela (primeiras 50 linhas):")
+    if ha_mais:
+        st.info(f"Visualização da tabela (primeiras {pipeline.linhas_por_pagina} linhas; há mais, veja abaixo):")
+    else:
+        st.info(f"Visualização da tabela ({len(df)} linhas):")
     st.data_editor(
-        df.head(50), 
+        df.head(pipeline.linhas_por_pagina), 
         use_container_width=True, 
         disabled=True, 
         hide_index=True
     )
-    
-    # Conteúdo para salvar no histórico (Markdown)
-    markdown_para_salvar = df.head(20).to_markdown(index=False)
-    if len(df) > 20:
-        markdown_para_salvar += f"\n*(... e mais {len(df)-20} linhas)*"
-        
-    return markdown_para_salvar
+
+def exibir_paginacao(sql_query, chave):
+    """
+    Navegação paginada ("carregar mais") pelo resultado completo.
+    Só uma página fica em memória; a consulta só roda com o seletor ligado.
+    """
+    if not st.toggle("📄 Navegar pelo resultado completo", key=f"{chave}_ativo"):
+        return
+    estado = st.session_state.setdefault(chave, {"offset": 0, "total": None})
+    try:
+        df, ha_mais, limite_governador = pipeline.validar_e_executar_sql(sql_query, offset=estado["offset"])
+    except Exception as e:
+        st.error(f"⚠️ Erro ao carregar a página: {e}")
+        return
+
+    st.dataframe(com_nomes_de_exibicao(df), use_container_width=True, hide_index=True)
+    col_anterior, col_proxima, col_total = st.columns(3)
+    if col_anterior.button("◀ Anterior", key=f"{chave}_anterior", disabled=estado["offset"] == 0):
+        estado["offset"] = max(estado["offset"] - pipeline.linhas_por_pagina, 0)
+        st.rerun()
+    if col_proxima.button("Carregar mais ▶", key=f"{chave}_proxima", disabled=not ha_mais):
+        estado["offset"] += pipeline.linhas_por_pagina
+        st.rerun()
+    if col_total.button("🔢 Contar total", key=f"{chave}_contar"):
+        try:
+            estado["total"] = pipeline.contar_linhas(sql_query)
+        except Exception as e:
+            st.error(f"⚠️ Erro ao contar as linhas: {e}")
+
+    faixa = f"Linhas {estado['offset'] + 1}–{estado['offset'] + len(df)}"
+    if estado["total"] is not None:
+        faixa += f" de {estado['total']}"
+    if limite_governador:
+        faixa += f" | ⚠️ limitado a {limite_governador} linhas pelo governador (exporte para o resultado completo)"
+    st.caption(faixa)
+
+def exibir_exportacao(sql_query, chave):
+    """
+    Exporta o resultado COMPLETO (não só a prévia) para CSV/Parquet em lotes,
+    com cursor do lado do servidor, e oferece o arquivo para download. O arquivo
+    é lido uma vez e fica na sessão (só a última exportação): os reruns não
+    voltam ao disco.
+    """
+    col_formato, col_exportar = st.columns([1, 2])
+    formato = col_formato.selectbox(
+        "Formato", ["CSV", "Parquet"], key=f"{chave}_formato", label_visibility="collapsed"
+    )
+    if col_exportar.button("⬇️ Exportar resultado completo", key=f"{chave}_exportar"):
+        try:
+            pipeline.verificar_exportacao(sql_query)
+            st.session_state.pop("exportacao", None)  # libera a anterior antes de ler a nova
+            with st.spinner("📦 Exportando..."):
+                exportacao = exportar_consulta(db_engine, sql_query, formato)
+            exportacao["dados"] = None
+            if exportacao["bytes"] <= MAX_MB_DOWNLOAD * 1024 * 1024:
+                with open(exportacao["caminho"], "rb") as arquivo:
+                    exportacao["dados"] = arquivo.read()
+            os.remove(exportacao["caminho"])
+            st.session_state["exportacao"] = {**exportacao, "chave": chave}
+        except Exception as e:
+            st.error(f"⚠️ Erro ao exportar: {e}")
+
+    exportacao = st.session_state.get("exportacao")
+    if exportacao and exportacao["chave"] == chave:
+        st.caption(
+            f"{exportacao['linhas']} linhas em {exportacao['segundos']:.1f}s "
+            f"({exportacao['linhas_por_segundo']:,.0f} linhas/s, {exportacao['bytes'] / 1024 / 1024:.1f} MB)"
+        )
+        if exportacao["dados"] is None:
+            st.warning(f"⚠️ O arquivo passa de {MAX_MB_DOWNLOAD} MB, o limite de download pelo navegador. "
+                       "Filtre a consulta ou gere o arquivo pelo lote (python lote.py).")
+        else:
+            st.download_button(
+                "💾 Baixar arquivo",
+                data=exportacao["dados"],
+                file_name=f"consulta.{exportacao['formato']}",
+                key=f"{chave}_baixar",
+                on_click="ignore",
+            )
+
+def exibir_bloco(bloco, chave, df=None):
+    """
+    Mensagem, dados, paginação e exportação de um bloco SQL, ao vivo ou no
+    histórico. Sem `df`, o resultado é lido do armazém da sessão.
+    """
+    getattr(st, bloco["nivel"])(bloco["mensagem"])
+    if df is None and bloco["resultado"] is not None:
+        df = armazem_resultados.obter(bloco["resultado"])
+    if df is None or df.empty:
+        return
+    exibir_dados_de_forma_inteligente(df, bloco["ha_mais"])
+    if bloco["ha_mais"]:
+        exibir_paginacao(bloco["sql"], f"pagina_{chave}")
+    exibir_exportacao(bloco["sql"], f"exportar_{chave}")
+
+def exibir_resultado_consulta(futuro, sql_query, chave):
+    """
+    Exibe o resultado de um bloco SQL executado no pool (na thread do script).
+    Retorna (bloco para o histórico do chat: SQL, mensagem e chave do resultado
+    no armazém da sessão; erro_no_banco; resumo compacto para o histórico do prompt).
+    """
+    bloco = {"sql": sql_query, "resultado": None, "linhas": 0, "colunas": [], "ha_mais": False}
+    df, erro_no_banco = None, False
+    try:
+        df, ha_mais, limite_governador = futuro.result()
+    except ConsultaBloqueada as ve:
+        bloco.update(mensagem=f"⚠️ Consulta bloqueada: {ve}", nivel="error")
+    except Exception as e:
+        if consulta_excedeu_timeout(e):
+            bloco.update(mensagem=f"⏱️ A consulta excedeu {TIMEOUT_CONSULTA_SEGUNDOS}s e foi cancelada.", nivel="error")
+        else:
+            bloco.update(mensagem="⚠️ Erro ao executar a consulta no banco.", nivel="error")
+        erro_no_banco = True
+
+    if df is None:
+        resumo = bloco["mensagem"]
+    elif df.empty:
+        bloco.update(mensagem="ℹ️ Nenhum registro encontrado.", nivel="info")
+        resumo = resumir_resultado(df)
+    else:
+        if ha_mais:
+            mensagem = f"✅ Exibindo os primeiros {len(df)} registros (há mais)."
+        else:
+            mensagem = f"✅ {len(df)} registros retornados."
+        if limite_governador:
+            mensagem += f" ⚠️ Limitado a {limite_governador} linhas pelo governador (consulta pesada para o ERP)."
+        resumo = resumir_resultado(df, ha_mais)
+        # Colunas repetidas ou sem nome ('' das colunas calculadas): o Arrow e o Streamlit exigem nomes únicos
+        df = com_nomes_de_exibicao(df)
+        bloco.update(mensagem=mensagem, nivel="success", resultado=armazem_resultados.guardar(df),
+                     linhas=len(df), colunas=list(df.columns), ha_mais=ha_mais)
+    exibir_bloco(bloco, chave, df)
+    return bloco, erro_no_banco, resumo
 
 # =======================================
 # 5️⃣ INTERFACE DE CHAT (COM CORREÇÃO DE HISTÓRICO)
 # =======================================
 
+# Overhead do rerun: tudo o que roda antes do chat (recursos, dicionário, prompts)
+medidor_rerun.registrar(INICIO_RERUN)
+
 if "messages" not in st.session_state:
     st.session_state.messages = [
         {"role": "assistant", "content": "Olá 👋! Posso gerar consultas SQL reais do Protheus ou responder perguntas simples. O que deseja saber?"}
     ]
+if "historico_conversa" not in st.session_state:
+    # Histórico enviado ao LLM: SQL + resumo dos resultados, com orçamento de tokens (não as tabelas renderizadas)
+    st.session_state.historico_conversa = HistoricoConversa()
+historico_conversa = st.session_state.historico_conversa
+if "armazem_resultados" not in st.session_state:
+    # Resultados das respostas em Arrow, com limite de memória por sessão (o excedente vai para o disco)
+    limpar_resultados_de_sessoes_antigas()
+    st.session_state.armazem_resultados = ArmazemResultados(
+        os.path.join(PASTA_SESSOES, uuid.uuid4().hex), max_bytes=MAX_MB_RESULTADOS_SESSAO * 1024 * 1024
+    )
+armazem_resultados = st.session_state.armazem_resultados
 
-for msg in st.session_state.messages:
+# Só as últimas mensagens são renderizadas por completo; nas anteriores, cada bloco
+# fica recolhido e o resultado só é lido (e enviado ao navegador) quando aberto
+for indice_msg, msg in enumerate(st.session_state.messages):
     with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
+        if msg["content"]:
+            st.markdown(msg["content"])
+        recente = indice_msg >= len(st.session_state.messages) - MENSAGENS_ABERTAS
+        for bloco in msg.get("blocos", []):
+            chave = f"{indice_msg}_{bloco['indice']}"
+            if recente or st.toggle(rotulo_do_bloco(bloco), key=f"abrir_{chave}"):
+                st.code(bloco["sql"], language="sql")
+                exibir_bloco(bloco, chave)
 
 if pergunta := st.chat_input("Digite sua pergunta sobre o Protheus..."):
     st.session_state.messages.append({"role": "user", "content": pergunta})
@@ -311,78 +522,245 @@ if pergunta := st.chat_input("Digite sua pergunta sobre o Protheus..."):
         st.markdown(pergunta)
 
     with st.chat_message("assistant"):
-        with st.spinner("🎯 Entendendo sua intenção..."):
-            tipo = classificar_intencao(pergunta)
+        inicio_resposta = time.perf_counter()
+        rastro = rastreador.iniciar(pergunta=pergunta)
+        # A pergunta atual já vai no prompt: entra no histórico só depois de montado
+        with span("historico") as dados_historico:
+            historico = historico_conversa.montar()
+            historico_conversa.adicionar_pergunta(pergunta)
+            dados_historico["tokens_estimados"] = estimar_tokens(historico)
+        especulacao = None
+        relatorio_prompt = {}  # origem da resposta SQL; tokens do prompt só se for ao LLM
+        with st.spinner("🎯 Entendendo sua intenção..."), span("intencao") as dados_intencao:
+            tipo = classificador_intencao.classificar(pergunta)
+            dados_intencao["origem"] = "local" if tipo is not None else "llm"
+            if tipo is None:
+                if ESPECULAR_SQL:
+                    # Descarte só gasta quota se a especulação chegou ao LLM (templates e cache não chamam o Gemini)
+                    especulacao = FluxoEspeculativo(
+                        executor_llm, lambda: pipeline.gerar_sql_em_fluxo(pergunta, historico, relatorio_prompt),
+                        ao_terminar=lambda cancelado: estatisticas_especulacao.registrar(
+                            aproveitada=not cancelado, chamou_llm=relatorio_prompt.get("origem") == "llm"))
+                tipo = pipeline.classificar_intencao_llm(pergunta)
+            dados_intencao["tipo"] = tipo
+
+        if especulacao is not None and tipo == "texto":
+            especulacao.cancelar()
 
         if tipo == "texto":
             # Respostas conceituais — simples
             with st.spinner("💬 Respondendo..."):
-                resposta = gerar_resposta_texto(pergunta)
+                resposta = pipeline.gerar_resposta_texto(pergunta)
                 st.markdown(resposta)
             st.session_state.messages.append({"role": "assistant", "content": resposta})
+            historico_conversa.adicionar_resposta(resposta)
 
         else:
-            # Respostas SQL — Lógica Refatorada
-            with st.spinner("🧠 Gerando SQL real..."):
-                historico = "\n".join(f"{m['role']}: {m['content']}" for m in st.session_state.messages[-5:])
-                resposta_completa, sql_blocks = gerar_sql_real(pergunta, historico)
-
-            # 1. Extrai o texto de explicação da resposta completa
-            texto_resposta = resposta_completa
-            if sql_blocks:
-                for block in sql_blocks:
-                    texto_resposta = texto_resposta.replace(f"```sql\n{block}\n```", "", 1).replace(f"```sql\n{block}```", "", 1)
-            texto_resposta = texto_resposta.strip()
-
-            # 2. 'conteudo_para_salvar' será o markdown COMPLETO
-            conteudo_para_salvar = texto_resposta 
-            
-            # 3. Exibe a parte textual (se houver) AGORA
-            if texto_resposta:
-                st.markdown(texto_resposta)
-
-            # 4. Processa e executa os blocos SQL
-            if sql_blocks:
-                for sql_query in sql_blocks:
-                    sql_query = sql_query.strip()
-                    
-                    st.code(sql_query, language="sql")
-                    conteudo_para_salvar += f"\n\n```sql\n{sql_query}\n```\n"
-                    
-                    try:
-                        df = validar_e_executar_sql(sql_query) 
-                        
-                        if not df.empty:
-                            msg_sucesso = f"✅ {len(df)} registros retornados."
-                            st.success(msg_sucesso)
-                            conteudo_para_salvar += f"\n{msg_sucesso}\n"
-
-                            # Chama a nova função de exibição
-                            markdown_dos_dados = exibir_dados_de_forma_inteligente(df)
-                            conteudo_para_salvar += markdown_dos_dados
-
-                        else:
-                            msg_info = "ℹ️ Nenhum registro encontrado."
-                            st.info(msg_info)
-                            conteudo_para_salvar += f"\n{msg_info}"
-                    
-                    except ValueError as ve: 
-                        msg_erro = f"⚠️ Consulta bloqueada: {ve}"
-                        st.error(msg_erro) 
-                        conteudo_para_salvar += f"\n{msg_erro}" 
-                    except Exception as e: 
-                        msg_erro_banco = "⚠️ Erro ao executar a consulta no banco."
-                        st.error(msg_erro_banco)                         
-                        conteudo_para_salvar += f"\n{msg_erro_banco}" 
-
-            elif not texto_resposta:
+            # Respostas SQL em streaming: o texto aparece token a token e cada bloco SQL
+            # é validado e executado assim que a sua cerca ``` fecha, enquanto o LLM segue escrevendo
+            # Tokens do prompt: só quando a resposta vem do LLM (templates e cache não montam prompt)
+            aviso_prompt = st.empty()
+
+            # (índice que esta resposta terá no histórico: chaves estáveis para a paginação)
+            indice_resposta = len(st.session_state.messages)
+            parser = ParserBlocosSQL()
+            sql_blocks, blocos, resumos_blocos = [], [], []
+            containers, futuros = [], {}
+            estado = {"codigo": None, "primeiro_token": False, "primeira_linha": False, "erro_no_banco": False}
+
+            def concluir_consulta(futuro):
+                indice_bloco = futuros.pop(futuro)
+                with containers[indice_bloco]:
+                    bloco, erro_no_banco, resumo = exibir_resultado_consulta(
+                        futuro, sql_blocks[indice_bloco], f"{indice_resposta}_{indice_bloco}"
+                    )
+                blocos[indice_bloco] = {**bloco, "indice": indice_bloco}
+                resumos_blocos[indice_bloco] = resumo
+                estado["erro_no_banco"] |= erro_no_banco
+                if bloco["linhas"]:
+                    if not estado["primeira_linha"]:
+                        estado["primeira_linha"] = True
+                        medidor_primeira_linha.registrar(inicio_resposta)
+
+            def tratar_evento(tipo_evento, valor):
+                if tipo_evento == "texto":
+                    yield valor
+                    return
+                if estado["codigo"] is None:
+                    container = st.container()
+                    containers.append(container)
+                    estado["codigo"] = container.empty()
+                if tipo_evento == "sql_parcial":
+                    estado["codigo"].code(valor, language="sql")
+                    return
+                # Bloco completo: predicados como YEAR(C5_EMISSAO) = 2025 viram faixas que usam os índices do SIX
+                sql_query, reescritas, avisos_indice = pipeline.otimizar_sql(valor)
+                estado["codigo"].code(sql_query, language="sql")
+                estado["codigo"] = None
+                container = containers[len(sql_blocks)]
+                if reescritas:
+                    container.caption("🔧 Reescrito para usar índice: " + " | ".join(reescritas))
+                for aviso in avisos_indice:
+                    container.caption(f"🐢 {aviso}")
+                futuros[submeter_com_rastro(executor_consultas, pipeline.validar_e_executar_sql, sql_query)] = len(sql_blocks)
+                sql_blocks.append(sql_query)
+                blocos.append(None)
+                resumos_blocos.append("")
+
+            def fluxo_resposta():
+                for trecho in especulacao or pipeline.gerar_sql_em_fluxo(pergunta, historico, relatorio_prompt):
+                    if not estado["primeiro_token"]:
+                        estado["primeiro_token"] = True
+                        medidor_primeiro_token.registrar(inicio_resposta)
+                        if relatorio_prompt.get("origem") == "llm":
+                            aviso_prompt.caption(
+                                f"📉 Prompt enviado ao LLM: {relatorio_prompt['tokens_anterior']} → "
+                                f"{relatorio_prompt['tokens_enviados']} tokens (-{relatorio_prompt['tokens_economizados']}, "
+                                f"{relatorio_prompt['reducao']:.0%}) | Tabelas: {', '.join(relatorio_prompt['tabelas'])}"
+                            )
+                    for tipo_evento, valor in parser.alimentar(trecho):
+                        yield from tratar_evento(tipo_evento, valor)
+                    # Resultados que já voltaram aparecem sem esperar o fim do texto
+                    for futuro in [f for f in futuros if f.done()]:
+                        concluir_consulta(futuro)
+                for tipo_evento, valor in parser.finalizar():
+                    yield from tratar_evento(tipo_evento, valor)
+                if estado["codigo"] is not None:
+                    # Bloco sem cerca de fechamento: não é executado
+                    estado["codigo"].empty()
+                    containers.pop()
+
+            st.write_stream(fluxo_resposta())
+            for futuro in as_completed(list(futuros)):
+                concluir_consulta(futuro)
+
+            if estado["erro_no_banco"]:
+                pipeline.invalidar_sql_em_cache(pergunta)
+
+            # Histórico do chat: o texto e os blocos (SQL + chave do resultado), na ordem original
+            texto_resposta = parser.texto.strip()
+            conteudo_para_salvar = texto_resposta
+
+            if not sql_blocks and not texto_resposta:
                 # Fallback se o LLM não gerar NADA
                 conteudo_para_salvar = "Desculpe, não consegui gerar uma consulta SQL válida para isso."
                 st.warning(conteudo_para_salvar)
 
-            # 5. Salva o conteúdo COMPLETO e formatado no histórico
-            st.session_state.messages.append({"role": "assistant", "content": conteudo_para_salvar.strip()})
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": conteudo_para_salvar,
+                "blocos": blocos,
+            })
+            historico_conversa.adicionar_resposta(
+                texto_resposta if sql_blocks or texto_resposta else conteudo_para_salvar,
+                [{"sql": sql, "resumo": resumo} for sql, resumo in zip(sql_blocks, resumos_blocos)],
+            )
+
+        rastro.finalizar(tipo=tipo, especulacao=especulacao is not None)
+
+
+# =======================================
+# 6️⃣ MÉTRICAS DE DESEMPENHO
+# =======================================
+
+with st.sidebar:
+    st.subheader("⚡ Cache de SQL")
+    stats_cache = cache_sql.estatisticas()
+    st.metric("Taxa de acerto", f"{stats_cache['taxa_acerto']:.0%}")
+    st.caption(
+        f"Acertos: {stats_cache['acertos']} ({stats_cache['acertos_similares']} por similaridade) | "
+        f"Falhas: {stats_cache['falhas']}"
+    )
+    st.caption(
+        f"Chamadas ao Gemini evitadas: {stats_cache['chamadas_llm_economizadas']} | "
+        f"Latência economizada: {stats_cache['segundos_economizados']:.1f}s"
+    )
+
+    st.subheader("🧭 Templates de SQL")
+    stats_planejador = pipeline.planejador.estatisticas()
+    st.metric("Perguntas sem LLM", f"{stats_planejador['taxa_atendimento']:.0%}")
+    st.caption(f"Atendidas por template: {stats_planejador['atendidas']} de {stats_planejador['perguntas']}")
+
+    if ESPECULAR_SQL:
+        st.subheader("🔮 Especulação de SQL")
+        stats_especulacao = estatisticas_especulacao.estatisticas()
+        st.caption(
+            f"Disparadas: {stats_especulacao['disparadas']} | Aproveitadas: {stats_especulacao['aproveitadas']} | "
+            f"Desperdiçadas: {stats_especulacao['desperdicadas']} ({stats_especulacao['taxa_desperdicio']:.0%}) | "
+            f"Descartadas sem LLM: {stats_especulacao['descartadas_sem_llm']}"
+        )
+
+    st.subheader("🗄️ Cache de resultados")
+    stats_resultados = cache_resultados.estatisticas()
+    st.metric("Taxa de acerto", f"{stats_resultados['taxa_acerto']:.0%}")
+    st.caption(
+        f"Consultas em cache: {stats_resultados['itens']} | "
+        f"Memória: {stats_resultados['bytes'] / 1024 / 1024:.1f} MB"
+    )
+
+    if replica_analitica is not None:
+        st.subheader("🦆 Réplica analítica")
+        stats_replica = replica_analitica.estatisticas()
+        defasagens = [info["defasagem_s"] for info in stats_replica["tabelas"].values()]
+        st.caption(
+            f"Na réplica: {stats_replica['consultas'].get('replica', 0)} | "
+            f"No SQL Server: {stats_replica['consultas'].get('sqlserver', 0)} {stats_replica['desvios'] or ''} | "
+            f"Defasagem máx.: {max(defasagens, default=0)}s"
+        )
+
+    if dicionario_sob_demanda is not None:
+        st.subheader("📚 Dicionário sob demanda")
+        stats_dicionario = dicionario_sob_demanda.estatisticas()
+        st.caption(
+            f"Tabelas no SX2: {stats_dicionario['catalogo']} | Detalhes em memória: {stats_dicionario['em_cache']} | "
+            f"Lidas do banco: {stats_dicionario['leituras']} | Reaproveitadas: {stats_dicionario['acertos']}"
+        )
+
+    if cache_contexto is not None:
+        st.subheader("📌 Cache de contexto (prefixo do prompt)")
+        stats_contexto = cache_contexto.estatisticas()
+        st.caption(
+            f"Prefixo: ~{pipeline.prompt_sql.tokens_prefixo} tokens | Criações: {stats_contexto['criados']} | "
+            f"Reaproveitado: {stats_contexto['acertos']}x ({stats_contexto['tokens_reaproveitados']} tokens não reenviados)"
+        )
+
+    st.subheader("💾 Resultados desta sessão")
+    stats_armazem = armazem_resultados.estatisticas()
+    st.caption(
+        f"Em memória: {stats_armazem['itens_memoria']} ({stats_armazem['bytes_memoria'] / 1024 / 1024:.1f} MB) | "
+        f"Em disco: {stats_armazem['itens_disco']} ({stats_armazem['bytes_disco'] / 1024 / 1024:.1f} MB) | "
+        f"Lidos do disco: {stats_armazem['leituras_disco']}"
+    )
+
+    st.subheader("🧠 Histórico no prompt")
+    stats_historico = historico_conversa.estatisticas()
+    st.caption(
+        f"~{stats_historico['tokens']} tokens | Mensagens completas: {stats_historico['turnos_recentes']} | "
+        f"Resumidas: {stats_historico['compactados']}"
+    )
+
+    st.subheader("⏱️ Overhead por rerun")
+    stats_rerun = medidor_rerun.resumo()
+    st.caption(
+        f"Reruns (todas as sessões): {stats_rerun['amostras']} | "
+        f"p50: {stats_rerun['p50_ms']:.1f} ms | p95: {stats_rerun['p95_ms']:.1f} ms"
+    )
 
+    st.subheader("🔬 Tempo por etapa")
+    for etapa, stats_etapa in rastreador.resumo().items():
+        tokens_etapa = f" | {stats_etapa['tokens']} tokens" if stats_etapa["tokens"] else ""
+        st.caption(
+            f"{etapa}: p50 {stats_etapa['p50_ms']:.0f} ms | p95 {stats_etapa['p95_ms']:.0f} ms "
+            f"({stats_etapa['amostras']}){tokens_etapa}"
+        )
+
+    st.subheader("🚀 Latência percebida")
+    for rotulo, medidor in (("Primeiro token", medidor_primeiro_token), ("Primeira linha", medidor_primeira_linha)):
+        stats_latencia = medidor.resumo()
+        st.caption(
+            f"{rotulo}: p50 {stats_latencia['p50_ms'] / 1000:.2f}s | "
+            f"p95 {stats_latencia['p95_ms'] / 1000:.2f}s ({stats_latencia['amostras']} respostas)"
+        )
 
 st.markdown("---")
 st.caption("Desenvolvido com ❤️ | Protheus + SQL Server + Streamlit + Gemini (v3 - Exibição Inteligente)")
\ No newline at end of file
@@ -0,0 +1,690 @@
+"""
+Benchmark offline do pipeline, sem SQL Server e sem Gemini:
+
+- banco SQLite sintético com o formato do Protheus (SX3/SIX, SA1, SA2, SB1, SB2,
+  SC5, SC6, SF2, SD2), com volume proporcional a --escala;
+- LLM gravado: devolve, de forma determinística, as respostas do corpus;
+- corpus de perguntas reais em fixtures/benchmark/perguntas.json.
+
+As etapas medidas são as mesmas do app (pipeline.PipelineProtheus): intenção,
+geração do SQL, sargabilidade, execução e resposta em texto. A renderização
+(Streamlit) fica de fora.
+
+Uso:
+    python benchmark.py                      # escala 1, 3 repetições
+    python benchmark.py --escala 5 --repeticoes 5
+    python benchmark.py --gravar-baseline    # atualiza fixtures/benchmark/baseline.json
+    python benchmark.py --comparar           # código de saída 1 se alguma etapa regredir
+    python benchmark.py --sessoes 8 --atraso-conexao 0.02   # custo do rerun: recursos por rerun x por processo
+"""
+import argparse
+import datetime
+import json
+import os
+import pickle
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, event, text
+
+from cache_resultados import CacheResultados
+from cache_sql import CacheGeracaoSQL, calcular_versao_dicionario
+from consulta_sql import top_para_limit
+from dicionario import TABELAS_DICIONARIO, sincronizar_dicionario
+from historico import HistoricoConversa, resumir_resultado
+from pipeline import PROMPT_RESPOSTA_CURTA, criar_pipeline
+from prompt import CacheContextoLocal
+from rastreamento import Rastreador
+from recursos import CONFIG_POOL, MedidorLatencia, formatar_regras, ler_prompt_template
+from regras_protheus import REGRAS_NEGOCIO, REGRAS_PROTHEUS
+from sargabilidade import INDICES_REFERENCIA
+from texto import estimar_tokens
+
+CAMINHO_CORPUS = os.path.join("fixtures", "benchmark", "perguntas.json")
+CAMINHO_BASELINE = os.path.join("fixtures", "benchmark", "baseline.json")
+
+ETAPAS = ["intencao", "geracao_sql", "otimizacao", "execucao_sql", "resposta_texto"]
+
+# =======================================
+# 1️⃣ BANCO SINTÉTICO
+# =======================================
+
+# {tabela: [(campo, tipo SX3, título)]}: gera o DDL e o SX3010 ao mesmo tempo
+TABELAS_SINTETICAS = {
+    "SA1": [("A1_FILIAL", "C", "Filial"), ("A1_COD", "C", "Código"), ("A1_LOJA", "C", "Loja"),
+            ("A1_NOME", "C", "Nome"), ("A1_NREDUZ", "C", "N Fantasia"), ("A1_EST", "C", "Estado"),
+            ("A1_MUN", "C", "Município"), ("A1_TIPO", "C", "Tipo"), ("A1_CGC", "C", "CNPJ/CPF")],
+    "SA2": [("A2_FILIAL", "C", "Filial"), ("A2_COD", "C", "Código"), ("A2_LOJA", "C", "Loja"),
+            ("A2_NOME", "C", "Razão Social"), ("A2_EST", "C", "Estado"), ("A2_MUN", "C", "Município"),
+            ("A2_CGC", "C", "CNPJ/CPF")],
+    "SB1": [("B1_FILIAL", "C", "Filial"), ("B1_COD", "C", "Código"), ("B1_DESC", "C", "Descrição"),
+            ("B1_TIPO", "C", "Tipo"), ("B1_GRUPO", "C", "Grupo"), ("B1_UM", "C", "Unidade"),
+            ("B1_PRV1", "N", "Preço Venda")],
+    "SB2": [("B2_FILIAL", "C", "Filial"), ("B2_COD", "C", "Produto"), ("B2_LOCAL", "C", "Armazém"),
+            ("B2_QATU", "N", "Saldo Atual"), ("B2_RESERVA", "N", "Reserva"), ("B2_VATU1", "N", "Valor Atual")],
+    "SC5": [("C5_FILIAL", "C", "Filial"), ("C5_NUM", "C", "Número"), ("C5_TIPO", "C", "Tipo Pedido"),
+            ("C5_CLIENTE", "C", "Cliente"), ("C5_LOJACLI", "C", "Loja"), ("C5_EMISSAO", "D", "DT Emissão"),
+            ("C5_CONDPAG", "C", "Cond. Pagto"), ("C5_FORNISS", "C", "Fornecedor")],
+    "SC6": [("C6_FILIAL", "C", "Filial"), ("C6_NUM", "C", "Num. Pedido"), ("C6_ITEM", "C", "Item"),
+            ("C6_PRODUTO", "C", "Produto"), ("C6_QTDVEN", "N", "Quantidade"), ("C6_PRCVEN", "N", "Prc Unitário"),
+            ("C6_VALOR", "N", "Vlr. Total"), ("C6_QTDENT", "N", "Qtd Entregue"), ("C6_ENTREG", "D", "Entrega")],
+    "SF2": [("F2_FILIAL", "C", "Filial"), ("F2_DOC", "C", "Documento"), ("F2_SERIE", "C", "Série"),
+            ("F2_CLIENTE", "C", "Cliente"), ("F2_LOJA", "C", "Loja"), ("F2_EMISSAO", "D", "DT Emissão"),
+            ("F2_TIPO", "C", "Tipo NF"), ("F2_VALBRUT", "N", "Valor Bruto"), ("F2_VALMERC", "N", "Valor Mercad.")],
+    "SD2": [("D2_FILIAL", "C", "Filial"), ("D2_DOC", "C", "Documento"), ("D2_SERIE", "C", "Série"),
+            ("D2_CLIENTE", "C", "Cliente"), ("D2_LOJA", "C", "Loja"), ("D2_ITEM", "C", "Item"),
+            ("D2_COD", "C", "Produto"), ("D2_LOCAL", "C", "Armazém"), ("D2_QUANT", "N", "Quantidade"),
+            ("D2_PRCVEN", "N", "Vlr. Unitário"), ("D2_TOTAL", "N", "Vlr. Total"), ("D2_EMISSAO", "D", "Emissão"),
+            ("D2_TIPO", "C", "Tipo NF"), ("D2_PEDIDO", "C", "Pedido"), ("D2_ITEMPV", "C", "Item Pedido"),
+            ("D2_NUMSEQ", "C", "Sequencial"), ("D2_TES", "C", "TES")],
+}
+
+# Volume por unidade de escala
+VOLUME = {"clientes": 200, "fornecedores": 50, "produtos": 300, "pedidos": 2000}
+
+ESTADOS = ["SP", "SP", "SP", "MG", "MG", "RJ", "PR", "SC", "RS", "BA", "GO"]
+MUNICIPIOS = {"SP": "SAO PAULO", "MG": "BELO HORIZONTE", "RJ": "RIO DE JANEIRO", "PR": "CURITIBA",
+              "SC": "JOINVILLE", "RS": "PORTO ALEGRE", "BA": "SALVADOR", "GO": "GOIANIA"}
+DESCRICOES = ["CIMENTO CP II 50KG", "ARGAMASSA AC1 20KG", "TIJOLO 8 FUROS", "VERGALHAO CA50 10MM",
+              "AREIA MEDIA M3", "BRITA 1 M3", "TELHA CERAMICA", "TUBO PVC 100MM", "CAL HIDRATADA 20KG"]
+FILIAIS = ["01", "02"]
+DATA_INICIAL = datetime.date(2024, 1, 1)
+
+
+def _tabela_fisica(tabela):
+    return f"{tabela}010"
+
+
+def _criar_tabela(conn, tabela, campos):
+    colunas = [f"{campo} {'REAL' if tipo == 'N' else 'TEXT'}" for campo, tipo, _ in campos]
+    colunas += ["D_E_L_E_T_ TEXT", "R_E_C_N_O_ INTEGER PRIMARY KEY"]
+    conn.execute(f"CREATE TABLE {tabela} ({', '.join(colunas)})")
+
+
+def _inserir(conn, tabela, linhas, aleatorio, taxa_excluidos=0.02):
+    """Insere com D_E_L_E_T_ (~2% excluídos) e R_E_C_N_O_ sequencial."""
+    if not linhas:
+        return
+    completas = [(*linha, "*" if aleatorio.random() < taxa_excluidos else " ", recno)
+                 for recno, linha in enumerate(linhas, start=1)]
+    marcadores = ", ".join("?" * len(completas[0]))
+    conn.executemany(f"INSERT INTO {tabela} VALUES ({marcadores})", completas)
+
+
+def _data_aleatoria(aleatorio, hoje):
+    return (DATA_INICIAL + datetime.timedelta(days=aleatorio.randint(0, (hoje - DATA_INICIAL).days))).strftime("%Y%m%d")
+
+
+def criar_banco_sintetico(caminho, escala=1, semente=42):
+    """
+    Cria (ou recria) o banco SQLite. Mesma semente e mesma data -> mesmos dados.
+    Retorna {tabela: linhas}.
+    """
+    if os.path.exists(caminho):
+        os.remove(caminho)
+    aleatorio = random.Random(semente)
+    hoje = datetime.date.today()
+    volume = {chave: max(1, int(quantidade * escala)) for chave, quantidade in VOLUME.items()}
+
+    clientes = [(f"{i:06d}", "01") for i in range(1, volume["clientes"] + 1)]
+    # Alguns códigos com prefixo, para consultas do tipo LEFT(B1_COD, 3) = 'CIM'
+    produtos = [f"CIM{i:03d}" if i % 7 == 0 else f"{i:06d}" for i in range(1, volume["produtos"] + 1)]
+    precos = {codigo: round(aleatorio.uniform(5, 500), 2) for codigo in produtos}
+
+    linhas = defaultdict(list)
+    for cod, loja in clientes:
+        estado = aleatorio.choice(ESTADOS)
+        linhas["SA1"].append(("", cod, loja, f"CLIENTE {cod} LTDA", f"CLIENTE {cod}", estado,
+                              MUNICIPIOS[estado], aleatorio.choice("FRS"), f"{aleatorio.randrange(10**13):014d}"))
+    for i in range(1, volume["fornecedores"] + 1):
+        estado = aleatorio.choice(ESTADOS)
+        linhas["SA2"].append(("", f"F{i:05d}", "01", f"FORNECEDOR {i} SA", estado, MUNICIPIOS[estado],
+                              f"{aleatorio.randrange(10**13):014d}"))
+    for codigo in produtos:
+        linhas["SB1"].append(("", codigo, f"{aleatorio.choice(DESCRICOES)} {codigo}", aleatorio.choice(["PA", "MP", "ME"]),
+                              f"{aleatorio.randint(1, 5):02d}", "UN", precos[codigo]))
+        for filial in FILIAIS:
+            quantidade = aleatorio.randint(0, 2000)
+            linhas["SB2"].append((filial, codigo, "01", quantidade, aleatorio.randint(0, quantidade // 10),
+                                  round(quantidade * precos[codigo], 2)))
+
+    for numero in range(1, volume["pedidos"] + 1):
+        filial = aleatorio.choice(FILIAIS)
+        cod, loja = aleatorio.choice(clientes)
+        emissao = _data_aleatoria(aleatorio, hoje)
+        pedido = f"{numero:06d}"
+        linhas["SC5"].append((filial, pedido, "N", cod, loja, emissao, "001", ""))
+        faturado = aleatorio.random() < 0.8
+        documento = f"{numero:09d}"
+        total_nota = 0.0
+        for item in range(1, aleatorio.randint(1, 8) + 1):
+            produto = aleatorio.choice(produtos)
+            quantidade = aleatorio.randint(1, 50)
+            valor = round(quantidade * precos[produto], 2)
+            linhas["SC6"].append((filial, pedido, f"{item:02d}", produto, quantidade, precos[produto], valor,
+                                  quantidade if faturado else 0, emissao))
+            if faturado:
+                total_nota += valor
+                linhas["SD2"].append((filial, documento, "1", cod, loja, f"{item:02d}", produto, "01", quantidade,
+                                      precos[produto], valor, emissao, "N", pedido, f"{item:02d}",
+                                      f"{numero:04d}{item:02d}", "501"))
+        if faturado:
+            linhas["SF2"].append((filial, documento, "1", cod, loja, emissao, "N", round(total_nota, 2),
+                                  round(total_nota, 2)))
+
+    conn = sqlite3.connect(caminho)
+    try:
+        for tabela, campos in TABELAS_SINTETICAS.items():
+            _criar_tabela(conn, _tabela_fisica(tabela), campos)
+            _inserir(conn, _tabela_fisica(tabela), linhas[tabela], aleatorio)
+            # Índices físicos iguais aos do SIX padrão
+            existentes = {campo for campo, _, _ in campos}
+            for ordem, chave in enumerate(INDICES_REFERENCIA.get(tabela, []), start=1):
+                if set(chave) <= existentes:
+                    conn.execute(f"CREATE INDEX {tabela}010_{ordem} ON {_tabela_fisica(tabela)} ({', '.join(chave)})")
+
+        # Dicionário: SX3010 sem S_T_A_M_P_ (exercita a marca d'água só por R_E_C_N_O_) e SIX010
+        conn.execute("CREATE TABLE SX3010 (X3_ARQUIVO TEXT, X3_ORDEM TEXT, X3_CAMPO TEXT, X3_TIPO TEXT, "
+                     "X3_TITULO TEXT, X3_DESCRIC TEXT, D_E_L_E_T_ TEXT, R_E_C_N_O_ INTEGER PRIMARY KEY)")
+        conn.execute("CREATE TABLE SIX010 (INDICE TEXT, ORDEM TEXT, CHAVE TEXT, D_E_L_E_T_ TEXT, "
+                     "R_E_C_N_O_ INTEGER PRIMARY KEY)")
+        sx3, six = [], []
+        for tabela, campos in TABELAS_SINTETICAS.items():
+            tipos = {campo: tipo for campo, tipo, _ in campos}
+            for ordem, (campo, tipo, titulo) in enumerate(campos, start=1):
+                sx3.append((tabela, f"{ordem:02d}", campo, tipo, titulo, titulo))
+            for ordem, chave in enumerate(INDICES_REFERENCIA.get(tabela, []), start=1):
+                six.append((tabela, str(ordem), "+".join(f"DTOS({c})" if tipos.get(c) == "D" else c for c in chave)))
+        _inserir(conn, "SX3010", sx3, aleatorio, taxa_excluidos=0)
+        _inserir(conn, "SIX010", six, aleatorio, taxa_excluidos=0)
+        conn.commit()
+    finally:
+        conn.close()
+    return {tabela: len(linhas[tabela]) for tabela in TABELAS_SINTETICAS}
+
+
+# T-SQL que o pipeline gera -> SQLite
+def traduzir_para_sqlite(sql):
+    """TOP/OFFSET-FETCH viram LIMIT; funções sem equivalente vão para as registradas em `registrar_funcoes`."""
+    sql = re.sub(r"\bCOUNT_BIG\(", "COUNT(", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bLEFT\(", "ESQUERDA(", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bCONVERT\(\s*VARCHAR\s*\((\d+)\)\s*,", r"CONVERTER_TEXTO(\1,", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bDATEADD\(\s*(\w+)\s*,", r"SOMAR_DATA('\1',", sql, flags=re.IGNORECASE)
+    return top_para_limit(sql)
+
+
+def _somar_data(unidade, quantidade, data):
+    """DATEADD sobre datas AAAAMMDD."""
+    if not data:
+        return None
+    data = datetime.datetime.strptime(str(data)[:8], "%Y%m%d").date()
+    unidade = unidade.upper()
+    if unidade in ("DAY", "DD", "D"):
+        data += datetime.timedelta(days=quantidade)
+    else:
+        meses = quantidade * (12 if unidade in ("YEAR", "YY", "YYYY") else 1)
+        ano, mes = divmod(data.month - 1 + meses, 12)
+        data = data.replace(year=data.year + ano, month=mes + 1, day=min(data.day, 28))
+    return data.strftime("%Y%m%d")
+
+
+def registrar_funcoes(conexao_dbapi, _registro=None):
+    def parte_da_data(inicio, fim):
+        return lambda valor: int(valor[inicio:fim]) if valor and valor.strip() else None
+
+    conexao_dbapi.create_function("ESQUERDA", 2, lambda valor, n: None if valor is None else str(valor)[:n],
+                                  deterministic=True)
+    conexao_dbapi.create_function("YEAR", 1, parte_da_data(0, 4), deterministic=True)
+    conexao_dbapi.create_function("MONTH", 1, parte_da_data(4, 6), deterministic=True)
+    conexao_dbapi.create_function("DAY", 1, parte_da_data(6, 8), deterministic=True)
+    conexao_dbapi.create_function("GETDATE", 0, lambda: datetime.date.today().strftime("%Y%m%d"))
+    conexao_dbapi.create_function("CONVERTER_TEXTO", 3, lambda n, valor, _estilo: None if valor is None else str(valor)[:n],
+                                  deterministic=True)
+    conexao_dbapi.create_function("SOMAR_DATA", 3, _somar_data, deterministic=True)
+
+
+def criar_engine_sintetica(caminho, atraso_conexao=0.0, **config_pool):
+    """`atraso_conexao`: segundos por conexão nova (login no SQL Server pela rede)."""
+    engine = create_engine(f"sqlite:///{caminho}", **config_pool)
+    event.listen(engine, "connect", registrar_funcoes)
+    if atraso_conexao:
+        event.listen(engine, "connect", lambda conexao_dbapi, registro: time.sleep(atraso_conexao))
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def traduzir(conn, cursor, statement, parameters, context, executemany):
+        return traduzir_para_sqlite(statement), parameters
+
+    return engine
+
+
+# =======================================
+# 2️⃣ LLM GRAVADO
+# =======================================
+
+class MensagemGravada:
+    """Mesmo contrato das mensagens do langchain usado pelo pipeline: content, usage_metadata e soma de trechos."""
+
+    def __init__(self, content, usage_metadata=None):
+        self.content = content
+        self.usage_metadata = usage_metadata
+
+    def __add__(self, outra):
+        uso = None
+        if self.usage_metadata or outra.usage_metadata:
+            uso = {chave: (self.usage_metadata or {}).get(chave, 0) + (outra.usage_metadata or {}).get(chave, 0)
+                   for chave in ("input_tokens", "output_tokens")}
+        return MensagemGravada(self.content + outra.content, uso)
+
+
+class LLMGravado:
+    """
+    Faz o papel do llm (invoke) e da sql_chain (stream) com as respostas do corpus.
+    A pergunta é localizada dentro do prompt; latências simuladas são opcionais.
+    """
+
+    def __init__(self, corpus, atraso_primeiro_token=0.0, atraso_trecho=0.0, tamanho_trecho=64):
+        self.por_pergunta = {item["pergunta"]: item for item in corpus}
+        self.atraso_primeiro_token = atraso_primeiro_token
+        self.atraso_trecho = atraso_trecho
+        self.tamanho_trecho = tamanho_trecho
+        self.chamadas = 0
+        self._lock = threading.Lock()  # o teste de carga chama de várias threads
+
+    def _contar(self):
+        with self._lock:
+            self.chamadas += 1
+
+    def _localizar(self, prompt):
+        """A pergunta atual é a última do prompt (o histórico traz as anteriores)."""
+        candidatas = [pergunta for pergunta in self.por_pergunta if pergunta in prompt]
+        if not candidatas:
+            return None
+        return self.por_pergunta[max(candidatas, key=lambda pergunta: (prompt.rfind(pergunta), len(pergunta)))]
+
+    def invoke(self, prompt):
+        self._contar()
+        time.sleep(self.atraso_primeiro_token)
+        item = self._localizar(prompt)
+        if prompt.startswith(PROMPT_RESPOSTA_CURTA.split("{pergunta}")[0]):
+            resposta = item.get("resposta", "") if item and item["intencao"] == "texto" else "Não sei responder."
+        else:
+            resposta = item["intencao"] if item else "texto"
+        return MensagemGravada(resposta, {"input_tokens": estimar_tokens(prompt), "output_tokens": estimar_tokens(resposta)})
+
+    def stream(self, prompt):
+        self._contar()
+        item = self._localizar(prompt)
+        if item is None or "resposta" not in item:
+            raise KeyError(f"Sem resposta gravada para o prompt: {prompt[-200:]!r}")
+        resposta = item["resposta"]
+        time.sleep(self.atraso_primeiro_token)
+        trechos = [resposta[i:i + self.tamanho_trecho] for i in range(0, len(resposta), self.tamanho_trecho)]
+        for i, trecho in enumerate(trechos):
+            if i:
+                time.sleep(self.atraso_trecho)
+            uso = None
+            if i == len(trechos) - 1:  # como o Gemini: o uso vem no último trecho
+                uso = {"input_tokens": estimar_tokens(prompt), "output_tokens": estimar_tokens(resposta)}
+            yield MensagemGravada(trecho, uso)
+
+
+# =======================================
+# 3️⃣ EXECUÇÃO E MEDIÇÃO
+# =======================================
+
+def carregar_corpus(caminho=CAMINHO_CORPUS):
+    with open(caminho, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+
+def _percentil(amostras, fracao):
+    ordenadas = sorted(amostras)
+    return ordenadas[int(fracao * (len(ordenadas) - 1))] if ordenadas else 0.0
+
+
+class Medicoes:
+    """Duração e pico de memória (tracemalloc) de cada chamada, por etapa."""
+
+    def __init__(self):
+        self.duracoes = defaultdict(list)
+        self.picos = defaultdict(list)
+        self.tokens_historico = []
+        self.tokens_prompt = []  # (formato anterior, enviados) por pergunta SQL
+
+    def medir(self, etapa, funcao, *args, **kwargs):
+        tracemalloc.reset_peak()
+        antes = tracemalloc.get_traced_memory()[0]
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            self.duracoes[etapa].append(time.perf_counter() - inicio)
+            self.picos[etapa].append(max(tracemalloc.get_traced_memory()[1] - antes, 0))
+
+    def resumo(self):
+        return {
+            etapa: {
+                "chamadas": len(self.duracoes[etapa]),
+                "p50_ms": round(1000 * _percentil(self.duracoes[etapa], 0.5), 3),
+                "p95_ms": round(1000 * _percentil(self.duracoes[etapa], 0.95), 3),
+                "pico_kb": round(max(self.picos[etapa]) / 1024, 1),
+            }
+            for etapa in ETAPAS if self.duracoes[etapa]
+        }
+
+
+def responder(pipeline, item, medicoes, contadores, rastreador, historico):
+    """
+    Uma pergunta do corpus pelas mesmas etapas do app, na mesma ordem. O corpus
+    inteiro é uma conversa só: o histórico gerenciado cresce a cada pergunta.
+    """
+    pergunta = item["pergunta"]
+    rastro = rastreador.iniciar(pergunta=pergunta)
+    tipo = None
+    texto_historico = historico.montar()
+    historico.adicionar_pergunta(pergunta)
+    medicoes.tokens_historico.append(estimar_tokens(texto_historico))
+    try:
+        tipo = medicoes.medir("intencao", pipeline.classificar_intencao, pergunta)
+        if tipo != item["intencao"]:
+            contadores["intencao_divergente"] += 1
+        if tipo == "sql":
+            relatorio = pipeline.prompt_sql.relatorio_tokens(pergunta, "", texto_historico,
+                                                             com_cache=pipeline.sql_chain.cache_contexto is not None)
+            medicoes.tokens_prompt.append((relatorio["tokens_anterior"], relatorio["tokens_enviados"]))
+            resposta, blocos = medicoes.medir("geracao_sql", pipeline.gerar_sql_real, pergunta, texto_historico)
+            contadores["blocos_sql"] += len(blocos)
+            consultas = []
+            for bloco in blocos:
+                sql_query, reescritas, _ = medicoes.medir("otimizacao", pipeline.otimizar_sql, bloco)
+                contadores["reescritas"] += len(reescritas)
+                df, ha_mais, _ = medicoes.medir("execucao_sql", pipeline.validar_e_executar_sql, sql_query)
+                consultas.append({"sql": sql_query, "resumo": resumir_resultado(df, ha_mais)})
+            historico.adicionar_resposta(re.sub(r"```sql.*?```", "", resposta, flags=re.DOTALL).strip(), consultas)
+        else:
+            historico.adicionar_resposta(medicoes.medir("resposta_texto", pipeline.gerar_resposta_texto, pergunta))
+    except Exception as e:
+        contadores["erros"] += 1
+        print(f"  ❌ {pergunta}: {type(e).__name__}: {e}", file=sys.stderr)
+    finally:
+        rastro.finalizar(tipo=tipo)
+
+
+def montar_pipeline_sintetico(pasta, llm, escala=1, semente=42, cache_contexto=True, replica=False, **config):
+    """
+    Banco sintético em `pasta` e o mesmo pipeline do app sobre ele (usado também
+    pelo teste de carga da API e pelo lote). `replica`: agregações na réplica
+    DuckDB, sincronizada com o banco sintético. Retorna (pipeline, volumes).
+    """
+    volumes = criar_banco_sintetico(os.path.join(pasta, "protheus.sqlite"), escala, semente)
+    engine = criar_engine_sintetica(os.path.join(pasta, "protheus.sqlite"))
+    if replica:
+        from replica import ReplicaAnalitica
+
+        config["replica"] = ReplicaAnalitica(os.path.join(pasta, "replica"))
+        config["replica"].sincronizar(engine)
+    mapeamento, indices, _ = sincronizar_dicionario(engine, TABELAS_DICIONARIO, os.path.join(pasta, "sx3.json"))
+    versao = calcular_versao_dicionario(mapeamento, REGRAS_NEGOCIO, REGRAS_PROTHEUS, indices)
+    conteudo_template, _ = ler_prompt_template("prompt_template.txt")
+    pipeline = criar_pipeline(engine, llm, conteudo_template, mapeamento, indices, versao, REGRAS_NEGOCIO,
+                              REGRAS_PROTHEUS, CacheGeracaoSQL(caminho=os.path.join(pasta, "geracao_sql.sqlite")),
+                              CacheResultados(REGRAS_PROTHEUS),
+                              cache_contexto=CacheContextoLocal() if cache_contexto else None, **config)
+    return pipeline, volumes
+
+
+def executar_benchmark(escala=1, repeticoes=3, semente=42, atraso_llm=0.0, caminho_corpus=CAMINHO_CORPUS,
+                       cache_contexto=True, replica=False):
+    """
+    Rodada fria (caches vazios) e repeticoes-1 rodadas quentes sobre o corpus.
+    `cache_contexto`: prefixo do prompt no CacheContextoLocal (stand-in do cache do Gemini).
+    `replica`: agregações roteadas para a réplica DuckDB (ver replica.py).
+    Retorna o relatório: configuração, contadores determinísticos, etapas e spans internos.
+    """
+    corpus = carregar_corpus(caminho_corpus)
+    with tempfile.TemporaryDirectory(prefix="benchmark_protheus_") as pasta:
+        llm = LLMGravado(corpus, atraso_primeiro_token=atraso_llm)
+        rastreador = Rastreador(caminho=os.path.join(pasta, "rastros.jsonl"))
+
+        inicio = time.perf_counter()
+        pipeline, volumes = montar_pipeline_sintetico(pasta, llm, escala, semente, cache_contexto, replica)
+        engine, cache_sql = pipeline.engine, pipeline.cache_sql
+        inicializacao_ms = 1000 * (time.perf_counter() - inicio)
+
+        contadores = defaultdict(int)
+        rodadas = {}
+        tracemalloc.start()
+        try:
+            for repeticao in range(repeticoes):
+                nome = "fria" if repeticao == 0 else "quente"
+                medicoes = rodadas.setdefault(nome, (Medicoes(), []))
+                chamadas_antes = llm.chamadas
+                historico = HistoricoConversa()
+                inicio = time.perf_counter()
+                for item in corpus:
+                    responder(pipeline, item, medicoes[0], contadores, rastreador, historico)
+                medicoes[1].append(time.perf_counter() - inicio)
+                contadores[f"chamadas_llm_{nome}"] += llm.chamadas - chamadas_antes
+        finally:
+            tracemalloc.stop()
+        engine.dispose()
+
+    estatisticas_planejador = pipeline.planejador.estatisticas()
+    contadores["templates"] = estatisticas_planejador["atendidas"]
+    contadores["cache_sql_acertos"] = cache_sql.estatisticas()["acertos"]
+    if pipeline.replica is not None:
+        for destino, quantidade in pipeline.replica.estatisticas()["consultas"].items():
+            contadores[f"destino_{destino}"] = quantidade
+    return {
+        "config": {"escala": escala, "repeticoes": repeticoes, "semente": semente, "perguntas": len(corpus),
+                   "linhas": volumes, "cache_contexto": cache_contexto, "replica": replica},
+        "contadores": dict(sorted(contadores.items())),
+        "inicializacao_ms": round(inicializacao_ms, 1),
+        "rodadas": {
+            nome: {
+                "vazao_perguntas_s": round(len(corpus) * len(tempos) / sum(tempos), 1),
+                "etapas": medicoes.resumo(),
+                "tokens_historico": {"p50": int(_percentil(medicoes.tokens_historico, 0.5)),
+                                     "max": max(medicoes.tokens_historico)},
+                "tokens_prompt": {
+                    "anterior_p50": int(_percentil([anterior for anterior, _ in medicoes.tokens_prompt], 0.5)),
+                    "enviados_p50": int(_percentil([enviados for _, enviados in medicoes.tokens_prompt], 0.5)),
+                    "economizados_por_pergunta": round(sum(anterior - enviados for anterior, enviados
+                                                           in medicoes.tokens_prompt) / len(medicoes.tokens_prompt)),
+                },
+            }
+            for nome, (medicoes, tempos) in rodadas.items()
+        },
+        "spans": {nome: {"p50_ms": round(dados["p50_ms"], 3), "p95_ms": round(dados["p95_ms"], 3)}
+                  for nome, dados in rastreador.resumo().items()},
+    }
+
+
+# =======================================
+# 4️⃣ BASELINE E COMPARAÇÃO
+# =======================================
+
+def gravar_baseline(relatorio, caminho=CAMINHO_BASELINE):
+    """JSON com chaves ordenadas: as mudanças aparecem linha a linha no diff."""
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2, sort_keys=True)
+        arquivo.write("\n")
+
+
+def comparar_com_baseline(relatorio, baseline, tolerancia=0.5, folga_ms=1.0):
+    """
+    Regressões: p95 acima de baseline*(1+tolerancia)+folga_ms, pico de memória acima
+    de baseline*(1+tolerancia), histórico maior que baseline*(1+tolerancia), mais chamadas
+    ao LLM ou mais erros. Retorna a lista de mensagens.
+    """
+    regressoes = []
+    for nome in ("chamadas_llm_fria", "chamadas_llm_quente", "erros", "intencao_divergente"):
+        atual, anterior = relatorio["contadores"].get(nome, 0), baseline["contadores"].get(nome, 0)
+        if atual > anterior:
+            regressoes.append(f"{nome}: {anterior} -> {atual}")
+    for rodada, dados in relatorio["rodadas"].items():
+        rodada_base = baseline.get("rodadas", {}).get(rodada, {})
+        etapas_base = rodada_base.get("etapas", {})
+        tokens_base = rodada_base.get("tokens_historico", {}).get("max")
+        if tokens_base and dados["tokens_historico"]["max"] > tokens_base * (1 + tolerancia):
+            regressoes.append(f"{rodada}/historico: {tokens_base} -> {dados['tokens_historico']['max']} tokens")
+        for etapa, medidas in dados["etapas"].items():
+            base = etapas_base.get(etapa)
+            if base is None:
+                continue
+            if medidas["p95_ms"] > base["p95_ms"] * (1 + tolerancia) + folga_ms:
+                regressoes.append(f"{rodada}/{etapa} p95: {base['p95_ms']:.1f} ms -> {medidas['p95_ms']:.1f} ms")
+            if medidas["pico_kb"] > base["pico_kb"] * (1 + tolerancia) + 64:
+                regressoes.append(f"{rodada}/{etapa} memória: {base['pico_kb']:.0f} KB -> {medidas['pico_kb']:.0f} KB")
+    return regressoes
+
+
+def imprimir_relatorio(relatorio):
+    config = relatorio["config"]
+    print(f"Escala {config['escala']}: {config['perguntas']} perguntas x {config['repeticoes']} repetições, "
+          f"{sum(config['linhas'].values())} linhas sintéticas; inicialização {relatorio['inicializacao_ms']:.0f} ms")
+    for rodada, dados in relatorio["rodadas"].items():
+        print(f"\n[{rodada}] {dados['vazao_perguntas_s']:.1f} perguntas/s | histórico no prompt: "
+              f"p50 {dados['tokens_historico']['p50']} / máx {dados['tokens_historico']['max']} tokens")
+        prompt = dados["tokens_prompt"]
+        print(f"  prompt SQL (p50): {prompt['anterior_p50']} -> {prompt['enviados_p50']} tokens enviados "
+              f"({prompt['economizados_por_pergunta']} economizados por pergunta)")
+        print(f"  {'etapa':<16}{'chamadas':>9}{'p50 ms':>10}{'p95 ms':>10}{'pico KB':>10}")
+        for etapa, medidas in dados["etapas"].items():
+            print(f"  {etapa:<16}{medidas['chamadas']:>9}{medidas['p50_ms']:>10.2f}{medidas['p95_ms']:>10.2f}"
+                  f"{medidas['pico_kb']:>10.1f}")
+    print("\nContadores: " + ", ".join(f"{nome}={valor}" for nome, valor in relatorio["contadores"].items()))
+
+
+# =======================================
+# 5️⃣ RERUNS CONCORRENTES
+# =======================================
+
+CONSULTA_RERUN = "SELECT COUNT(*) FROM SA1010 WHERE D_E_L_E_T_ = ' '"
+
+
+def _rerun_recursos_por_rerun(caminho, dicionario_em_cache, atraso_conexao):
+    """Início do app.py antes dos recursos do processo: tudo refeito a cada rerun."""
+    engine = criar_engine_sintetica(caminho, atraso_conexao)
+    try:
+        with engine.connect():  # conexão de teste
+            pass
+        # O dicionário já estava em st.cache_data, que devolve uma cópia a cada rerun
+        mapeamento, indices = pickle.loads(dicionario_em_cache)
+        calcular_versao_dicionario(mapeamento, REGRAS_NEGOCIO, REGRAS_PROTHEUS, indices)
+        ler_prompt_template("prompt_template.txt")
+        formatar_regras(REGRAS_NEGOCIO, REGRAS_PROTHEUS)
+        json.dumps(mapeamento, indent=2, ensure_ascii=False)
+        with engine.connect() as conn:
+            conn.execute(text(CONSULTA_RERUN)).scalar()
+    finally:
+        engine.dispose()
+
+
+def medir_reruns_concorrentes(sessoes=8, reruns=20, escala=1, atraso_conexao=0.0, semente=42):
+    """
+    `sessoes` threads, cada uma com `reruns` reruns seguidos: custo do início do
+    script (engine, conexão de teste, cópia do dicionário, prompt) com os recursos
+    refeitos a cada rerun x criados uma vez por processo (app.py atual) e uma
+    consulta no banco.
+    O cliente do Gemini e o PromptTemplate ficam de fora (sem rede/langchain aqui):
+    o custo "por rerun" medido é um piso.
+    """
+    with tempfile.TemporaryDirectory(prefix="reruns_protheus_") as pasta:
+        caminho = os.path.join(pasta, "protheus.sqlite")
+        criar_banco_sintetico(caminho, escala, semente)
+        snapshot = os.path.join(pasta, "sx3.json")
+
+        # Recursos do processo (app.py: st.cache_resource), criados antes da primeira sessão
+        engine = criar_engine_sintetica(caminho, atraso_conexao, **CONFIG_POOL)
+        with engine.connect():
+            pass
+        mapeamento, indices, _ = sincronizar_dicionario(engine, TABELAS_DICIONARIO, snapshot)
+        dicionario_em_cache = pickle.dumps((mapeamento, indices))
+
+        def rerun_recursos_do_processo():
+            with engine.connect() as conn:
+                conn.execute(text(CONSULTA_RERUN)).scalar()
+
+        relatorio = {}
+        for nome, rerun in (("por rerun", lambda: _rerun_recursos_por_rerun(caminho, dicionario_em_cache, atraso_conexao)),
+                            ("por processo", rerun_recursos_do_processo)):
+            medidor = MedidorLatencia(max_amostras=sessoes * reruns)
+
+            def sessao():
+                for _ in range(reruns):
+                    inicio = time.perf_counter()
+                    rerun()
+                    medidor.registrar(inicio)
+
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=sessoes) as executor:
+                for futuro in [executor.submit(sessao) for _ in range(sessoes)]:
+                    futuro.result()
+            duracao = time.perf_counter() - inicio
+            relatorio[nome] = {**medidor.resumo(), "reruns_por_s": sessoes * reruns / duracao}
+        relatorio["conexoes_no_pool"] = engine.pool.checkedin()
+        engine.dispose()
+    return relatorio
+
+
+def imprimir_reruns(relatorio, sessoes, reruns, atraso_conexao):
+    print(f"{sessoes} sessões x {reruns} reruns (conexão nova: +{1000 * atraso_conexao:.0f} ms)")
+    print(f"{'recursos':<14}{'p50 ms':>9}{'p95 ms':>9}{'reruns/s':>10}")
+    for nome in ("por rerun", "por processo"):
+        r = relatorio[nome]
+        print(f"{nome:<14}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['reruns_por_s']:>10.1f}")
+    print(f"Conexões abertas no pool ao final: {relatorio['conexoes_no_pool']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline do chatbot Protheus.")
+    parser.add_argument("--escala", type=float, default=1.0, help="multiplicador do volume de dados sintéticos")
+    parser.add_argument("--repeticoes", type=int, default=3, help="1 rodada fria + N-1 quentes")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--atraso-llm", type=float, default=0.0, help="latência simulada do LLM (segundos)")
+    parser.add_argument("--sem-cache-contexto", action="store_true", help="envia o prompt inteiro a cada pergunta")
+    parser.add_argument("--replica", action="store_true", help="agregações na réplica DuckDB (replica.py)")
+    parser.add_argument("--baseline", default=CAMINHO_BASELINE)
+    parser.add_argument("--gravar-baseline", action="store_true")
+    parser.add_argument("--comparar", action="store_true")
+    parser.add_argument("--tolerancia", type=float, default=0.5, help="folga relativa no p95 e na memória")
+    parser.add_argument("--sessoes", type=int, default=0,
+                        help="mede só o custo do rerun com N sessões simultâneas (recursos por rerun x por processo)")
+    parser.add_argument("--reruns", type=int, default=20, help="reruns por sessão (com --sessoes)")
+    parser.add_argument("--atraso-conexao", type=float, default=0.0,
+                        help="latência simulada de cada conexão nova ao banco (segundos, com --sessoes)")
+    args = parser.parse_args(argv)
+
+    if args.sessoes:
+        imprimir_reruns(medir_reruns_concorrentes(args.sessoes, args.reruns, args.escala, args.atraso_conexao,
+                                                  args.semente), args.sessoes, args.reruns, args.atraso_conexao)
+        return 0
+
+    relatorio = executar_benchmark(args.escala, args.repeticoes, args.semente, args.atraso_llm,
+                                   cache_contexto=not args.sem_cache_contexto, replica=args.replica)
+    imprimir_relatorio(relatorio)
+
+    if args.gravar_baseline:
+        gravar_baseline(relatorio, args.baseline)
+        print(f"\n💾 Baseline gravada em {args.baseline}")
+    if args.comparar:
+        with open(args.baseline, encoding="utf-8") as arquivo:
+            regressoes = comparar_com_baseline(relatorio, json.load(arquivo), args.tolerancia)
+        if regressoes:
+            print("\n⚠️ Regressões em relação à baseline:\n  " + "\n  ".join(regressoes))
+            return 1
+        print("\n✅ Sem regressões em relação à baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
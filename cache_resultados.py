@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+
+import pyarrow as pa
+
+from consulta_sql import normalizar_sql, tabelas_da_consulta
+
+# TTL (segundos) por (tipo de registro, modo) de REGRAS_PROTHEUS:
+# cadastros mudam pouco; movimentos (pedidos, notas, saldos) mudam o tempo todo
+TTL_POR_CLASSIFICACAO = {
+    ("Cadastro", "C"): 3600,
+    ("Cadastro", "E"): 1800,
+    ("Movimento", "C"): 120,
+    ("Movimento", "E"): 60,
+}
+TTL_PADRAO = 60
+
+
+def ttl_da_tabela(regras_protheus, tabela):
+    regra = regras_protheus.get(tabela)
+    if not isinstance(regra, dict):
+        return TTL_PADRAO
+    return TTL_POR_CLASSIFICACAO.get((regra.get("tipo_registro"), regra.get("modo")), TTL_PADRAO)
+
+
+def ttl_da_consulta(regras_protheus, sql):
+    """A consulta vive o TTL da tabela mais volátil que ela lê."""
+    tabelas = tabelas_da_consulta(sql)
+    if not tabelas:
+        return TTL_PADRAO
+    return min(ttl_da_tabela(regras_protheus, t) for t in tabelas)
+
+
+def serializar_resultado(df):
+    """DataFrame -> Arrow IPC comprimido (colunar, sem objetos pandas)."""
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    opcoes = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_stream(sink, tabela.schema, options=opcoes) as writer:
+        writer.write_table(tabela)
+    return sink.getvalue()
+
+
+def desserializar_resultado(buffer):
+    return pa.ipc.open_stream(buffer).read_all().to_pandas()
+
+
+class CacheResultados:
+    """
+    Cache de resultados de consultas, em memória do processo.
+    Chave: SQL normalizado (+ variante). TTL por tabela (REGRAS_PROTHEUS), despejo LRU
+    por tamanho total em bytes e invalidação explícita por tabela.
+    """
+
+    def __init__(self, regras_protheus, max_bytes=256 * 1024 * 1024, max_bytes_item=None):
+        self.regras = regras_protheus
+        self.max_bytes = max_bytes
+        self.max_bytes_item = max_bytes_item or max_bytes // 4
+        self._itens = OrderedDict()  # chave -> (buffer, expira_em, tabelas)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def _remover(self, chave):
+        buffer, _, _ = self._itens.pop(chave)
+        self._bytes -= buffer.size
+
+    @staticmethod
+    def _chave(sql, variante):
+        return f"{normalizar_sql(sql)}|{variante}"
+
+    def obter(self, sql, variante=""):
+        """variante distingue execuções do mesmo SQL (ex.: página, contagem)."""
+        chave = self._chave(sql, variante)
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None and item[1] < time.monotonic():
+                self._remover(chave)
+                item = None
+            if item is None:
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            buffer = item[0]
+        return desserializar_resultado(buffer)
+
+    def guardar(self, sql, df, variante=""):
+        """Guarda o resultado; ignora silenciosamente tipos que o Arrow não converte."""
+        chave = self._chave(sql, variante)
+        try:
+            buffer = serializar_resultado(df)
+        except (pa.ArrowException, TypeError, ValueError):
+            return False
+        if buffer.size > self.max_bytes_item:
+            return False
+
+        expira_em = time.monotonic() + ttl_da_consulta(self.regras, sql)
+        with self._lock:
+            if chave in self._itens:
+                self._remover(chave)
+            self._itens[chave] = (buffer, expira_em, tabelas_da_consulta(sql))
+            self._bytes += buffer.size
+            while self._bytes > self.max_bytes and self._itens:
+                self._remover(next(iter(self._itens)))
+        return True
+
+    def invalidar_tabela(self, tabela):
+        """Remove todos os resultados que leram a tabela (ex.: 'SC5')."""
+        with self._lock:
+            for chave in [c for c, item in self._itens.items() if tabela in item[2]]:
+                self._remover(chave)
+
+    def estatisticas(self):
+        with self._lock:
+            total = self.acertos + self.falhas
+            return {
+                "itens": len(self._itens),
+                "bytes": self._bytes,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": self.acertos / total if total else 0.0,
+            }
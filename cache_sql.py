@@ -0,0 +1,183 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from texto import normalizar_texto, tokenizar
+
+# Perguntas que só fazem sentido com o histórico ("e no mês passado?") não usam o cache
+MARCADORES_DE_CONTINUACAO = re.compile(
+    r"^(e|agora|entao|tambem)\b|\b(mesm[oa]s?|dess[ea]s?|diss[oa]|anterior|acima)\b"
+)
+
+
+def calcular_versao_dicionario(mapeamento, *regras):
+    """
+    Hash do dicionário SX3 + regras de negócio.
+    Qualquer mudança no dicionário ou nas regras invalida o SQL já gerado.
+    """
+    conteudo = json.dumps([mapeamento, *regras], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()[:16]
+
+
+def depende_do_historico(pergunta):
+    return bool(MARCADORES_DE_CONTINUACAO.search(normalizar_texto(pergunta)))
+
+
+class CacheGeracaoSQL:
+    """
+    Cache persistente (SQLite) das respostas do LLM para o SQL gerado.
+    Chave: pergunta normalizada + data_hoje + versão do dicionário.
+    Despejo por TTL e LRU (max_itens); opcionalmente reaproveita
+    perguntas parafraseadas (mesmos números e palavras quase iguais, na mesma ordem).
+    """
+
+    def __init__(self, caminho=".cache/geracao_sql.sqlite", max_itens=500,
+                 ttl_segundos=7 * 24 * 3600, similaridade=True, limiar_palavra=0.85):
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self.max_itens = max_itens
+        self.ttl_segundos = ttl_segundos
+        self.similaridade = similaridade
+        self.limiar_palavra = limiar_palavra
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS geracao (
+                chave TEXT PRIMARY KEY,
+                assinatura TEXT NOT NULL,
+                data_hoje TEXT NOT NULL,
+                versao TEXT NOT NULL,
+                resposta TEXT NOT NULL,
+                sql_blocks TEXT NOT NULL,
+                latencia REAL NOT NULL,
+                criado REAL NOT NULL,
+                acessado REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_geracao_bucket ON geracao (data_hoje, versao)")
+        self._conn.commit()
+
+        # Contadores do processo
+        self.acertos = 0
+        self.acertos_similares = 0
+        self.falhas = 0
+        self.segundos_economizados = 0.0
+
+    @staticmethod
+    def _assinatura(pergunta):
+        """Tokens na ordem da pergunta: "pedidos sem nota" e "notas sem pedido" não se confundem."""
+        return " ".join(tokenizar(pergunta))
+
+    @staticmethod
+    def _chave(assinatura, data_hoje, versao):
+        return hashlib.sha256(f"{versao}|{data_hoje}|{assinatura}".encode("utf-8")).hexdigest()
+
+    def _parafrase(self, assinatura_a, assinatura_b):
+        """
+        Mesmos números na mesma ordem ("top 10 ... últimos 5" != "top 5 ... últimos 10")
+        e, alinhadas as sequências, toda palavra diferente é quase igual à da mesma posição.
+        """
+        tokens_a, tokens_b = assinatura_a.split(), assinatura_b.split()
+        if [t for t in tokens_a if t.isdigit()] != [t for t in tokens_b if t.isdigit()]:
+            return False
+        alinhamento = difflib.SequenceMatcher(None, tokens_a, tokens_b, autojunk=False)
+        for operacao, i1, i2, j1, j2 in alinhamento.get_opcodes():
+            if operacao == "equal":
+                continue
+            if operacao != "replace" or i2 - i1 != j2 - j1:
+                return False
+            if any(difflib.SequenceMatcher(None, a, b).ratio() < self.limiar_palavra
+                   for a, b in zip(tokens_a[i1:i2], tokens_b[j1:j2])):
+                return False
+        return True
+
+    def _expirado(self, criado, agora):
+        return self.ttl_segundos is not None and agora - criado > self.ttl_segundos
+
+    def _localizar(self, assinatura, data_hoje, versao):
+        """Busca exata pela chave e, se habilitado, por paráfrase no mesmo bucket."""
+        linha = self._conn.execute(
+            "SELECT chave, resposta, sql_blocks, latencia, criado FROM geracao WHERE chave = ?",
+            (self._chave(assinatura, data_hoje, versao),),
+        ).fetchone()
+        if linha is not None or not self.similaridade or not assinatura:
+            return linha, False
+
+        candidatos = self._conn.execute(
+            "SELECT chave, resposta, sql_blocks, latencia, criado, assinatura FROM geracao "
+            "WHERE data_hoje = ? AND versao = ?",
+            (data_hoje, versao),
+        ).fetchall()
+        melhor, similar = 0.0, None
+        for candidato in candidatos:
+            if not self._parafrase(assinatura, candidato[5]):
+                continue
+            razao = difflib.SequenceMatcher(None, assinatura, candidato[5]).ratio()
+            if razao > melhor:
+                melhor, similar = razao, candidato[:5]
+        return similar, similar is not None
+
+    def obter(self, pergunta, data_hoje, versao):
+        """Retorna (resposta, sql_blocks) ou None em caso de falha no cache."""
+        agora = time.time()
+        with self._lock:
+            linha, similar = self._localizar(self._assinatura(pergunta), data_hoje, versao)
+
+            if linha is not None and self._expirado(linha[4], agora):
+                self._conn.execute("DELETE FROM geracao WHERE chave = ?", (linha[0],))
+                self._conn.commit()
+                linha = None
+
+            if linha is None:
+                self.falhas += 1
+                return None
+
+            self._conn.execute("UPDATE geracao SET acessado = ? WHERE chave = ?", (agora, linha[0]))
+            self._conn.commit()
+            self.acertos += 1
+            self.acertos_similares += int(similar)
+            self.segundos_economizados += linha[3]
+            return linha[1], json.loads(linha[2])
+
+    def guardar(self, pergunta, data_hoje, versao, resposta, sql_blocks, latencia):
+        assinatura = self._assinatura(pergunta)
+        agora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geracao VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._chave(assinatura, data_hoje, versao), assinatura, data_hoje, versao,
+                 resposta, json.dumps(sql_blocks, ensure_ascii=False), latencia, agora, agora),
+            )
+            if self.ttl_segundos is not None:
+                self._conn.execute("DELETE FROM geracao WHERE criado < ?", (agora - self.ttl_segundos,))
+            # LRU: mantém apenas os max_itens acessados mais recentemente
+            self._conn.execute(
+                "DELETE FROM geracao WHERE chave NOT IN "
+                "(SELECT chave FROM geracao ORDER BY acessado DESC LIMIT ?)",
+                (self.max_itens,),
+            )
+            self._conn.commit()
+
+    def invalidar(self, pergunta, data_hoje, versao):
+        """Remove a entrada que respondeu a pergunta (ex.: o SQL gerado falhou no banco)."""
+        with self._lock:
+            linha, _ = self._localizar(self._assinatura(pergunta), data_hoje, versao)
+            if linha is not None:
+                self._conn.execute("DELETE FROM geracao WHERE chave = ?", (linha[0],))
+                self._conn.commit()
+
+    def estatisticas(self):
+        total = self.acertos + self.falhas
+        return {
+            "acertos": self.acertos,
+            "acertos_similares": self.acertos_similares,
+            "falhas": self.falhas,
+            "taxa_acerto": self.acertos / total if total else 0.0,
+            "chamadas_llm_economizadas": self.acertos,
+            "segundos_economizados": self.segundos_economizados,
+        }
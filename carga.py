@@ -0,0 +1,114 @@
+"""
+Teste de carga da API (servico.py) com os stand-ins do benchmark: banco SQLite
+sintético e LLM gravado com latência simulada, tudo no mesmo processo (httpx +
+ASGITransport, sem rede). Roda a mesma carga com e sem coalescência.
+
+    python carga.py
+    python carga.py --usuarios 64 --requisicoes 600 --atraso-llm 0.5 --max-llm 8
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+from benchmark import CAMINHO_CORPUS, LLMGravado, _percentil, carregar_corpus, montar_pipeline_sintetico
+from motor import MotorProtheus
+from servico import criar_app
+
+
+def sortear_perguntas(corpus, quantidade, semente):
+    """Popularidade concentrada (Zipf): poucas perguntas respondem pela maior parte da carga, como no uso real."""
+    aleatorio = random.Random(semente)
+    perguntas = [item["pergunta"] for item in corpus]
+    aleatorio.shuffle(perguntas)
+    pesos = [1 / (posicao + 1) for posicao in range(len(perguntas))]
+    return aleatorio.choices(perguntas, weights=pesos, k=quantidade)
+
+
+async def _usuario(cliente, fila, latencias, status):
+    while True:
+        try:
+            pergunta = fila.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        inicio = time.perf_counter()
+        resposta = await cliente.post("/perguntas", json={"pergunta": pergunta})
+        latencias.append(time.perf_counter() - inicio)
+        erro = resposta.status_code == 200 and any("erro" in consulta for consulta in resposta.json()["consultas"])
+        status["erro_consulta" if erro else resposta.status_code] += 1
+
+
+async def executar_carga(perguntas, corpus, usuarios=32, atraso_llm=0.3, max_llm=4, max_banco=4, coalescer=True,
+                         escala=1):
+    """Uma rodada com caches frios; retorna as métricas da rodada."""
+    with tempfile.TemporaryDirectory(prefix="carga_protheus_") as pasta:
+        llm = LLMGravado(corpus, atraso_primeiro_token=atraso_llm)
+        pipeline, _ = montar_pipeline_sintetico(pasta, llm, escala)
+        motor = MotorProtheus(pipeline, max_llm=max_llm, max_banco=max_banco, coalescer=coalescer)
+        app = criar_app(lambda: motor)
+
+        fila = asyncio.Queue()
+        for pergunta in perguntas:
+            fila.put_nowait(pergunta)
+        latencias = []
+        status = Counter()
+        transporte = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app), \
+                httpx.AsyncClient(transport=transporte, base_url="http://carga", timeout=None) as cliente:
+            inicio = time.perf_counter()
+            await asyncio.gather(*(_usuario(cliente, fila, latencias, status) for _ in range(usuarios)))
+            duracao = time.perf_counter() - inicio
+            estatisticas = (await cliente.get("/estatisticas")).json()
+        pipeline.engine.dispose()
+
+    return {
+        "requisicoes": len(perguntas),
+        "duracao_s": duracao,
+        "vazao_rps": len(perguntas) / duracao,
+        "p50_ms": 1000 * _percentil(latencias, 0.5),
+        "p95_ms": 1000 * _percentil(latencias, 0.95),
+        "status": dict(status),
+        "chamadas_llm": llm.chamadas,
+        "geracoes": estatisticas["geracoes"],
+        "consultas": estatisticas["consultas"],
+    }
+
+
+def imprimir(resultados):
+    print(f"{'':<16}{'req/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'LLM':>6}{'ger. exec/coal.':>17}"
+          f"{'cons. exec/coal.':>18}  status")
+    for nome, r in resultados.items():
+        geracoes = f"{r['geracoes']['executadas']}/{r['geracoes']['coalescidas']}"
+        consultas = f"{r['consultas']['executadas']}/{r['consultas']['coalescidas']}"
+        print(f"{nome:<16}{r['vazao_rps']:>8.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['chamadas_llm']:>6}"
+              f"{geracoes:>17}{consultas:>18}  {r['status']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da API com banco sintético e LLM gravado.")
+    parser.add_argument("--usuarios", type=int, default=32, help="clientes simultâneos")
+    parser.add_argument("--requisicoes", type=int, default=300)
+    parser.add_argument("--atraso-llm", type=float, default=0.3, help="latência simulada por chamada ao LLM (s)")
+    parser.add_argument("--max-llm", type=int, default=4)
+    parser.add_argument("--max-banco", type=int, default=4)
+    parser.add_argument("--escala", type=int, default=1)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = carregar_corpus(CAMINHO_CORPUS)
+    perguntas = sortear_perguntas(corpus, args.requisicoes, args.semente)
+    print(f"{args.requisicoes} requisições ({len(set(perguntas))} perguntas distintas), {args.usuarios} usuários, "
+          f"LLM {1000 * args.atraso_llm:.0f} ms, limites LLM/banco {args.max_llm}/{args.max_banco}\n")
+    resultados = {}
+    for nome, coalescer in (("com coalescência", True), ("sem coalescência", False)):
+        resultados[nome] = asyncio.run(executar_carga(
+            perguntas, corpus, args.usuarios, args.atraso_llm, args.max_llm, args.max_banco, coalescer, args.escala))
+    imprimir(resultados)
+
+
+if __name__ == "__main__":
+    main()
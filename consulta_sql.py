@@ -0,0 +1,244 @@
+import re
+
+# Nomes físicos do Protheus: 3 caracteres + empresa "010"
+PADRAO_TABELA_FISICA = re.compile(r"\b([A-Z][A-Z0-9]{2})010\b")
+
+# Literais de string T-SQL ('...' com '' escapado)
+PADRAO_LITERAL = re.compile(r"('(?:[^']|'')*')")
+
+
+def normalizar_sql(sql):
+    """
+    Forma canônica do SQL para chaves de cache: espaços colapsados,
+    sem ';' final e maiúsculas fora dos literais de string.
+    """
+    partes = PADRAO_LITERAL.split(sql.strip().rstrip(";").strip())
+    normalizado = []
+    for i, parte in enumerate(partes):
+        if i % 2 == 1:
+            normalizado.append(parte)  # literal: preservado
+        else:
+            normalizado.append(re.sub(r"\s+", " ", parte).upper())
+    return "".join(normalizado).strip()
+
+
+def tabelas_da_consulta(sql):
+    """Tabelas lógicas (ex.: 'SC5') referenciadas pelos nomes físicos no SQL."""
+    sem_literais = PADRAO_LITERAL.sub("''", sql.upper())
+    return sorted(set(PADRAO_TABELA_FISICA.findall(sem_literais)))
+
+
+def _mascarar(sql):
+    """
+    Copia do SQL (mesmo tamanho) com literais, identificadores entre aspas/colchetes
+    e trechos dentro de parênteses trocados por espaços: sobra só o nível zero.
+    """
+    saida = []
+    profundidade = 0
+    fechamento = None
+    for caractere in sql:
+        if fechamento is not None:
+            saida.append(" ")
+            if caractere == fechamento:
+                fechamento = None
+            continue
+        if caractere in "'\"[":
+            fechamento = {"'": "'", '"': '"', "[": "]"}[caractere]
+            saida.append(" ")
+        elif caractere == "(":
+            profundidade += 1
+            saida.append(" ")
+        elif caractere == ")":
+            profundidade -= 1
+            saida.append(" ")
+        else:
+            saida.append(caractere.upper() if profundidade == 0 else " ")
+    return "".join(saida)
+
+
+PADRAO_TOP = re.compile(r"^\s*SELECT\s+(DISTINCT\s+)?TOP\s*(\(\s*(\d+)\s*\)|(\d+))(\s+PERCENT|\s+WITH\s+TIES)?", re.IGNORECASE)
+
+
+def limite_top(sql):
+    """Valor do TOP n da consulta externa (None se não houver ou for PERCENT/WITH TIES)."""
+    m = PADRAO_TOP.match(sql)
+    if not m or m.group(5):
+        return None
+    return int(m.group(3) or m.group(4))
+
+
+def posicao_order_by(sql):
+    """Índice do ORDER BY de nível zero (da consulta externa) ou None."""
+    encontrados = [m.start() for m in re.finditer(r"\bORDER\s+BY\b", _mascarar(sql))]
+    return encontrados[-1] if encontrados else None
+
+
+def consulta_composta(sql):
+    return bool(re.search(r"\b(UNION|EXCEPT|INTERSECT|OFFSET|FOR\s+XML|FOR\s+JSON)\b", _mascarar(sql)))
+
+
+def paginar_sql(sql, offset, limite):
+    """
+    Reescreve a consulta com OFFSET/FETCH no servidor, preservando TOP e ORDER BY:
+    TOP n + ORDER BY equivale a OFFSET 0 FETCH n. Retorna None quando não é
+    seguro reescrever (UNION, OFFSET já existente, TOP PERCENT/WITH TIES) ou
+    quando a página começa depois do TOP.
+    """
+    sql = sql.strip().rstrip(";").strip()
+    if consulta_composta(sql):
+        return None
+    top = limite_top(sql)
+    if top is None and PADRAO_TOP.match(sql):
+        return None
+    if top is not None:
+        limite = min(limite, top - offset)
+        m = PADRAO_TOP.match(sql)
+        sql = "SELECT " + (m.group(1) or "") + sql[m.end():].lstrip()
+    if limite <= 0:
+        return None
+    if posicao_order_by(sql) is None:
+        sql += " ORDER BY (SELECT NULL)"
+    return f"{sql} OFFSET {int(offset)} ROWS FETCH NEXT {int(limite)} ROWS ONLY"
+
+
+def sql_contagem(sql):
+    """COUNT(*) do resultado completo (o ORDER BY externo é descartado quando não há TOP)."""
+    sql = sql.strip().rstrip(";").strip()
+    ordem = posicao_order_by(sql)
+    if ordem is not None and not PADRAO_TOP.match(sql):
+        sql = sql[:ordem].rstrip()
+    return f"SELECT COUNT_BIG(*) AS total FROM ({sql}) AS consulta_contagem"
+
+
+def forcar_top(sql, n):
+    """Aplica TOP n à consulta externa (mantém um TOP menor já existente)."""
+    sql = sql.strip().rstrip(";").strip()
+    m = PADRAO_TOP.match(sql)
+    if m:
+        atual = limite_top(sql)
+        if atual is not None and atual <= n:
+            return sql
+        if atual is None:  # TOP PERCENT/WITH TIES: não reescreve
+            return sql
+        return "SELECT " + (m.group(1) or "") + f"TOP {int(n)} " + sql[m.end():].lstrip()
+    m = re.match(r"^\s*SELECT\s+(DISTINCT\s+)?", sql, re.IGNORECASE)
+    return "SELECT " + (m.group(1) or "").upper() + f"TOP {int(n)} " + sql[m.end():]
+
+
+def consulta_agregada(sql):
+    """True se a consulta externa agrega (GROUP BY ou agregação na lista do SELECT)."""
+    mascarado = _mascarar(sql)
+    if re.search(r"\bGROUP\s+BY\b", mascarado):
+        return True
+    fim_lista = re.search(r"\bFROM\b", mascarado)
+    lista_select = mascarado[:fim_lista.start()] if fim_lista else mascarado
+    return bool(re.search(r"\b(SUM|COUNT|COUNT_BIG|AVG|MIN|MAX)\b", lista_select))
+
+
+# TOP e OFFSET/FETCH -> LIMIT, para os bancos locais (SQLite do benchmark, DuckDB da réplica)
+PADRAO_OFFSET_FETCH = re.compile(r"\bOFFSET\s+(\d+)\s+ROWS\s+FETCH\s+NEXT\s+(\d+)\s+ROWS\s+ONLY", re.IGNORECASE)
+PADRAO_TOP_LOCAL = re.compile(r"\bSELECT\s+(DISTINCT\s+)?TOP\s*\(?\s*(\d+)\s*\)?\s+", re.IGNORECASE)
+
+
+def _fim_do_select(sql, inicio):
+    """Posição onde termina o SELECT que começa em `inicio` (parêntese que o fecha, ou fim do texto)."""
+    profundidade = 0
+    aspas = None
+    for posicao in range(inicio, len(sql)):
+        caractere = sql[posicao]
+        if aspas:
+            if caractere == aspas:
+                aspas = None
+        elif caractere in "'\"":
+            aspas = caractere
+        elif caractere == "(":
+            profundidade += 1
+        elif caractere == ")":
+            if profundidade == 0:
+                return posicao
+            profundidade -= 1
+    return len(sql.rstrip().rstrip(";").rstrip())
+
+
+def top_para_limit(sql):
+    """SELECT TOP n (em qualquer nível) e OFFSET/FETCH viram LIMIT/OFFSET."""
+    sql = PADRAO_OFFSET_FETCH.sub(r"LIMIT \2 OFFSET \1", sql)
+    while True:
+        top = PADRAO_TOP_LOCAL.search(sql)
+        if top is None:
+            return sql
+        fim = _fim_do_select(sql, top.end())
+        sql = (sql[:top.start()] + f"SELECT {top.group(1) or ''}" + sql[top.end():fim]
+               + f" LIMIT {top.group(2)}" + sql[fim:])
+
+
+PADRAO_ABERTURA_SQL = re.compile(r"```sql\s", re.IGNORECASE)
+
+
+def _sufixo_parcial(texto, marcador):
+    """Tamanho do maior final de `texto` que ainda pode virar `marcador` com o próximo trecho."""
+    for tamanho in range(min(len(marcador), len(texto)), 0, -1):
+        if marcador.startswith(texto[-tamanho:].lower()):
+            return tamanho
+    return 0
+
+
+class ParserBlocosSQL:
+    """
+    Parser incremental das cercas ```sql da resposta do LLM em streaming.
+    `alimentar(trecho)` devolve eventos na ordem em que ficam prontos:
+    ("texto", s) fora das cercas, ("sql_parcial", bloco_ate_agora) e ("sql", bloco)
+    quando a cerca fecha. Blocos sem cerca de fechamento são descartados,
+    como no re.findall(r"```sql\\s+(.*?)```") da resposta completa.
+    """
+
+    def __init__(self):
+        self._pendente = ""
+        self._bloco = None  # None: fora de uma cerca
+        self.texto = ""
+        self.blocos = []
+
+    def alimentar(self, trecho):
+        self._pendente += trecho
+        eventos = []
+        while self._pendente:
+            if self._bloco is None:
+                m = PADRAO_ABERTURA_SQL.search(self._pendente)
+                if m:
+                    self._emitir_texto(eventos, self._pendente[:m.start()])
+                    self._pendente = self._pendente[m.end():]
+                    self._bloco = ""
+                    continue
+                # "```sq" no fim do trecho pode ser o começo de uma cerca
+                guardar = _sufixo_parcial(self._pendente, "```sql")
+                self._emitir_texto(eventos, self._pendente[:len(self._pendente) - guardar])
+                self._pendente = self._pendente[len(self._pendente) - guardar:]
+                break
+
+            fim = self._pendente.find("```")
+            if fim >= 0:
+                bloco = (self._bloco + self._pendente[:fim]).strip()
+                self._pendente = self._pendente[fim + 3:]
+                self._bloco = None
+                self.blocos.append(bloco)
+                eventos.append(("sql", bloco))
+                continue
+            guardar = _sufixo_parcial(self._pendente, "```")
+            self._bloco += self._pendente[:len(self._pendente) - guardar]
+            self._pendente = self._pendente[len(self._pendente) - guardar:]
+            eventos.append(("sql_parcial", self._bloco.lstrip()))
+            break
+        return eventos
+
+    def finalizar(self):
+        """Fim do stream: devolve o texto retido; um bloco ainda aberto é descartado."""
+        eventos = []
+        if self._bloco is None:
+            self._emitir_texto(eventos, self._pendente)
+        self._pendente, self._bloco = "", None
+        return eventos
+
+    def _emitir_texto(self, eventos, texto):
+        if texto:
+            self.texto += texto
+            eventos.append(("texto", texto))
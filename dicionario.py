@@ -0,0 +1,526 @@
+import datetime
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from sqlalchemy import bindparam, text
+
+from esquema import SINONIMOS_TABELAS, _termos
+
+TABELAS_DICIONARIO = ["SC5", "SC6", "SD2", "SF2", "SB1", "SB2", "SA1", "SA2"]
+
+VERSAO_SNAPSHOT = 2
+
+# 1. Uma única query parametrizada para todas as tabelas
+CONSULTA_CAMPOS = text("""
+    SELECT
+        X3_ARQUIVO,
+        X3_CAMPO,
+        X3_TIPO,
+        X3_TITULO,
+        X3_DESCRIC
+    FROM SX3010
+    WHERE X3_ARQUIVO IN :tabelas AND D_E_L_E_T_ = ' '
+    ORDER BY X3_ARQUIVO, X3_ORDEM
+""").bindparams(bindparam("tabelas", expanding=True))
+
+# 2. Índices (SIX) das mesmas tabelas, na ordem do Protheus
+CONSULTA_INDICES = text("""
+    SELECT
+        INDICE,
+        ORDEM,
+        CHAVE
+    FROM SIX010
+    WHERE INDICE IN :tabelas AND D_E_L_E_T_ = ' '
+    ORDER BY INDICE, ORDEM
+""").bindparams(bindparam("tabelas", expanding=True))
+
+# 3. Marcas d'água por tabela: detecta inclusão (R_E_C_N_O_), alteração (S_T_A_M_P_)
+#    e exclusão lógica (contagem de ativos) sem reler os campos
+CONSULTA_MARCAS = """
+    SELECT
+        X3_ARQUIVO,
+        SUM(CASE WHEN D_E_L_E_T_ = ' ' THEN 1 ELSE 0 END),
+        COUNT(*),
+        MAX(R_E_C_N_O_){coluna_stamp}
+    FROM SX3010
+    WHERE X3_ARQUIVO IN :tabelas
+    GROUP BY X3_ARQUIVO
+"""
+
+CONSULTA_MARCAS_INDICES = text("""
+    SELECT
+        INDICE,
+        SUM(CASE WHEN D_E_L_E_T_ = ' ' THEN 1 ELSE 0 END),
+        COUNT(*),
+        MAX(R_E_C_N_O_)
+    FROM SIX010
+    WHERE INDICE IN :tabelas
+    GROUP BY INDICE
+""").bindparams(bindparam("tabelas", expanding=True))
+
+
+def formatar_campo(tipo, titulo, descricao):
+    """Combina título e descrição para dar o máximo de contexto ao LLM."""
+    tipo, titulo, descricao = (tipo or "").strip(), (titulo or "").strip(), (descricao or "").strip()
+    contexto_campo = titulo
+    if descricao and descricao != titulo:
+        contexto_campo = f"{titulo} ({descricao})"
+    return f"Tipo: {tipo}, Descrição: {contexto_campo}"
+
+
+def ler_campos(conn, tabelas):
+    """Lê o SX3 de várias tabelas de uma vez: {tabela: {campo: descrição}}."""
+    mapeamento = {tabela: {} for tabela in tabelas}
+    rows = conn.execute(CONSULTA_CAMPOS, {"tabelas": [t[:3] for t in tabelas]}).fetchall()
+    for arquivo, campo, tipo, titulo, descricao in rows:
+        mapeamento.setdefault(arquivo.strip(), {})[campo.strip()] = formatar_campo(tipo, titulo, descricao)
+    return mapeamento
+
+
+def campos_da_chave(chave):
+    """CHAVE do SIX ('C5_FILIAL+DTOS(C5_EMISSAO)+C5_NUM') -> ['C5_FILIAL', 'C5_EMISSAO', 'C5_NUM']."""
+    campos = []
+    for parte in (chave or "").split("+"):
+        encontrado = re.search(r"[A-Z][A-Z0-9]{1,2}_[A-Z0-9_]+", parte.upper())
+        if encontrado:
+            campos.append(encontrado.group(0))
+    return campos
+
+
+def ler_indices(conn, tabelas):
+    """Lê o SIX de várias tabelas de uma vez: {tabela: [[campos do índice], ...]}."""
+    indices = {tabela: [] for tabela in tabelas}
+    rows = conn.execute(CONSULTA_INDICES, {"tabelas": [t[:3] for t in tabelas]}).fetchall()
+    for tabela, _, chave in rows:
+        campos = campos_da_chave(chave)
+        if campos:
+            indices.setdefault(tabela.strip(), []).append(campos)
+    return indices
+
+
+def ler_marcas(conn, tabelas, usar_stamp=True):
+    """
+    Retorna {tabela: [ativos, total, max_recno, max_stamp]}.
+    Se a coluna S_T_A_M_P_ não existir no SX3010, usa apenas R_E_C_N_O_ e contagens.
+    """
+    parametros = {"tabelas": [t[:3] for t in tabelas]}
+    if usar_stamp:
+        try:
+            consulta = text(CONSULTA_MARCAS.format(coluna_stamp=", MAX(S_T_A_M_P_)"))
+            rows = conn.execute(consulta.bindparams(bindparam("tabelas", expanding=True)), parametros).fetchall()
+            return {r[0].strip(): [r[1], r[2], r[3], _serializar(r[4])] for r in rows}
+        except Exception:
+            conn.rollback()
+    consulta = text(CONSULTA_MARCAS.format(coluna_stamp=""))
+    rows = conn.execute(consulta.bindparams(bindparam("tabelas", expanding=True)), parametros).fetchall()
+    return {r[0].strip(): [r[1], r[2], r[3], None] for r in rows}
+
+
+def ler_marcas_indices(conn, tabelas):
+    """Retorna {tabela: [ativos, total, max_recno]} do SIX010."""
+    rows = conn.execute(CONSULTA_MARCAS_INDICES, {"tabelas": [t[:3] for t in tabelas]}).fetchall()
+    return {r[0].strip(): [r[1], r[2], r[3]] for r in rows}
+
+
+def _serializar(valor):
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def carregar_snapshot(caminho):
+    """Snapshot local do dicionário, ou None se ausente/incompatível."""
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            snapshot = json.load(arquivo)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if snapshot.get("versao") != VERSAO_SNAPSHOT:
+        return None
+    return snapshot
+
+
+def salvar_snapshot(caminho, snapshot):
+    """Grava de forma atômica (arquivo temporário + rename)."""
+    if os.path.dirname(caminho):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(snapshot, arquivo, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+def sincronizar_dicionario(engine, tabelas=TABELAS_DICIONARIO, caminho=".cache/dicionario_sx3.json"):
+    """
+    Carrega o snapshot local e relê do SX3/SIX apenas as tabelas cujas marcas
+    d'água mudaram. Retorna (mapeamento, indices, tabelas_relidas).
+    """
+    snapshot = carregar_snapshot(caminho) or {"versao": VERSAO_SNAPSHOT, "tabelas": {}}
+    em_disco = snapshot["tabelas"]
+
+    with engine.connect() as conn:
+        marcas = ler_marcas(conn, tabelas)
+        marcas_indices = ler_marcas_indices(conn, tabelas)
+        marca = {t: {"campos": marcas.get(t[:3]), "indices": marcas_indices.get(t[:3])} for t in tabelas}
+        alteradas = [
+            t for t in tabelas
+            if t not in em_disco or em_disco[t]["marca"] != marca[t]
+        ]
+        if alteradas:
+            novos = ler_campos(conn, alteradas)
+            novos_indices = ler_indices(conn, alteradas)
+            for tabela in alteradas:
+                em_disco[tabela] = {
+                    "marca": marca[tabela],
+                    "campos": novos.get(tabela[:3], {}),
+                    "indices": novos_indices.get(tabela[:3], []),
+                }
+
+    if alteradas:
+        snapshot["atualizado_em"] = datetime.datetime.now().isoformat(timespec="seconds")
+        salvar_snapshot(caminho, snapshot)
+
+    return _extrair(em_disco, tabelas) + (alteradas,)
+
+
+def _extrair(em_disco, tabelas):
+    mapeamento = {t: em_disco[t]["campos"] for t in tabelas if em_disco.get(t, {}).get("campos")}
+    indices = {t: em_disco[t]["indices"] for t in tabelas if em_disco.get(t, {}).get("indices")}
+    return mapeamento, indices
+
+
+def mapeamento_do_snapshot(tabelas=TABELAS_DICIONARIO, caminho=".cache/dicionario_sx3.json"):
+    """Leitura apenas do disco (ex.: banco indisponível na inicialização). Retorna (mapeamento, indices)."""
+    snapshot = carregar_snapshot(caminho)
+    if snapshot is None:
+        return {}, {}
+    return _extrair(snapshot["tabelas"], tabelas)
+
+
+# =======================================
+# Dicionário sob demanda (demais tabelas do ERP)
+# =======================================
+
+# Catálogo: uma linha por tabela do SX2, lida uma vez (alguns milhares de linhas, sem campos)
+CONSULTA_CATALOGO = text("""
+    SELECT
+        X2_CHAVE,
+        X2_ARQUIVO,
+        X2_NOME,
+        X2_MODO
+    FROM SX2010
+    WHERE D_E_L_E_T_ = ' '
+""")
+
+# Relacionamentos do SX9 em que a tabela é domínio ou contradomínio
+CONSULTA_RELACIONAMENTOS = text("""
+    SELECT
+        X9_DOM,
+        X9_CDOM,
+        X9_EXPDOM,
+        X9_EXPCDOM
+    FROM SX9010
+    WHERE (X9_DOM IN :tabelas OR X9_CDOM IN :tabelas) AND D_E_L_E_T_ = ' '
+""").bindparams(bindparam("tabelas", expanding=True))
+
+# Código de tabela citado na pergunta ("SE1", "se2", "SC7010")
+PADRAO_CODIGO_TABELA = re.compile(r"\b([A-Za-z]{2}[0-9A-Za-z])(?:010)?\b")
+
+
+def ler_relacionamentos(conn, tabelas):
+    """Lê o SX9: {tabela: [(campos_da_tabela, outra_tabela, campos_da_outra), ...]}."""
+    relacionamentos = {tabela: [] for tabela in tabelas}
+    rows = conn.execute(CONSULTA_RELACIONAMENTOS, {"tabelas": [t[:3] for t in tabelas]}).fetchall()
+    for dominio, contradominio, expressao_dom, expressao_cdom in rows:
+        dominio, contradominio = dominio.strip(), contradominio.strip()
+        campos_dom, campos_cdom = campos_da_chave(expressao_dom), campos_da_chave(expressao_cdom)
+        if not campos_dom or len(campos_dom) != len(campos_cdom):
+            continue
+        if dominio in relacionamentos:
+            relacionamentos[dominio].append((campos_dom, contradominio, campos_cdom))
+        if contradominio in relacionamentos and contradominio != dominio:
+            relacionamentos[contradominio].append((campos_cdom, dominio, campos_dom))
+    return relacionamentos
+
+
+class DicionarioSobDemanda:
+    """
+    Cobertura do ERP inteiro sem carregar o SX3 de milhares de tabelas: o
+    catálogo do SX2 fica em memória e os campos (SX3), índices (SIX) e
+    relacionamentos (SX9) de uma tabela são lidos na primeira pergunta que
+    precisa dela. Os detalhes ficam num LRU de `max_tabelas`, com TTL para
+    acompanhar mudanças no dicionário. Seguro para várias threads.
+    """
+
+    def __init__(self, engine, max_tabelas=32, ttl_segundos=3600, max_por_pergunta=2, corte_relativo=0.75):
+        self.engine = engine
+        self.max_tabelas = max_tabelas
+        self.ttl_segundos = ttl_segundos
+        self.max_por_pergunta = max_por_pergunta
+        self.corte_relativo = corte_relativo
+        self.catalogo = {}  # tabela -> {"fisica", "nome", "modo"}
+        self._termos_tabela = {}  # termo -> {tabela: peso}
+        self._detalhes = OrderedDict()  # tabela -> (detalhe, expira_em)
+        self._lock = threading.Lock()
+        self.leituras = 0
+        self.acertos = 0
+        self.despejos = 0
+
+    def carregar_catalogo(self):
+        """Lê o SX2 e indexa os nomes das tabelas (e os sinônimos de negócio); retorna quantas tabelas."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(CONSULTA_CATALOGO).fetchall()
+        catalogo = {}
+        for chave, arquivo, nome, modo in rows:
+            tabela = chave.strip()
+            catalogo[tabela] = {"fisica": (arquivo or "").strip() or f"{tabela}010",
+                                "nome": (nome or "").strip(), "modo": (modo or "").strip()}
+
+        documentos = {t: set(_termos(f"{info['nome']} {SINONIMOS_TABELAS.get(t, '')}")) for t, info in catalogo.items()}
+        frequencia = defaultdict(int)
+        for termos in documentos.values():
+            for termo in termos:
+                frequencia[termo] += 1
+        indice = defaultdict(dict)
+        for tabela, termos in documentos.items():
+            for termo in termos:
+                indice[termo][tabela] = math.log((1 + len(documentos)) / frequencia[termo])
+        with self._lock:
+            self.catalogo, self._termos_tabela = catalogo, dict(indice)
+        return len(catalogo)
+
+    def tabelas_da_pergunta(self, pergunta, termos_conhecidos=(), excluir=()):
+        """
+        Tabelas do catálogo que a pergunta pede, fora de `excluir` (as já carregadas):
+        códigos citados ("SE1") ou, sem citação, por nome/sinônimo no SX2, só quando algum
+        termo da pergunta não é coberto pelo dicionário carregado (`termos_conhecidos`).
+        """
+        citadas = [c.upper() for c in PADRAO_CODIGO_TABELA.findall(pergunta)
+                   if any(ch.isdigit() for ch in c) or (c.isupper() and not pergunta.isupper())]
+        escolhidas = [t for t in dict.fromkeys(citadas) if t in self.catalogo and t not in excluir]
+
+        termos = set(_termos(pergunta))
+        if not citadas and termos - set(termos_conhecidos):
+            pontuacao = defaultdict(float)
+            for termo in termos:
+                for tabela, peso in self._termos_tabela.get(termo, {}).items():
+                    if tabela not in excluir:
+                        pontuacao[tabela] += peso
+            ranking = sorted(pontuacao.items(), key=lambda item: (-item[1], item[0]))
+            if ranking:
+                corte = ranking[0][1] * self.corte_relativo
+                escolhidas += [t for t, score in ranking if score >= corte and t not in escolhidas]
+        return escolhidas[:self.max_por_pergunta]
+
+    def em_cache(self, tabela):
+        """Detalhes já lidos (sem ir ao banco), ou None."""
+        with self._lock:
+            item = self._detalhes.get(tabela)
+        return item[0] if item is not None and item[1] > time.monotonic() else None
+
+    def detalhes(self, tabelas):
+        """{tabela: {fisica, nome, modo, campos, indices, relacionamentos}}; lê do banco só o que falta no LRU."""
+        agora = time.monotonic()
+        resultado, faltantes = {}, []
+        with self._lock:
+            for tabela in tabelas:
+                item = self._detalhes.get(tabela)
+                if item is not None and item[1] > agora:
+                    self._detalhes.move_to_end(tabela)
+                    resultado[tabela] = item[0]
+                    self.acertos += 1
+                elif tabela in self.catalogo:
+                    faltantes.append(tabela)
+        if faltantes:
+            # Fora do lock: três queries (SX3, SIX, SX9) para todas as tabelas que faltam
+            with self.engine.connect() as conn:
+                campos = ler_campos(conn, faltantes)
+                indices = ler_indices(conn, faltantes)
+                relacionamentos = ler_relacionamentos(conn, faltantes)
+            with self._lock:
+                for tabela in faltantes:
+                    detalhe = {**self.catalogo[tabela], "campos": campos.get(tabela, {}),
+                               "indices": indices.get(tabela, []), "relacionamentos": relacionamentos.get(tabela, [])}
+                    self._detalhes[tabela] = (detalhe, agora + self.ttl_segundos)
+                    self._detalhes.move_to_end(tabela)
+                    resultado[tabela] = detalhe
+                    self.leituras += 1
+                while len(self._detalhes) > self.max_tabelas:
+                    self._detalhes.popitem(last=False)
+                    self.despejos += 1
+        return {tabela: resultado[tabela] for tabela in tabelas if tabela in resultado}
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "catalogo": len(self.catalogo),
+                "em_cache": len(self._detalhes),
+                "leituras": self.leituras,
+                "acertos": self.acertos,
+                "despejos": self.despejos,
+            }
+
+
+# Tabelas fora do dicionário carregado, com nomes do SX2 padrão, para a medição abaixo
+TABELAS_MEDICAO = {
+    "SE1": ("Contas a Receber", "E", ["E1_FILIAL", "E1_PREFIXO", "E1_NUM", "E1_PARCELA", "E1_CLIENTE", "E1_LOJA",
+                                      "E1_EMISSAO", "E1_VENCREA", "E1_VALOR", "E1_SALDO", "E1_BAIXA"]),
+    "SE2": ("Contas a Pagar", "E", ["E2_FILIAL", "E2_PREFIXO", "E2_NUM", "E2_PARCELA", "E2_FORNECE", "E2_LOJA",
+                                    "E2_EMISSAO", "E2_VENCREA", "E2_VALOR", "E2_SALDO", "E2_BAIXA"]),
+    "SF1": ("Cabecalho das NF de Entrada", "E", ["F1_FILIAL", "F1_DOC", "F1_SERIE", "F1_FORNECE", "F1_LOJA",
+                                                 "F1_EMISSAO", "F1_DTDIGIT", "F1_VALBRUT"]),
+    "SD1": ("Itens das NF de Entrada", "E", ["D1_FILIAL", "D1_DOC", "D1_SERIE", "D1_FORNECE", "D1_LOJA", "D1_COD",
+                                             "D1_QUANT", "D1_VUNIT", "D1_TOTAL", "D1_DTDIGIT"]),
+    "SC7": ("Pedidos de Compra", "E", ["C7_FILIAL", "C7_NUM", "C7_ITEM", "C7_PRODUTO", "C7_FORNECE", "C7_LOJA",
+                                       "C7_EMISSAO", "C7_DATPRF", "C7_QUANT", "C7_PRECO", "C7_TOTAL"]),
+}
+
+PERGUNTAS_MEDICAO = [
+    "Total de vendas por cliente em 2025",
+    "Títulos a receber vencidos do cliente 000123",
+    "Quais contas a pagar vencem esta semana?",
+    "Notas fiscais de entrada do fornecedor 000045 no mês",
+    "Pedidos de compra em aberto por fornecedor",
+    "Saldo da SE1 por cliente",
+]
+
+
+def _criar_dicionario_sintetico(caminho, total_tabelas, campos_por_tabela):
+    """SQLite com SX2/SX3/SIX/SX9 de um ERP com `total_tabelas` tabelas."""
+    import random
+    import sqlite3
+
+    from regras_protheus import REGRAS_PROTHEUS
+
+    aleatorio = random.Random(7)
+    vocabulario = ("movimento cadastro saldo historico complemento parametro lancamento contabil ativo fiscal "
+                   "apuracao rateio centro custo orcamento lote inventario transferencia ordem producao "
+                   "roteiro operacao apontamento tabela preco comissao vendedor transportadora veiculo").split()
+    tabelas = {t: (REGRAS_PROTHEUS[t]["descricao"], REGRAS_PROTHEUS[t].get("modo", "E"), []) for t in TABELAS_DICIONARIO}
+    tabelas.update(TABELAS_MEDICAO)
+    letras = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    for primeira in "CDNQRTZ":
+        for segunda in letras:
+            for terceira in letras:
+                if len(tabelas) >= total_tabelas:
+                    break
+                tabelas.setdefault(primeira + segunda + terceira,
+                                   (" ".join(aleatorio.sample(vocabulario, 3)).title(), aleatorio.choice("CE"), []))
+
+    sx2, sx3, six, sx9 = [], [], [], []
+    for tabela, (nome, modo, campos) in tabelas.items():
+        prefixo = tabela[1:] if tabela.startswith("S") else tabela
+        sx2.append((tabela, f"{tabela}010", nome, modo, " "))
+        campos = list(campos) or [f"{prefixo}_FILIAL", f"{prefixo}_COD"]
+        campos += [f"{prefixo}_C{n:03d}" for n in range(campos_por_tabela - len(campos))]
+        for ordem, campo in enumerate(campos, 1):
+            tipo = "D" if re.search(r"EMISSAO|VENC|DT|BAIXA|DATPRF", campo) else "N" if re.search(
+                r"VAL|SALDO|QUANT|PRECO|TOTAL|VUNIT", campo) else "C"
+            titulo = campo.split("_")[1].title()
+            sx3.append((tabela, f"{ordem:02d}", campo, tipo, titulo, f"{titulo} {' '.join(aleatorio.sample(vocabulario, 2))}", " "))
+        six.append((tabela, "1", "+".join(campos[:3]), " "))
+    sx9 += [("SA1", "SE1", "A1_COD+A1_LOJA", "E1_CLIENTE+E1_LOJA", " "),
+            ("SA2", "SE2", "A2_COD+A2_LOJA", "E2_FORNECE+E2_LOJA", " "),
+            ("SA2", "SF1", "A2_COD+A2_LOJA", "F1_FORNECE+F1_LOJA", " "),
+            ("SF1", "SD1", "F1_DOC+F1_SERIE+F1_FORNECE+F1_LOJA", "D1_DOC+D1_SERIE+D1_FORNECE+D1_LOJA", " "),
+            ("SB1", "SD1", "B1_COD", "D1_COD", " "),
+            ("SA2", "SC7", "A2_COD+A2_LOJA", "C7_FORNECE+C7_LOJA", " "),
+            ("SB1", "SC7", "B1_COD", "C7_PRODUTO", " ")]
+
+    with sqlite3.connect(caminho) as conn:
+        conn.execute("CREATE TABLE SX2010 (X2_CHAVE TEXT, X2_ARQUIVO TEXT, X2_NOME TEXT, X2_MODO TEXT, D_E_L_E_T_ TEXT)")
+        conn.execute("CREATE TABLE SX3010 (X3_ARQUIVO TEXT, X3_ORDEM TEXT, X3_CAMPO TEXT, X3_TIPO TEXT, "
+                     "X3_TITULO TEXT, X3_DESCRIC TEXT, D_E_L_E_T_ TEXT)")
+        conn.execute("CREATE TABLE SIX010 (INDICE TEXT, ORDEM TEXT, CHAVE TEXT, D_E_L_E_T_ TEXT)")
+        conn.execute("CREATE TABLE SX9010 (X9_DOM TEXT, X9_CDOM TEXT, X9_EXPDOM TEXT, X9_EXPCDOM TEXT, D_E_L_E_T_ TEXT)")
+        conn.executemany("INSERT INTO SX2010 VALUES (?, ?, ?, ?, ?)", sx2)
+        conn.executemany("INSERT INTO SX3010 VALUES (?, ?, ?, ?, ?, ?, ?)", sx3)
+        conn.executemany("INSERT INTO SIX010 VALUES (?, ?, ?, ?)", six)
+        conn.executemany("INSERT INTO SX9010 VALUES (?, ?, ?, ?, ?)", sx9)
+        # Como no SQL Server: índices do SX3/SIX/SX9 por tabela
+        conn.execute("CREATE INDEX SX3010_1 ON SX3010 (X3_ARQUIVO, X3_ORDEM)")
+        conn.execute("CREATE INDEX SIX010_1 ON SIX010 (INDICE, ORDEM)")
+        conn.execute("CREATE INDEX SX9010_1 ON SX9010 (X9_DOM)")
+        conn.execute("CREATE INDEX SX9010_2 ON SX9010 (X9_CDOM)")
+    return list(tabelas)
+
+
+def medir_dicionario_sob_demanda(total_tabelas=3000, campos_por_tabela=60):
+    """
+    Carga ansiosa do SX3/SIX de todas as tabelas x catálogo do SX2 + detalhes sob
+    demanda: tempo de inicialização, latência da primeira e das próximas leituras
+    e tokens das tabelas adicionais no sufixo de cada pergunta.
+    """
+    import tempfile
+
+    from sqlalchemy import create_engine
+
+    from esquema import IndiceEsquema
+    from prompt import serializar_esquema, serializar_sob_demanda
+    from regras_protheus import REGRAS_PROTHEUS
+    from texto import estimar_tokens
+
+    with tempfile.TemporaryDirectory(prefix="dicionario_") as pasta:
+        tabelas = _criar_dicionario_sintetico(os.path.join(pasta, "sx.sqlite"), total_tabelas, campos_por_tabela)
+        engine = create_engine(f"sqlite:///{os.path.join(pasta, 'sx.sqlite')}")
+
+        inicio = time.perf_counter()
+        with engine.connect() as conn:
+            mapeamento_completo = ler_campos(conn, tabelas)
+            indices_completos = ler_indices(conn, tabelas)
+        ansiosa_s = time.perf_counter() - inicio
+        tokens_completo = estimar_tokens(serializar_esquema(mapeamento_completo, indices_completos))
+
+        with engine.connect() as conn:
+            mapeamento = ler_campos(conn, TABELAS_DICIONARIO)
+        indice_esquema = IndiceEsquema(mapeamento, REGRAS_PROTHEUS)
+        dicionario = DicionarioSobDemanda(engine, max_tabelas=4)
+        inicio = time.perf_counter()
+        dicionario.carregar_catalogo()
+        catalogo_s = time.perf_counter() - inicio
+
+        perguntas = []
+        for pergunta in PERGUNTAS_MEDICAO:
+            escolhidas = dicionario.tabelas_da_pergunta(pergunta, indice_esquema.idf, excluir=mapeamento)
+            inicio = time.perf_counter()
+            detalhes = dicionario.detalhes(escolhidas)
+            primeira_ms = 1000 * (time.perf_counter() - inicio)
+            inicio = time.perf_counter()
+            dicionario.detalhes(escolhidas)
+            cache_ms = 1000 * (time.perf_counter() - inicio)
+            adicionais = serializar_sob_demanda(detalhes, pergunta, mapeamento) if detalhes else ""
+            perguntas.append({"pergunta": pergunta, "tabelas": escolhidas, "primeira_ms": primeira_ms,
+                              "cache_ms": cache_ms, "tokens_adicionais": estimar_tokens(adicionais) if adicionais else 0})
+        engine.dispose()
+    return {
+        "tabelas": len(tabelas),
+        "ansiosa_s": ansiosa_s,
+        "tokens_completo": tokens_completo,
+        "catalogo_s": catalogo_s,
+        "perguntas": perguntas,
+        "estatisticas": dicionario.estatisticas(),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Carga ansiosa x dicionário sob demanda (SX2 + SX3/SIX/SX9 por tabela).")
+    parser.add_argument("--tabelas", type=int, default=3000, help="tabelas no SX2 sintético")
+    parser.add_argument("--campos", type=int, default=60, help="campos por tabela no SX3 sintético")
+    args = parser.parse_args()
+
+    r = medir_dicionario_sob_demanda(args.tabelas, args.campos)
+    print(f"{r['tabelas']} tabelas x {args.campos} campos")
+    print(f"Carga ansiosa do SX3/SIX: {r['ansiosa_s']:.2f}s, ~{r['tokens_completo']} tokens de dicionário")
+    print(f"Catálogo do SX2: {r['catalogo_s'] * 1000:.0f} ms")
+    for item in r["perguntas"]:
+        print(f"  {item['pergunta'][:55]:<55} {','.join(item['tabelas']) or '-':<8} "
+              f"1ª leitura {item['primeira_ms']:6.1f} ms | LRU {item['cache_ms']:.2f} ms | "
+              f"+{item['tokens_adicionais']} tokens no sufixo")
+    print(f"LRU: {r['estatisticas']}")
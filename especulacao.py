@@ -0,0 +1,92 @@
+import contextvars
+import queue
+import threading
+
+_FIM = object()
+
+
+class _Erro:
+    def __init__(self, excecao):
+        self.excecao = excecao
+
+
+class FluxoEspeculativo:
+    """
+    Consome um gerador de trechos (ex.: gerar_sql_em_fluxo) numa thread do pool,
+    enquanto a intenção ainda está sendo classificada. Os trechos ficam numa fila:
+    se a especulação for aproveitada, iterar o fluxo devolve o que já chegou e
+    segue em streaming. `cancelar()` fecha o gerador no próximo trecho (o stream
+    do LLM é encerrado e nada vai para o cache de SQL).
+    `ao_terminar(cancelado)` é chamado quando o gerador termina, ou quando a tarefa
+    é cancelada antes de começar.
+    """
+
+    def __init__(self, executor, fabrica_gerador, ao_terminar=None):
+        self._fila = queue.Queue()
+        self._cancelado = threading.Event()
+        # Copia o contexto: os spans da geração entram no rastro da resposta
+        self._futuro = executor.submit(contextvars.copy_context().run, self._consumir, fabrica_gerador)
+        if ao_terminar is not None:
+            self._futuro.add_done_callback(lambda _: ao_terminar(self._cancelado.is_set()))
+
+    def _consumir(self, fabrica_gerador):
+        if self._cancelado.is_set():
+            self._fila.put(_FIM)
+            return
+        gerador = fabrica_gerador()
+        try:
+            for trecho in gerador:
+                if self._cancelado.is_set():
+                    break
+                self._fila.put(trecho)
+        except Exception as e:
+            self._fila.put(_Erro(e))
+        finally:
+            gerador.close()
+            self._fila.put(_FIM)
+
+    def cancelar(self):
+        self._cancelado.set()
+        self._futuro.cancel()
+
+    def __iter__(self):
+        while True:
+            item = self._fila.get()
+            if item is _FIM:
+                return
+            if isinstance(item, _Erro):
+                raise item.excecao
+            yield item
+
+
+class EstatisticasEspeculacao:
+    """
+    Quantas gerações especulativas foram aproveitadas ou descartadas. Só conta como
+    desperdício (quota gasta à toa) o descarte que chegou ao LLM; templates e cache não custam nada.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.aproveitadas = 0
+        self.desperdicadas = 0
+        self.descartadas_sem_llm = 0
+
+    def registrar(self, aproveitada, chamou_llm=True):
+        with self._lock:
+            if aproveitada:
+                self.aproveitadas += 1
+            elif chamou_llm:
+                self.desperdicadas += 1
+            else:
+                self.descartadas_sem_llm += 1
+
+    def estatisticas(self):
+        with self._lock:
+            total = self.aproveitadas + self.desperdicadas + self.descartadas_sem_llm
+            return {
+                "disparadas": total,
+                "aproveitadas": self.aproveitadas,
+                "desperdicadas": self.desperdicadas,
+                "descartadas_sem_llm": self.descartadas_sem_llm,
+                "taxa_desperdicio": self.desperdicadas / total if total else 0.0,
+            }
@@ -0,0 +1,221 @@
+import json
+import math
+from collections import defaultdict, deque
+
+from texto import estimar_tokens, tokenizar
+
+# Vocabulário de negócio que não aparece no SX3, mas indica a tabela
+SINONIMOS_TABELAS = {
+    "SA1": "cliente clientes comprador",
+    "SA2": "fornecedor fornecedores",
+    "SB1": "produto produtos item mercadoria descricao",
+    "SB2": "estoque saldo armazem disponivel",
+    "SC5": "pedido pedidos venda vendas cabecalho emissao",
+    "SC6": "itens pedido produtos do pedido quantidade vendida",
+    "SF2": "nota notas fiscal faturamento faturado venda vendas saida",
+    "SD2": "itens nota fiscal faturamento produto vendido saida",
+    # Fora do dicionário carregado na inicialização: lidas sob demanda (DicionarioSobDemanda)
+    "SE1": "contas receber titulo titulos financeiro recebimento vencimento vencido inadimplencia duplicata",
+    "SE2": "contas pagar titulo titulos financeiro pagamento vencimento vencido fornecedor",
+    "SF1": "nota notas fiscal entrada recebimento documento",
+    "SD1": "itens nota fiscal entrada compra produto recebido",
+    "SC7": "pedido pedidos compra compras comprador fornecedor",
+}
+
+# Termos associados ao tipo do campo no SX3 (D = data, N = numérico)
+SINONIMOS_TIPOS = {
+    "D": "data dia mes ano periodo semana hoje ultimo recente emissao",
+    "N": "valor total soma quantidade media preco",
+}
+
+
+def _radical(token):
+    return token[:6]
+
+
+def _termos(texto):
+    return [_radical(t) for t in tokenizar(texto.replace("_", " "))]
+
+
+def grafo_relacionamentos(regras_protheus):
+    """
+    Grafo não direcionado de joins a partir de REGRAS_PROTHEUS.
+    Retorna {tabela: {vizinha: (campos_da_tabela, campos_da_vizinha)}}.
+    """
+    grafo = defaultdict(dict)
+    for tabela, regra in regras_protheus.items():
+        if not isinstance(regra, dict):
+            continue
+        for rel in regra.get("relacionamentos", []):
+            if "destino" in rel:
+                a, b = tabela, rel["destino"]
+            else:
+                a, b = rel["origem"], tabela
+            campos_a, campos_b = tuple(rel["origem_campos"]), tuple(rel["destino_campos"])
+            grafo[a].setdefault(b, (campos_a, campos_b))
+            grafo[b].setdefault(a, (campos_b, campos_a))
+    return dict(grafo)
+
+
+def caminho_mais_curto(grafo, origem, destino):
+    """BFS no grafo de relacionamentos. Retorna a lista de tabelas ou None."""
+    if origem == destino:
+        return [origem]
+    anteriores = {origem: None}
+    fila = deque([origem])
+    while fila:
+        atual = fila.popleft()
+        for vizinha in sorted(grafo.get(atual, {})):
+            if vizinha in anteriores:
+                continue
+            anteriores[vizinha] = atual
+            if vizinha == destino:
+                caminho = [vizinha]
+                while anteriores[caminho[-1]] is not None:
+                    caminho.append(anteriores[caminho[-1]])
+                return caminho[::-1]
+            fila.append(vizinha)
+    return None
+
+
+def recortar_campos(campos, pergunta, indices=(), limite=15, iniciais=6):
+    """
+    Recorte de uma tabela fora do IndiceEsquema: campos do primeiro índice, os
+    primeiros do SX3 e os que compartilham termos com a pergunta, até `limite`.
+    """
+    termos_pergunta = set(_termos(pergunta))
+    selecionados = list(dict.fromkeys(list(indices[0] if indices else []) + list(campos)[:iniciais]))
+    pontuados = []
+    for campo, descricao in campos.items():
+        tipo = descricao.split(",")[0].replace("Tipo:", "").strip()
+        comuns = termos_pergunta & set(_termos(f"{campo} {descricao} {SINONIMOS_TIPOS.get(tipo, '')}"))
+        if comuns:
+            pontuados.append((-len(comuns), campo))
+    for _, campo in sorted(pontuados):
+        if len(selecionados) >= limite:
+            break
+        if campo not in selecionados:
+            selecionados.append(campo)
+    # Mantém a ordem do SX3 (X3_ORDEM)
+    return {c: d for c, d in campos.items() if c in selecionados}
+
+
+class IndiceEsquema:
+    """
+    Índice TF-IDF local sobre o dicionário (X3_CAMPO/X3_TITULO/X3_DESCRIC)
+    e as descrições de REGRAS_PROTHEUS. Seleciona só as tabelas e campos
+    relevantes para a pergunta antes de montar o prompt do SQL.
+    """
+
+    def __init__(self, mapeamento, regras_protheus, top_tabelas=3, corte_relativo=0.4,
+                 campos_por_tabela=15, campos_iniciais=6):
+        self.mapeamento = mapeamento
+        self.regras = regras_protheus
+        self.grafo = grafo_relacionamentos(regras_protheus)
+        self.top_tabelas = top_tabelas
+        self.corte_relativo = corte_relativo
+        self.campos_por_tabela = campos_por_tabela
+        self.campos_iniciais = campos_iniciais
+
+        # 1. Documentos: um por campo e um por tabela
+        documentos = {}
+        for tabela, campos in mapeamento.items():
+            for campo, descricao in campos.items():
+                tipo = descricao.split(",")[0].replace("Tipo:", "").strip()
+                texto = f"{campo} {descricao} {SINONIMOS_TIPOS.get(tipo, '')}"
+                documentos[(tabela, campo)] = _termos(texto)
+            regra = regras_protheus.get(tabela, {})
+            descricao_tabela = regra.get("descricao", "") if isinstance(regra, dict) else str(regra)
+            documentos[(tabela, None)] = _termos(f"{tabela} {descricao_tabela} {SINONIMOS_TABELAS.get(tabela, '')}")
+
+        # 2. IDF e vetores TF-IDF normalizados
+        frequencia_documentos = defaultdict(int)
+        for termos in documentos.values():
+            for termo in set(termos):
+                frequencia_documentos[termo] += 1
+        total = len(documentos)
+        self.idf = {t: math.log((1 + total) / (1 + df)) + 1 for t, df in frequencia_documentos.items()}
+
+        self.indice_invertido = defaultdict(list)
+        for chave, termos in documentos.items():
+            contagem = defaultdict(int)
+            for termo in termos:
+                contagem[termo] += 1
+            pesos = {t: (1 + math.log(c)) * self.idf[t] for t, c in contagem.items()}
+            norma = math.sqrt(sum(p * p for p in pesos.values())) or 1.0
+            for termo, peso in pesos.items():
+                self.indice_invertido[termo].append((chave, peso / norma))
+
+    def pontuar(self, pergunta):
+        """Retorna {(tabela, campo|None): score} por similaridade de cosseno."""
+        pontuacao = defaultdict(float)
+        for termo in set(_termos(pergunta)):
+            idf = self.idf.get(termo)
+            if idf is None:
+                continue
+            for chave, peso in self.indice_invertido[termo]:
+                pontuacao[chave] += peso * idf
+        return pontuacao
+
+    def _campos_de_juncao(self, tabela, tabelas):
+        campos = []
+        for vizinha in tabelas:
+            campos.extend(self.grafo.get(tabela, {}).get(vizinha, ((), ()))[0])
+        return campos
+
+    def selecionar(self, pergunta):
+        """
+        Retorna (mapeamento_reduzido, tabelas_escolhidas).
+        Sem nenhuma correspondência, devolve o mapeamento completo.
+        """
+        pontuacao = self.pontuar(pergunta)
+
+        # 1. Ranking de tabelas: descrição da tabela + melhores campos
+        score_tabela = defaultdict(float)
+        for (tabela, campo), score in pontuacao.items():
+            score_tabela[tabela] += score if campo is None else score * 0.5
+        ranking = [t for t, s in sorted(score_tabela.items(), key=lambda x: -x[1]) if s > 0]
+        if not ranking:
+            return self.mapeamento, list(self.mapeamento)
+        # Só entram tabelas com score próximo ao da melhor
+        corte = score_tabela[ranking[0]] * self.corte_relativo
+        escolhidas = [t for t in ranking[:self.top_tabelas] if score_tabela[t] >= corte]
+
+        # 2. Expande pelo grafo: inclui as tabelas do caminho de join entre as escolhidas
+        tabelas = list(escolhidas)
+        for destino in escolhidas[1:]:
+            caminho = caminho_mais_curto(self.grafo, escolhidas[0], destino) or []
+            for tabela in caminho:
+                if tabela not in tabelas and tabela in self.mapeamento:
+                    tabelas.append(tabela)
+
+        # 3. Campos: chaves, campos de junção, primeiros do SX3 e os mais pontuados
+        reduzido = {}
+        for tabela in tabelas:
+            campos_tabela = self.mapeamento.get(tabela, {})
+            regra = self.regras.get(tabela, {})
+            obrigatorios = list(regra.get("chave_unica", [])) if isinstance(regra, dict) else []
+            obrigatorios += self._campos_de_juncao(tabela, tabelas)
+            obrigatorios += list(campos_tabela)[:self.campos_iniciais]
+            pontuados = sorted(
+                (c for c in campos_tabela if pontuacao.get((tabela, c), 0) > 0),
+                key=lambda c: -pontuacao[(tabela, c)],
+            )[:self.campos_por_tabela]
+            selecionados = set(obrigatorios) | set(pontuados)
+            # Mantém a ordem do SX3 (X3_ORDEM)
+            reduzido[tabela] = {c: d for c, d in campos_tabela.items() if c in selecionados}
+        return reduzido, tabelas
+
+    def relatorio_tokens(self, pergunta):
+        """Tokens do {mapeamento} antes (completo) e depois (recuperação)."""
+        reduzido, tabelas = self.selecionar(pergunta)
+        completo = json.dumps(self.mapeamento, indent=2, ensure_ascii=False)
+        recortado = json.dumps(reduzido, indent=2, ensure_ascii=False)
+        antes, depois = estimar_tokens(completo), estimar_tokens(recortado)
+        return {
+            "tabelas": tabelas,
+            "campos": sum(len(c) for c in reduzido.values()),
+            "tokens_antes": antes,
+            "tokens_depois": depois,
+            "reducao": 1 - depois / antes if antes else 0.0,
+        }
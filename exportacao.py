@@ -0,0 +1,120 @@
+import csv
+import datetime
+import decimal
+import os
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text
+
+DIRETORIO_EXPORTACOES = os.path.join(tempfile.gettempdir(), "chatbot_protheus_exportacoes")
+TAMANHO_LOTE_EXPORTACAO = 5000
+VALIDADE_ARQUIVOS = 3600  # segundos até o arquivo temporário ser removido
+
+
+def limpar_exportacoes_antigas(diretorio=DIRETORIO_EXPORTACOES, validade=VALIDADE_ARQUIVOS):
+    if not os.path.isdir(diretorio):
+        return
+    limite = time.time() - validade
+    for nome in os.listdir(diretorio):
+        caminho = os.path.join(diretorio, nome)
+        try:
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+        except OSError:
+            continue
+
+
+def _tipo_arrow(array):
+    """Tipos estáveis entre lotes: decimais com precisão máxima e colunas vazias como texto."""
+    if pa.types.is_null(array.type):
+        return pa.string()
+    if pa.types.is_decimal(array.type):
+        return pa.decimal128(38, array.type.scale)
+    return array.type
+
+
+def _lote_para_arrow(colunas, linhas, schema=None):
+    valores = list(zip(*linhas)) if linhas else [[] for _ in colunas]
+    if schema is None:
+        arrays = [pa.array(list(v)) for v in valores]
+        schema = pa.schema([(nome, _tipo_arrow(a)) for nome, a in zip(colunas, arrays)])
+        arrays = [a.cast(campo.type) for a, campo in zip(arrays, schema)]
+    else:
+        arrays = []
+        for v, campo in zip(valores, schema):
+            if pa.types.is_string(campo.type):
+                v = [None if x is None else str(x) for x in v]
+            arrays.append(pa.array(list(v), type=campo.type))
+    return pa.Table.from_arrays(arrays, schema=schema), schema
+
+
+def _valor_csv(valor):
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.isoformat()
+    if isinstance(valor, decimal.Decimal):
+        return format(valor, "f")
+    return valor
+
+
+def exportar_consulta(engine, sql_query, formato="csv", tamanho_lote=TAMANHO_LOTE_EXPORTACAO,
+                      diretorio=DIRETORIO_EXPORTACOES):
+    """
+    Reexecuta a consulta (já validada) com cursor do lado do servidor e grava
+    os lotes direto em CSV ou Parquet, sem montar um DataFrame: a memória
+    fica limitada ao tamanho do lote. Retorna caminho, linhas e vazão (linhas/s).
+    """
+    formato = formato.lower()
+    if formato not in ("csv", "parquet"):
+        raise ValueError(f"Formato de exportação não suportado: {formato}")
+
+    os.makedirs(diretorio, exist_ok=True)
+    limpar_exportacoes_antigas(diretorio)
+    descritor, caminho = tempfile.mkstemp(prefix="consulta_", suffix=f".{formato}", dir=diretorio)
+    os.close(descritor)
+
+    inicio = time.perf_counter()
+    linhas_exportadas = 0
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=tamanho_lote).execute(
+            text(sql_query.strip().rstrip(";"))
+        )
+        colunas = list(result.keys())
+        try:
+            if formato == "csv":
+                # ';' e BOM: abre direto no Excel com configuração regional pt-BR
+                with open(caminho, "w", newline="", encoding="utf-8-sig") as arquivo:
+                    writer = csv.writer(arquivo, delimiter=";")
+                    writer.writerow(colunas)
+                    while lote := result.fetchmany(tamanho_lote):
+                        writer.writerows([_valor_csv(v) for v in linha] for linha in lote)
+                        linhas_exportadas += len(lote)
+            else:
+                writer, schema = None, None
+                try:
+                    while lote := result.fetchmany(tamanho_lote):
+                        tabela, schema = _lote_para_arrow(colunas, lote, schema)
+                        if writer is None:
+                            writer = pq.ParquetWriter(caminho, schema, compression="zstd")
+                        writer.write_table(tabela)
+                        linhas_exportadas += len(lote)
+                    if writer is None:
+                        tabela, schema = _lote_para_arrow(colunas, [], None)
+                        pq.write_table(tabela, caminho)
+                finally:
+                    if writer is not None:
+                        writer.close()
+        finally:
+            result.close()
+
+    segundos = time.perf_counter() - inicio
+    return {
+        "caminho": caminho,
+        "formato": formato,
+        "linhas": linhas_exportadas,
+        "bytes": os.path.getsize(caminho),
+        "segundos": segundos,
+        "linhas_por_segundo": linhas_exportadas / segundos if segundos else 0.0,
+    }
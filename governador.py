@@ -0,0 +1,161 @@
+"""
+Governador de custo: consulta o plano estimado (SET SHOWPLAN_XML ON) antes de
+executar e aprova, rebaixa (TOP forçado) ou rejeita a consulta.
+
+Teste offline com planos gravados:  python governador.py fixtures/planos/*.xml
+"""
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+from consulta_sql import consulta_agregada, forcar_top, normalizar_sql
+
+logger = logging.getLogger("governador")
+
+NAMESPACE_SHOWPLAN = {"p": "http://schemas.microsoft.com/sqlserver/2004/07/showplan"}
+
+OPERADORES_DE_VARREDURA = {"Table Scan", "Clustered Index Scan", "Index Scan"}
+
+LIMITES_PADRAO = {
+    "custo_rebaixar": 10.0,              # acima disso: força TOP (row goal)
+    "custo_maximo": 50.0,                # acima disso (mesmo rebaixada): rejeita
+    "linhas_varredura_maximas": 500000,  # varredura em tabela com mais linhas que isso: rebaixa
+    "top_rebaixado": 1000,
+}
+
+
+def analisar_plano(xml_plano):
+    """Extrai custo, linhas estimadas e operadores de varredura do ShowPlan XML."""
+    raiz = ET.fromstring(xml_plano)
+    custo, linhas, textos = 0.0, 0.0, []
+    for instrucao in raiz.iterfind(".//p:StmtSimple", NAMESPACE_SHOWPLAN):
+        custo += float(instrucao.get("StatementSubTreeCost", 0) or 0)
+        linhas += float(instrucao.get("StatementEstRows", 0) or 0)
+        textos.append(instrucao.get("StatementText", ""))
+
+    varreduras = []
+    for operador in raiz.iterfind(".//p:RelOp", NAMESPACE_SHOWPLAN):
+        fisico = operador.get("PhysicalOp")
+        if fisico not in OPERADORES_DE_VARREDURA:
+            continue
+        objeto = operador.find(".//p:Object", NAMESPACE_SHOWPLAN)
+        tabela = objeto.get("Table", "").strip("[]") if objeto is not None else ""
+        varreduras.append({
+            "operador": fisico,
+            "tabela": tabela,
+            # Linhas lidas pela varredura (tamanho da tabela) quando disponível
+            "linhas": float(operador.get("EstimatedRowsRead") or operador.get("TableCardinality")
+                            or operador.get("EstimateRows") or 0),
+            "custo": float(operador.get("EstimatedTotalSubtreeCost", 0) or 0),
+        })
+    return {"custo": custo, "linhas_estimadas": linhas, "varreduras": varreduras, "sql": "\n".join(textos)}
+
+
+def decidir(analise, limites=LIMITES_PADRAO, agregada=False):
+    """
+    Retorna (decisao, motivo) com decisao em "aprovar", "rebaixar" ou "rejeitar".
+    Consultas agregadas não se beneficiam de TOP: acima do limite, são rejeitadas.
+    """
+    varreduras_grandes = [v for v in analise["varreduras"] if v["linhas"] > limites["linhas_varredura_maximas"]]
+    custo = analise["custo"]
+
+    if custo > limites["custo_maximo"]:
+        return "rejeitar", f"custo estimado {custo:.2f} acima do máximo {limites['custo_maximo']:.1f}"
+    if custo > limites["custo_rebaixar"] or varreduras_grandes:
+        motivo = f"custo estimado {custo:.2f}"
+        if varreduras_grandes:
+            motivo += "; varredura em " + ", ".join(
+                f"{v['tabela']} ({v['operador']}, {v['linhas']:,.0f} linhas)" for v in varreduras_grandes
+            )
+        if agregada:
+            return "rejeitar", motivo + " — restrinja o período ou a filial"
+        return "rebaixar", motivo
+    return "aprovar", f"custo estimado {custo:.2f}"
+
+
+def obter_plano_estimado(conn, sql_query):
+    """Plano estimado sem executar a consulta. SHOWPLAN_XML precisa de lote próprio."""
+    conn.exec_driver_sql("SET SHOWPLAN_XML ON")
+    try:
+        return conn.exec_driver_sql(sql_query.strip().rstrip(";")).scalar()
+    finally:
+        conn.exec_driver_sql("SET SHOWPLAN_XML OFF")
+
+
+def fonte_de_planos_gravados(diretorio):
+    """
+    Substituto de obter_plano_estimado para testes sem servidor: devolve o
+    plano gravado cujo StatementText corresponde ao SQL (normalizado).
+    """
+    planos = {}
+    for caminho in sorted(glob.glob(os.path.join(diretorio, "*.xml"))):
+        with open(caminho, encoding="utf-8") as arquivo:
+            xml_plano = arquivo.read()
+        planos[normalizar_sql(analisar_plano(xml_plano)["sql"])] = xml_plano
+
+    def obter_plano(conn, sql_query):
+        try:
+            return planos[normalizar_sql(sql_query)]
+        except KeyError:
+            raise LookupError(f"Nenhum plano gravado para: {sql_query}") from None
+
+    return obter_plano
+
+
+class Governador:
+    """
+    Aplica os limites a cada consulta e registra a decisão no log.
+    As decisões ficam em memória por alguns minutos (a paginação repete o SQL).
+    `obter_plano` pode ser trocado por uma fonte de planos gravados.
+    """
+
+    def __init__(self, limites=None, obter_plano=obter_plano_estimado, validade_decisao=300):
+        self.limites = {**LIMITES_PADRAO, **(limites or {})}
+        self.obter_plano = obter_plano
+        self.validade_decisao = validade_decisao
+        self._decisoes = {}
+        self._lock = threading.Lock()
+
+    def avaliar(self, conn, sql_query):
+        """Retorna (sql_a_executar, decisao, motivo). Não levanta erro: quem chama decide."""
+        chave = normalizar_sql(sql_query)
+        with self._lock:
+            em_memoria = self._decisoes.get(chave)
+        if em_memoria and em_memoria[0] > time.monotonic():
+            return em_memoria[1]
+
+        analise = analisar_plano(self.obter_plano(conn, sql_query))
+        decisao, motivo = decidir(analise, self.limites, consulta_agregada(sql_query))
+        sql_final = sql_query
+        if decisao == "rebaixar":
+            sql_final = forcar_top(sql_query, self.limites["top_rebaixado"])
+            motivo += f" — TOP {self.limites['top_rebaixado']} aplicado"
+
+        logger.info(json.dumps({
+            "decisao": decisao,
+            "motivo": motivo,
+            "custo": analise["custo"],
+            "linhas_estimadas": analise["linhas_estimadas"],
+            "varreduras": analise["varreduras"],
+            "sql": chave,
+        }, ensure_ascii=False))
+
+        resultado = (sql_final, decisao, motivo)
+        with self._lock:
+            if len(self._decisoes) > 1000:
+                self._decisoes.clear()
+            self._decisoes[chave] = (time.monotonic() + self.validade_decisao, resultado)
+        return resultado
+
+
+if __name__ == "__main__":
+    for caminho in sys.argv[1:]:
+        with open(caminho, encoding="utf-8") as arquivo:
+            analise = analisar_plano(arquivo.read())
+        decisao, motivo = decidir(analise, agregada=consulta_agregada(analise["sql"]))
+        print(f"{caminho}: {decisao.upper()} ({motivo})")
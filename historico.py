@@ -0,0 +1,201 @@
+"""
+Histórico da conversa com orçamento de tokens para o prompt do SQL.
+As respostas guardam o SQL e um resumo compacto do resultado (colunas, linhas,
+valores-chave) no lugar das tabelas em markdown. Quando o orçamento estoura,
+os turnos mais antigos viram uma linha cada num resumo incremental, sem LLM.
+
+Medição em conversas longas (histórico bruto x gerenciado):
+    python historico.py --turnos 40
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from consulta_sql import tabelas_da_consulta
+from texto import estimar_tokens
+
+MAX_COLUNAS_RESUMO = 4
+MAX_VALORES_CHAVE = 3
+
+
+def _formatar_numero(valor):
+    return f"{valor:.2f}".rstrip("0").rstrip(".") if isinstance(valor, float) else str(valor)
+
+
+def resumir_resultado(df, ha_mais=False):
+    """
+    Resumo de uma linha para o histórico, ex.:
+    '12 linhas | colunas: Mês, Total de Vendas | Mês: 202401, 202402, 202403… | Total de Vendas: soma 9134.5, máx 1021.3'
+    """
+    if df.empty:
+        return "nenhum registro"
+    partes = [f"{len(df)}{'+' if ha_mais else ''} linhas", "colunas: " + ", ".join(map(str, df.columns))]
+    if len(df) == 1:
+        valores = [f"{coluna}={_formatar_numero(valor)}" for coluna, valor in
+                   list(df.iloc[0].items())[:MAX_COLUNAS_RESUMO]]
+        return " | ".join(partes + [", ".join(valores)])
+    # Por posição: nomes repetidos (ou vários '' de colunas calculadas) dariam um DataFrame em df[coluna]
+    for i, coluna in enumerate(df.columns[:MAX_COLUNAS_RESUMO]):
+        serie = df.iloc[:, i]
+        if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+            partes.append(f"{coluna}: soma {_formatar_numero(float(serie.sum()))}, máx {_formatar_numero(float(serie.max()))}")
+        else:
+            valores = [str(valor).strip() for valor in serie.dropna().unique()[:MAX_VALORES_CHAVE]]
+            reticencias = "…" if serie.nunique() > MAX_VALORES_CHAVE else ""
+            partes.append(f"{coluna}: {', '.join(valores)}{reticencias}")
+    return " | ".join(partes)
+
+
+def _encurtar(texto, max_chars):
+    texto = " ".join((texto or "").split())
+    return texto if len(texto) <= max_chars else texto[:max_chars - 1] + "…"
+
+
+class HistoricoConversa:
+    """
+    Até `max_recentes` mensagens completas (pergunta, texto, SQL e resumo do resultado)
+    dentro de `orcamento_tokens`; as anteriores ficam no resumo incremental, que por
+    sua vez é limitado a `orcamento_resumo` tokens (as linhas mais velhas saem primeiro).
+    """
+
+    def __init__(self, orcamento_tokens=500, orcamento_resumo=120, max_recentes=4, max_chars_texto=400,
+                 max_chars_sql=1500):
+        self.orcamento_tokens = orcamento_tokens
+        self.max_recentes = max_recentes
+        self.orcamento_resumo = orcamento_resumo
+        self.max_chars_texto = max_chars_texto
+        self.max_chars_sql = max_chars_sql
+        self.turnos = []  # (renderizado, tokens, linha_resumo)
+        self.resumo = []  # (linha, tokens)
+        self.compactados = 0
+        self.descartados = 0
+
+    def _adicionar(self, renderizado, linha_resumo):
+        self.turnos.append((renderizado, estimar_tokens(renderizado), linha_resumo))
+        self._compactar()
+
+    def adicionar_pergunta(self, pergunta):
+        self._adicionar(f"user: {_encurtar(pergunta, self.max_chars_texto)}",
+                        f"- Pergunta: {_encurtar(pergunta, 120)}")
+
+    def adicionar_resposta(self, texto, consultas=()):
+        """`consultas`: [{"sql": ..., "resumo": resumir_resultado(...) ou mensagem de erro}]."""
+        linhas = [f"assistant: {_encurtar(texto, self.max_chars_texto)}" if texto else "assistant:"]
+        tabelas = []
+        for consulta in consultas:
+            linhas.append(f"SQL: {_encurtar(consulta['sql'], self.max_chars_sql)}")
+            linhas.append(f"Resultado: {consulta['resumo']}")
+            tabelas += [f"{tabela}010" for tabela in tabelas_da_consulta(consulta["sql"])]
+        if consultas:
+            resultados = "; ".join(consulta["resumo"].split(" | ")[0] for consulta in consultas)
+            linha_resumo = f"- Resposta: SQL em {', '.join(dict.fromkeys(tabelas)) or '?'} -> {resultados}"
+        else:
+            linha_resumo = f"- Resposta: {_encurtar(texto, 120)}"
+        self._adicionar("\n".join(linhas), linha_resumo)
+
+    def _tokens_recentes(self):
+        return sum(tokens for _, tokens, _ in self.turnos)
+
+    def _tokens_resumo(self):
+        return sum(tokens for _, tokens in self.resumo)
+
+    def _compactar(self):
+        """Cada turno é resumido uma única vez, quando sai da janela recente."""
+        while len(self.turnos) > 1 and (len(self.turnos) > self.max_recentes
+                                        or self._tokens_recentes() + self._tokens_resumo() > self.orcamento_tokens):
+            _, _, linha = self.turnos.pop(0)
+            self.resumo.append((linha, estimar_tokens(linha) + 1))
+            self.compactados += 1
+            while self.resumo and self._tokens_resumo() > self.orcamento_resumo:
+                self.resumo.pop(0)
+                self.descartados += 1
+
+    def montar(self):
+        """Texto para o {historico} do prompt."""
+        partes = []
+        if self.resumo or self.descartados:
+            partes.append("Resumo da conversa anterior:")
+            if self.descartados:
+                partes.append(f"- (+{self.descartados} turnos mais antigos omitidos)")
+            partes += [linha for linha, _ in self.resumo]
+            partes.append("")
+        partes += [renderizado for renderizado, _, _ in self.turnos]
+        return "\n".join(partes)
+
+    def tokens(self):
+        return estimar_tokens(self.montar())
+
+    def estatisticas(self):
+        return {
+            "turnos_recentes": len(self.turnos),
+            "turnos_resumidos": len(self.resumo),
+            "compactados": self.compactados,
+            "descartados": self.descartados,
+            "tokens": self.tokens(),
+        }
+
+
+def historico_bruto(mensagens, ultimas=5):
+    """Formato anterior (últimas mensagens com tabelas e SQL completos), só para comparação."""
+    return "\n".join(f"{m['role']}: {m['content']}" for m in mensagens[-ultimas:])
+
+
+def medir_conversa_longa(turnos=40, linhas_resultado=20, orcamento_tokens=500):
+    """
+    Simula uma conversa com respostas SQL de `linhas_resultado` linhas e mede,
+    por turno, tokens do histórico bruto x gerenciado e o tempo de montagem.
+    """
+    sql = ("SELECT SA1.A1_NOME AS \"Cliente\", LEFT(SF2.F2_EMISSAO, 6) AS \"Mês\", SUM(SF2.F2_VALBRUT) AS \"Total\"\n"
+           "FROM SF2010 SF2\nINNER JOIN SA1010 SA1 ON SA1.A1_COD = SF2.F2_CLIENTE AND SA1.A1_LOJA = SF2.F2_LOJA "
+           "AND SA1.D_E_L_E_T_ = ' ' AND SA1.A1_FILIAL = ''\nWHERE SF2.D_E_L_E_T_ = ' ' AND SF2.F2_FILIAL = '01' "
+           "AND SF2.F2_EMISSAO BETWEEN '20250101' AND '20251231'\nGROUP BY SA1.A1_NOME, LEFT(SF2.F2_EMISSAO, 6)")
+    df = pd.DataFrame({
+        "Cliente": [f"CLIENTE {i:06d} LTDA" for i in range(linhas_resultado)],
+        "Mês": [f"2025{1 + i % 12:02d}" for i in range(linhas_resultado)],
+        "Total": [1000.0 + 37.5 * i for i in range(linhas_resultado)],
+    })
+    mensagens = []
+    historico = HistoricoConversa(orcamento_tokens=orcamento_tokens)
+    medidas = []
+    for turno in range(1, turnos + 1):
+        pergunta = f"e o faturamento por cliente no mês {1 + turno % 12} da filial 01?"
+        mensagens.append({"role": "user", "content": pergunta})
+
+        # A pergunta atual já vai no {pergunta} do prompt: entra no histórico depois da montagem
+        inicio = time.perf_counter()
+        montado = historico.montar()
+        duracao = time.perf_counter() - inicio
+        historico.adicionar_pergunta(pergunta)
+        medidas.append({
+            "turno": turno,
+            "tokens_bruto": estimar_tokens(historico_bruto(mensagens)),
+            "tokens_gerenciado": estimar_tokens(montado),
+            "montagem_ms": 1000 * duracao,
+        })
+
+        # Como o app salvava: SQL completo + até 20 linhas em markdown
+        markdown = f"\n\n```sql\n{sql}\n```\n\n✅ {len(df)} registros retornados.\n" + df.head(20).to_markdown(index=False)
+        if len(df) > 20:
+            markdown += f"\n*(... e mais {len(df) - 20} linhas)*"
+        mensagens.append({"role": "assistant", "content": markdown})
+        historico.adicionar_resposta("", [{"sql": sql, "resumo": resumir_resultado(df)}])
+    return medidas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tamanho do histórico no prompt em conversas longas.")
+    parser.add_argument("--turnos", type=int, default=40)
+    parser.add_argument("--linhas", type=int, default=20, help="linhas de cada resultado simulado")
+    parser.add_argument("--orcamento", type=int, default=500, help="orçamento de tokens do histórico")
+    args = parser.parse_args()
+
+    medidas = medir_conversa_longa(args.turnos, args.linhas, args.orcamento)
+    print(f"{'turno':>6}{'bruto':>10}{'gerenciado':>12}{'montagem ms':>13}")
+    for medida in medidas:
+        if medida["turno"] in (1, 2, 3, 5, 10, 20) or medida["turno"] % 20 == 0 or medida["turno"] == len(medidas):
+            print(f"{medida['turno']:>6}{medida['tokens_bruto']:>10}{medida['tokens_gerenciado']:>12}"
+                  f"{medida['montagem_ms']:>13.3f}")
+    bruto = sum(medida["tokens_bruto"] for medida in medidas)
+    gerenciado = sum(medida["tokens_gerenciado"] for medida in medidas)
+    print(f"\nTokens de histórico na conversa inteira: {bruto} -> {gerenciado} ({gerenciado / bruto - 1:+.0%})")
@@ -0,0 +1,233 @@
+"""
+Classificador local de intenção ("sql" ou "texto").
+
+Combina regras (as mesmas do prompt de intenção do LLM) com um Naive Bayes
+treinado sobre perguntas rotuladas. Só quando a confiança fica abaixo do
+limiar a pergunta vai para o LLM.
+
+Avaliação offline:  python intencao.py
+(com GOOGLE_API_KEY no ambiente, compara também com o classificador LLM)
+"""
+import math
+import os
+import re
+import time
+from collections import defaultdict
+
+from texto import normalizar_texto, tokenizar
+
+PROMPT_INTENCAO = """
+Você é um classificador de intenção para um assistente de negócios do Protheus.
+Analise a pergunta do usuário e responda **apenas** com uma palavra:
+- "sql" → se a pergunta requer **dados reais** do banco (consultas sobre pedidos, vendas, produtos, estoques, valores, contagens, listagens, agregações, períodos, filiais, clientes, etc.)
+- "texto" → se a pergunta requer uma **resposta conceitual, explicativa, saudação, teste ou ajuda de procedimento**.
+
+Regras:
+- Perguntas curtas como "teste", "oi", "funciona?" → "texto"
+- Pedidos de definição ou explicação ("o que é SC5?", "como cadastrar produto?") → "texto"
+- Perguntas com "total", "quantidade", "por filial", "mês", "ano", "vendas" → "sql"
+- Em caso de dúvida → "texto"
+
+Pergunta:
+{pergunta}
+
+Retorne apenas: sql ou texto
+"""
+
+# Pedidos de definição/explicação ("como calcular o total de vendas?"): "texto" mesmo com
+# palavras de dados na pergunta. Não somam log-odds: vetam o "sql" (regra do prompt).
+REGRAS_EXPLICACAO = [
+    r"^(me )?(explique|explica|explicar|descreva)\b",
+    r"^(o que (e|sao|significa|quer dizer)|qual a diferenca|para que serve|de que forma|qual a formula)\b",
+    r"^como (eu |se )?(funciona|faco|faz|\w+(ar|er|ir))\b",
+    r"^como (e|sao) (calculad|feit|gerad|definid|apurad)\w*\b",
+]
+
+# Regras do prompt acima, em forma de (padrão, peso em log-odds). Positivo → "sql".
+REGRAS_INTENCAO = [
+    (r"^(teste|testando|oi|ola|bom dia|boa tarde|boa noite|obrigad[oa]|valeu|ok|funciona|funcionou)\b", -4.0),
+    (r"\b(ajuda|procedimento|rotina|conceito|significa)\b", -1.5),
+    (r"\b(total|totais|quantidade|quantos|quantas|soma|somatorio|media)\b", 2.5),
+    (r"\b(por filial|por mes|por ano|por cliente|por produto|por vendedor)\b", 2.5),
+    (r"\b(mes|ano|semana|hoje|ontem|periodo|trimestre|20\d\d)\b", 1.5),
+    (r"\b(venda|vendas|vendido|faturamento|faturado|estoque|saldo)\b", 1.5),
+    (r"\b(liste|listar|mostre|mostrar|traga|exiba|quais|ultimos|ultimas|maiores|menores|top \d+)\b", 2.0),
+    (r"\b(pedido|pedidos|nota|notas|cliente|clientes|produto|produtos|fornecedor|fornecedores)\b", 1.0),
+]
+
+PERGUNTAS_ROTULADAS = [
+    ("vendas do mês por filial", "sql"),
+    ("últimos pedidos", "sql"),
+    ("total de vendas por mês", "sql"),
+    ("quantidade de pedidos em 2025", "sql"),
+    ("quais os 10 clientes que mais compraram", "sql"),
+    ("liste os produtos sem estoque", "sql"),
+    ("saldo de estoque do produto 000123", "sql"),
+    ("faturamento do ano por cliente", "sql"),
+    ("mostre as notas fiscais de hoje", "sql"),
+    ("quanto vendemos ontem", "sql"),
+    ("quantos clientes temos cadastrados", "sql"),
+    ("pedidos em aberto da filial 02", "sql"),
+    ("ticket médio por cliente no trimestre", "sql"),
+    ("top 5 produtos mais vendidos", "sql"),
+    ("valor total das notas de saída da semana", "sql"),
+    ("fornecedores cadastrados", "sql"),
+    ("itens do pedido 001234", "sql"),
+    ("últimas notas emitidas para o cliente 000001", "sql"),
+    ("vendas por vendedor em outubro", "sql"),
+    ("qual o estoque do armazém 01", "sql"),
+    ("teste", "texto"),
+    ("oi", "texto"),
+    ("olá, tudo bem?", "texto"),
+    ("funciona?", "texto"),
+    ("obrigado!", "texto"),
+    ("bom dia", "texto"),
+    ("o que é SC5?", "texto"),
+    ("o que significa D_E_L_E_T_?", "texto"),
+    ("qual a diferença entre SC5 e SC6?", "texto"),
+    ("como cadastrar produto?", "texto"),
+    ("como funciona o campo filial?", "texto"),
+    ("explique o modo compartilhado", "texto"),
+    ("para que serve a SB2?", "texto"),
+    ("qual campo liga clientes e pedidos?", "texto"),
+    ("como faço para emitir uma nota?", "texto"),
+    ("você consegue me ajudar?", "texto"),
+    ("valeu", "texto"),
+    ("qual rotina cadastra clientes?", "texto"),
+    ("o que é a tabela SA1", "texto"),
+    ("ok", "texto"),
+]
+
+# Conjunto separado só para a avaliação offline
+PERGUNTAS_AVALIACAO = [
+    ("vendas de setembro por filial", "sql"),
+    ("quais pedidos foram emitidos hoje", "sql"),
+    ("total faturado em 2024", "sql"),
+    ("liste os 20 maiores clientes", "sql"),
+    ("quantidade vendida do produto 000050 no mês", "sql"),
+    ("estoque atual por armazém", "sql"),
+    ("mostre os últimos 5 pedidos do cliente 000010", "sql"),
+    ("média de vendas por semana", "sql"),
+    ("boa tarde", "texto"),
+    ("testando", "texto"),
+    ("o que é SF2?", "texto"),
+    ("como funciona o modo exclusivo?", "texto"),
+    ("qual a diferença entre SF2 e SD2?", "texto"),
+    ("obrigada pela ajuda", "texto"),
+    ("para que serve o campo A1_LOJA?", "texto"),
+    ("explique a regra de filial", "texto"),
+    # Mistos: explicação com palavras de dados, e dados com saudação/"como está"
+    ("como calcular o total de vendas por mês?", "texto"),
+    ("explique o total de vendas por mês", "texto"),
+    ("como gerar o relatório de faturamento do ano?", "texto"),
+    ("o que é o saldo de estoque por armazém?", "texto"),
+    ("me explica como funciona o faturamento por filial", "texto"),
+    ("como é calculado o ticket médio por cliente?", "texto"),
+    ("como consultar os pedidos em aberto?", "texto"),
+    ("qual a diferença entre quantidade vendida e faturada?", "texto"),
+    ("bom dia, quais as vendas de hoje?", "sql"),
+    ("qual o total de vendas por mês?", "sql"),
+    ("como está o faturamento deste mês?", "sql"),
+    ("o que vendemos ontem?", "sql"),
+    ("quanto vendemos em 2025 por filial", "sql"),
+    ("ok, agora liste os pedidos de hoje", "sql"),
+]
+
+
+def _sigmoide(x):
+    return 1 / (1 + math.exp(-max(min(x, 30), -30)))
+
+
+class ClassificadorIntencao:
+    """
+    Regras + Naive Bayes multinomial. prever() devolve (rotulo, confianca);
+    classificar() devolve o rótulo ou None quando a confiança < limiar.
+    """
+
+    def __init__(self, exemplos=PERGUNTAS_ROTULADAS, limiar=0.85):
+        self.limiar = limiar
+        self.regras = [(re.compile(padrao), peso) for padrao, peso in REGRAS_INTENCAO]
+        self.explicacao = [re.compile(padrao) for padrao in REGRAS_EXPLICACAO]
+        self._treinar(exemplos)
+
+    def _treinar(self, exemplos):
+        self.contagem = {"sql": defaultdict(int), "texto": defaultdict(int)}
+        self.total_tokens = {"sql": 0, "texto": 0}
+        documentos = {"sql": 0, "texto": 0}
+        for pergunta, rotulo in exemplos:
+            documentos[rotulo] += 1
+            for token in tokenizar(pergunta):
+                self.contagem[rotulo][token] += 1
+                self.total_tokens[rotulo] += 1
+        self.vocabulario = set(self.contagem["sql"]) | set(self.contagem["texto"])
+        self.log_prior = math.log((documentos["sql"] + 1) / (documentos["texto"] + 1))
+
+    def _log_odds_bayes(self, tokens):
+        v = len(self.vocabulario) or 1
+        log_odds = self.log_prior
+        for token in tokens:
+            if token not in self.vocabulario:
+                continue
+            p_sql = (self.contagem["sql"][token] + 1) / (self.total_tokens["sql"] + v)
+            p_texto = (self.contagem["texto"][token] + 1) / (self.total_tokens["texto"] + v)
+            log_odds += math.log(p_sql / p_texto)
+        return log_odds
+
+    def _log_odds_regras(self, normalizada):
+        return sum(peso for regra, peso in self.regras if regra.search(normalizada))
+
+    def prever(self, pergunta):
+        normalizada = normalizar_texto(pergunta)
+        if any(regra.search(normalizada) for regra in self.explicacao):
+            return "texto", 1.0
+        log_odds = self._log_odds_regras(normalizada) + self._log_odds_bayes(tokenizar(pergunta))
+        p_sql = _sigmoide(log_odds)
+        return ("sql", p_sql) if p_sql >= 0.5 else ("texto", 1 - p_sql)
+
+    def classificar(self, pergunta):
+        rotulo, confianca = self.prever(pergunta)
+        return rotulo if confianca >= self.limiar else None
+
+
+def avaliar(classificar, exemplos=PERGUNTAS_AVALIACAO):
+    """
+    Acurácia e latência de uma função pergunta -> "sql"/"texto"/None.
+    None conta como "encaminhado ao LLM" (fora da acurácia).
+    """
+    acertos, decididos, latencias = 0, 0, []
+    for pergunta, esperado in exemplos:
+        inicio = time.perf_counter()
+        rotulo = classificar(pergunta)
+        latencias.append(time.perf_counter() - inicio)
+        if rotulo is None:
+            continue
+        decididos += 1
+        acertos += int(rotulo == esperado)
+    latencias.sort()
+    return {
+        "perguntas": len(exemplos),
+        "decididas_localmente": decididos,
+        "acuracia": acertos / decididos if decididos else 0.0,
+        "latencia_media_ms": 1000 * sum(latencias) / len(latencias),
+        "latencia_p95_ms": 1000 * latencias[int(0.95 * (len(latencias) - 1))],
+    }
+
+
+if __name__ == "__main__":
+    local = ClassificadorIntencao()
+    print("Local (com limiar):", avaliar(local.classificar))
+    print("Local (sem limiar):", avaliar(lambda p: local.prever(p)[0]))
+
+    if os.environ.get("GOOGLE_API_KEY"):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.0)
+
+        def classificar_llm(pergunta):
+            resposta = llm.invoke(PROMPT_INTENCAO.format(pergunta=pergunta)).content.strip().lower()
+            return "sql" if "sql" in resposta else "texto"
+
+        print("LLM:", avaliar(classificar_llm))
+        perguntas = [p for p, _ in PERGUNTAS_AVALIACAO]
+        concordancia = sum(local.prever(p)[0] == classificar_llm(p) for p in perguntas) / len(perguntas)
+        print(f"Concordância local x LLM: {concordancia:.0%}")
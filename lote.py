@@ -0,0 +1,240 @@
+"""
+Execução em lote: regenera relatórios a partir de uma lista fixa de perguntas,
+sem interação. Cada pergunta passa por gerar_sql_real -> otimizar_sql ->
+validar_e_executar_sql e cada bloco SQL vira um Parquet em --saida (com a
+pergunta e o SQL nos metadados). O manifesto.jsonl registra cada pergunta
+concluída: interrompido, o lote continua de onde parou (erros são refeitos).
+Consultas cortadas pelo TOP do governador ficam com status "limitada" e
+truncado=True: não contam como concluídas e são refeitas na retomada.
+
+    python lote.py relatorios.csv --saida relatorios/ --concorrencia 4 --llm-por-minuto 60
+    python lote.py fixtures/benchmark/perguntas.json --saida /tmp/lote --sintetico --atraso-llm 0.3
+
+Entrada: CSV (coluna "pergunta" e, opcional, "id"; separador , ou ;), JSONL ou
+JSON (lista de objetos). Fora do --sintetico, usa as mesmas variáveis de
+ambiente da API (servico.py).
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from mensagens import com_nomes_de_exibicao
+from pipeline import ConsultaBloqueada
+from recursos import BaldeDeTokens
+from texto import normalizar_texto
+
+NOME_MANIFESTO = "manifesto.jsonl"
+STATUS_CONCLUIDOS = {"ok", "sem_sql", "bloqueada"}  # "erro" e "limitada" são refeitos na retomada
+MAX_LINHAS_PADRAO = 100_000
+
+
+def _id_da_pergunta(pergunta):
+    return hashlib.sha1(normalizar_texto(pergunta).encode("utf-8")).hexdigest()[:12]
+
+
+def ler_perguntas(caminho):
+    """[{"id", "pergunta"}] sem repetições de id, na ordem do arquivo."""
+    extensao = os.path.splitext(caminho)[1].lower()
+    with open(caminho, encoding="utf-8-sig", newline="") as arquivo:
+        if extensao == ".csv":
+            amostra = arquivo.read(4096)
+            arquivo.seek(0)
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=",;\t")
+            itens = list(csv.DictReader(arquivo, dialect=dialeto))
+        elif extensao == ".jsonl":
+            itens = [json.loads(linha) for linha in arquivo if linha.strip()]
+        else:
+            itens = json.load(arquivo)
+
+    perguntas = {}
+    for item in itens:
+        pergunta = (item.get("pergunta") or "").strip()
+        if not pergunta:
+            continue
+        identificador = re.sub(r"[^\w.-]+", "_", str(item.get("id") or "").strip()) or _id_da_pergunta(pergunta)
+        perguntas.setdefault(identificador, {"id": identificador, "pergunta": pergunta})
+    return list(perguntas.values())
+
+
+class Manifesto:
+    """JSONL só de acréscimo: uma linha por pergunta concluída; a última linha de cada id vale."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+
+    def carregar(self):
+        registros = {}
+        if not os.path.exists(self.caminho):
+            return registros
+        with open(self.caminho, "rb+") as arquivo:
+            conteudo = arquivo.read()
+            # Última linha cortada por uma interrupção: descartada, senão o próximo registro colaria nela
+            completo = conteudo[:conteudo.rfind(b"\n") + 1]
+            if len(completo) < len(conteudo):
+                arquivo.truncate(len(completo))
+        for linha in completo.decode("utf-8").splitlines():
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError:
+                continue
+            registros[registro["id"]] = registro
+        return registros
+
+    def registrar(self, registro):
+        linha = json.dumps(registro, ensure_ascii=False, default=str) + "\n"
+        with self._lock, open(self.caminho, "a", encoding="utf-8") as arquivo:
+            arquivo.write(linha)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+
+
+def gravar_parquet(df, caminho, metadados):
+    """Grava num temporário e renomeia: um Parquet nunca fica pela metade."""
+    tabela = pa.Table.from_pandas(com_nomes_de_exibicao(df), preserve_index=False)
+    esquema = {**(tabela.schema.metadata or {}),
+               b"chatbot_protheus": json.dumps(metadados, ensure_ascii=False).encode("utf-8")}
+    temporario = caminho + ".tmp"
+    pq.write_table(tabela.replace_schema_metadata(esquema), temporario, compression="zstd")
+    os.replace(temporario, caminho)
+
+
+def processar_pergunta(pipeline, item, pasta_saida, max_linhas):
+    """Registro do manifesto para uma pergunta (nunca levanta exceção)."""
+    inicio = time.perf_counter()
+    registro = {"id": item["id"], "pergunta": item["pergunta"], "consultas": []}
+    try:
+        resposta, blocos = pipeline.gerar_sql_real(item["pergunta"], "")
+        if not blocos:
+            registro.update(status="sem_sql", resposta=resposta.strip())
+        for n, bloco in enumerate(blocos, 1):
+            sql_query, reescritas, _ = pipeline.otimizar_sql(bloco)
+            df, truncado, limite_governador = pipeline.validar_e_executar_sql(sql_query, limite=max_linhas)
+            # O TOP do governador corta sem avisar (ha_mais não vê além dele)
+            limitada = limite_governador is not None and len(df) >= limite_governador
+            truncado = truncado or limitada
+            nome = f"{item['id']}.parquet" if len(blocos) == 1 else f"{item['id']}_{n}.parquet"
+            gravar_parquet(df, os.path.join(pasta_saida, nome),
+                           {"pergunta": item["pergunta"], "sql": sql_query, "truncado": truncado,
+                            "limite_governador": limite_governador})
+            registro["consultas"].append({"arquivo": nome, "sql": sql_query, "linhas": len(df),
+                                          "truncado": truncado, "limite_governador": limite_governador,
+                                          "reescritas": len(reescritas)})
+            if limitada:
+                registro.update(status="limitada",
+                                erro=f"{nome}: limitado a {limite_governador} linhas pelo governador")
+        registro.setdefault("status", "ok")
+    except ConsultaBloqueada as ve:
+        registro.update(status="bloqueada", erro=str(ve))
+    except Exception as e:
+        registro.update(status="erro", erro=f"{type(e).__name__}: {e}")
+        pipeline.invalidar_sql_em_cache(item["pergunta"])
+    registro["duracao_s"] = round(time.perf_counter() - inicio, 3)
+    registro["concluido_em"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    return registro
+
+
+def executar_lote(pipeline, perguntas, pasta_saida, concorrencia=4, max_linhas=MAX_LINHAS_PADRAO,
+                  saida_progresso=sys.stderr):
+    """Roda as perguntas ainda não concluídas no manifesto; retorna o resumo da execução."""
+    os.makedirs(pasta_saida, exist_ok=True)
+    manifesto = Manifesto(os.path.join(pasta_saida, NOME_MANIFESTO))
+    concluidas = {identificador for identificador, registro in manifesto.carregar().items()
+                  if registro.get("status") in STATUS_CONCLUIDOS}
+    pendentes = [item for item in perguntas if item["id"] not in concluidas]
+
+    status = Counter()
+    duracoes = []
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia, thread_name_prefix="lote") as executor:
+        futuros = [executor.submit(processar_pergunta, pipeline, item, pasta_saida, max_linhas) for item in pendentes]
+        for feitas, futuro in enumerate(as_completed(futuros), 1):
+            registro = futuro.result()
+            manifesto.registrar(registro)
+            status[registro["status"]] += 1
+            duracoes.append(registro["duracao_s"])
+            if saida_progresso is not None:
+                detalhe = f" — {registro['erro']}" if "erro" in registro else ""
+                print(f"[{feitas}/{len(pendentes)}] {registro['status']:<9} {registro['id']} "
+                      f"({registro['duracao_s']:.2f}s){detalhe}", file=saida_progresso)
+    duracao = time.perf_counter() - inicio
+
+    duracoes.sort()
+    return {
+        "perguntas": len(perguntas),
+        "ja_concluidas": len(perguntas) - len(pendentes),
+        "executadas": len(pendentes),
+        "status": dict(status),
+        "duracao_s": round(duracao, 2),
+        "perguntas_por_minuto": round(60 * len(pendentes) / duracao, 1) if pendentes and duracao else 0.0,
+        "p50_s": duracoes[len(duracoes) // 2] if duracoes else 0.0,
+        "p95_s": duracoes[int(0.95 * (len(duracoes) - 1))] if duracoes else 0.0,
+        "templates": pipeline.planejador.estatisticas()["atendidas"],
+        "quota_llm": pipeline.limitador.estatisticas() if pipeline.limitador is not None else None,
+    }
+
+
+def imprimir_resumo(resumo):
+    print(f"\nPerguntas: {resumo['perguntas']} ({resumo['ja_concluidas']} já concluídas, "
+          f"{resumo['executadas']} executadas agora) — {resumo['status']}")
+    print(f"Duração: {resumo['duracao_s']}s | vazão: {resumo['perguntas_por_minuto']} perguntas/min | "
+          f"por pergunta p50 {resumo['p50_s']}s, p95 {resumo['p95_s']}s")
+    if resumo["quota_llm"]:
+        print(f"Quota do LLM: {resumo['quota_llm']['chamadas']} chamadas, "
+              f"{resumo['quota_llm']['espera_total_s']}s de espera no limitador")
+    print(f"Respondidas por template (sem LLM): {resumo['templates']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roda uma lista de perguntas e grava os resultados em Parquet.")
+    parser.add_argument("entrada", help="CSV, JSONL ou JSON com as perguntas")
+    parser.add_argument("--saida", required=True, help="pasta dos Parquet e do manifesto (retomável)")
+    parser.add_argument("--concorrencia", type=int, default=4, help="perguntas simultâneas")
+    parser.add_argument("--llm-por-minuto", type=int, default=60, help="quota de chamadas ao Gemini por minuto")
+    parser.add_argument("--rajada", type=int, default=None, help="chamadas seguidas permitidas sem esperar")
+    parser.add_argument("--max-linhas", type=int, default=MAX_LINHAS_PADRAO, help="linhas por consulta")
+    parser.add_argument("--sintetico", action="store_true",
+                        help="banco sintético e LLM gravado do benchmark (sem SQL Server/Gemini)")
+    parser.add_argument("--atraso-llm", type=float, default=0.0, help="latência simulada no --sintetico (s)")
+    args = parser.parse_args()
+
+    perguntas = ler_perguntas(args.entrada)
+    limitador = BaldeDeTokens(args.llm_por_minuto, args.rajada)
+    if args.sintetico:
+        from benchmark import LLMGravado, carregar_corpus, montar_pipeline_sintetico
+
+        with tempfile.TemporaryDirectory(prefix="lote_protheus_") as pasta:
+            llm = LLMGravado(carregar_corpus(), atraso_primeiro_token=args.atraso_llm)
+            pipeline, _ = montar_pipeline_sintetico(pasta, llm, limitador=limitador)
+            resumo = executar_lote(pipeline, perguntas, args.saida, args.concorrencia, args.max_linhas)
+            pipeline.engine.dispose()
+    else:
+        from motor import montar_pipeline_producao
+
+        try:
+            pipeline = montar_pipeline_producao(
+                os.environ["PROTHEUS_DB_HOST"], os.environ["PROTHEUS_DB_NAME"], os.environ["PROTHEUS_DB_USER"],
+                os.environ["PROTHEUS_DB_PASS"], os.environ["GOOGLE_API_KEY"],
+                timeout_consulta=int(os.environ.get("SQL_TIMEOUT", 300)), limitador=limitador,
+            )
+        except KeyError as e:
+            sys.exit(f"Variável de ambiente {e} não configurada.")
+        resumo = executar_lote(pipeline, perguntas, args.saida, args.concorrencia, args.max_linhas)
+    imprimir_resumo(resumo)
+    sys.exit(1 if resumo["status"].get("erro") or resumo["status"].get("limitada") else 0)
+
+
+if __name__ == "__main__":
+    main()
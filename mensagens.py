@@ -0,0 +1,216 @@
+"""
+Mensagens do chat guardadas de forma compacta em st.session_state: texto, SQL e
+metadados de cada bloco, com o resultado em Arrow IPC (zstd) num armazém da
+sessão, no lugar das tabelas em markdown. Acima do limite de memória da sessão,
+os resultados mais antigos vão para o disco e voltam quando o turno é aberto.
+
+Medição em sessões longas (markdown x compacto; por padrão 500 turnos e limite
+de 0,2 MB, para que os turnos antigos vão para o disco):
+    python mensagens.py --turnos 500 --max-mb 0.2
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+
+from cache_resultados import desserializar_resultado, serializar_resultado
+
+PASTA_SESSOES = os.path.join(".cache", "sessoes")
+
+
+def nomes_de_exibicao(colunas):
+    """
+    Nomes de coluna únicos e não vazios, como o Arrow e o st.dataframe exigem:
+    ['Código', 'Código', ''] -> ['Código', 'Código (2)', '(sem nome)'].
+    """
+    nomes, vistos = [], set()
+    for coluna in colunas:
+        base = str(coluna).strip() or "(sem nome)"
+        nome, n = base, 1
+        while nome in vistos:
+            n += 1
+            nome = f"{base} ({n})"
+        vistos.add(nome)
+        nomes.append(nome)
+    return nomes
+
+
+def com_nomes_de_exibicao(df):
+    """O próprio df se os nomes já servem; senão, uma cópia rasa renomeada."""
+    nomes = nomes_de_exibicao(df.columns)
+    return df if nomes == list(df.columns) else df.set_axis(nomes, axis=1)
+
+
+class ArmazemResultados:
+    """
+    Resultados de uma sessão, por chave. Até `max_bytes` ficam em memória (LRU);
+    o excedente vai para `pasta`. Uma sessão só roda um script por vez: sem lock.
+    """
+
+    def __init__(self, pasta, max_bytes=16 * 1024 * 1024):
+        self.pasta = pasta
+        self.max_bytes = max_bytes
+        self._memoria = OrderedDict()  # chave -> buffer Arrow IPC
+        self._disco = {}  # chave -> bytes
+        self._bytes = 0
+        self._sequencia = 0
+        self.leituras_disco = 0
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, f"{chave}.arrow")
+
+    def guardar(self, df):
+        """Chave do resultado; colunas repetidas ou sem nome são gravadas com os nomes de exibição."""
+        buffer = serializar_resultado(com_nomes_de_exibicao(df))
+        self._sequencia += 1
+        chave = f"r{self._sequencia:06d}"
+        self._memoria[chave] = buffer
+        self._bytes += buffer.size
+        self._despejar()
+        return chave
+
+    def _despejar(self):
+        """Os menos usados vão para o disco até caber no limite (o mais recente sempre fica)."""
+        while self._bytes > self.max_bytes and len(self._memoria) > 1:
+            chave, buffer = self._memoria.popitem(last=False)
+            os.makedirs(self.pasta, exist_ok=True)
+            with open(self._caminho(chave), "wb") as arquivo:
+                arquivo.write(buffer)
+            self._disco[chave] = buffer.size
+            self._bytes -= buffer.size
+
+    def obter(self, chave):
+        """DataFrame do resultado; se estava no disco, volta para a memória."""
+        buffer = self._memoria.get(chave)
+        if buffer is not None:
+            self._memoria.move_to_end(chave)
+            return desserializar_resultado(buffer)
+        with open(self._caminho(chave), "rb") as arquivo:
+            buffer = pa.py_buffer(arquivo.read())
+        self.leituras_disco += 1
+        del self._disco[chave]
+        os.remove(self._caminho(chave))
+        self._memoria[chave] = buffer
+        self._bytes += buffer.size
+        self._despejar()
+        return desserializar_resultado(buffer)
+
+    def estatisticas(self):
+        return {
+            "itens_memoria": len(self._memoria),
+            "bytes_memoria": self._bytes,
+            "itens_disco": len(self._disco),
+            "bytes_disco": sum(self._disco.values()),
+            "leituras_disco": self.leituras_disco,
+        }
+
+    def limpar(self):
+        shutil.rmtree(self.pasta, ignore_errors=True)
+        self._memoria.clear()
+        self._disco.clear()
+        self._bytes = 0
+
+
+def limpar_sessoes_antigas(pasta_base=PASTA_SESSOES, max_idade_segundos=24 * 3600):
+    """Pastas de sessões encerradas (o Streamlit não avisa o fim da sessão); retorna quantas removeu."""
+    if not os.path.isdir(pasta_base):
+        return 0
+    limite = time.time() - max_idade_segundos
+    removidas = 0
+    for nome in os.listdir(pasta_base):
+        caminho = os.path.join(pasta_base, nome)
+        if os.path.isdir(caminho) and os.path.getmtime(caminho) < limite:
+            shutil.rmtree(caminho, ignore_errors=True)
+            removidas += 1
+    return removidas
+
+
+def rotulo_do_bloco(bloco):
+    """Linha do turno recolhido, ex.: '📊 50+ linhas · Cliente, Mês, Total'."""
+    if not bloco.get("resultado"):
+        return f"📄 {bloco['mensagem']}"
+    colunas = ", ".join(bloco["colunas"][:4]) + ("…" if len(bloco["colunas"]) > 4 else "")
+    return f"📊 {bloco['linhas']}{'+' if bloco['ha_mais'] else ''} linhas · {colunas}"
+
+
+def medir_sessao_longa(turnos=500, linhas=50, max_bytes=200 * 1024, abertas=4):
+    """
+    Simula uma sessão com `turnos` respostas SQL de `linhas` linhas e compara o
+    formato anterior (markdown de até 20 linhas por turno, reenviado a cada rerun)
+    com o compacto (Arrow no armazém; só os turnos abertos são renderizados).
+    `reabrir_ms` é a leitura do turno mais antigo do disco (None se nada passou do limite).
+    """
+    sql = ("SELECT SA1.A1_NOME AS \"Cliente\", LEFT(SF2.F2_EMISSAO, 6) AS \"Mês\", SUM(SF2.F2_VALBRUT) AS \"Total\"\n"
+           "FROM SF2010 SF2\nINNER JOIN SA1010 SA1 ON SA1.A1_COD = SF2.F2_CLIENTE AND SA1.A1_LOJA = SF2.F2_LOJA\n"
+           "WHERE SF2.D_E_L_E_T_ = ' ' AND SF2.F2_FILIAL = '01'\nGROUP BY SA1.A1_NOME, LEFT(SF2.F2_EMISSAO, 6)")
+    with tempfile.TemporaryDirectory(prefix="sessao_") as pasta:
+        armazem = ArmazemResultados(pasta, max_bytes)
+        markdown_total = 0
+        mensagens = []
+        inicio = time.perf_counter()
+        for turno in range(turnos):
+            df = pd.DataFrame({
+                "Cliente": [f"CLIENTE {turno:03d}{i:03d} LTDA" for i in range(linhas)],
+                "Mês": [f"2025{1 + i % 12:02d}" for i in range(linhas)],
+                "Total": [1000.0 + 37.5 * i + turno for i in range(linhas)],
+            })
+            markdown = f"\n\n```sql\n{sql}\n```\n\n✅ {len(df)} registros retornados.\n" + df.head(20).to_markdown(index=False)
+            markdown_total += len(markdown.encode("utf-8"))
+            mensagens.append({"sql": sql, "mensagem": f"✅ {len(df)} registros retornados.", "nivel": "success",
+                              "resultado": armazem.guardar(df), "linhas": len(df), "colunas": list(df.columns),
+                              "ha_mais": False, "indice": 0})
+        guardar_ms = 1000 * (time.perf_counter() - inicio) / turnos
+
+        # Rerun: os turnos abertos leem o resultado; os demais só mostram o rótulo
+        inicio = time.perf_counter()
+        for bloco in mensagens[-abertas:]:
+            armazem.obter(bloco["resultado"])
+        rotulos = [rotulo_do_bloco(bloco) for bloco in mensagens[:-abertas]]
+        rerun_ms = 1000 * (time.perf_counter() - inicio)
+
+        reabrir_ms = None
+        if armazem.estatisticas()["itens_disco"]:
+            # O mais antigo foi o primeiro a sair da memória (LRU)
+            leituras = armazem.leituras_disco
+            inicio = time.perf_counter()
+            armazem.obter(mensagens[0]["resultado"])
+            reabrir_ms = 1000 * (time.perf_counter() - inicio)
+            assert armazem.leituras_disco == leituras + 1, "o turno reaberto não veio do disco"
+        metadados = sum(len(str(bloco)) for bloco in mensagens)
+        return {
+            "turnos": turnos,
+            "markdown_bytes": markdown_total,
+            "compacto_memoria_bytes": armazem.estatisticas()["bytes_memoria"] + metadados,
+            "compacto_metadados_bytes": metadados,
+            "compacto_disco_bytes": armazem.estatisticas()["bytes_disco"],
+            "rerun_markdown_bytes": markdown_total,
+            "rerun_compacto_bytes": sum(len(r) for r in rotulos) + sum(
+                len(serializar_resultado(armazem.obter(bloco["resultado"]))) for bloco in mensagens[-abertas:]),
+            "guardar_ms": guardar_ms,
+            "rerun_ms": rerun_ms,
+            "reabrir_ms": reabrir_ms,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memória e custo de rerun do histórico do chat em sessões longas.")
+    parser.add_argument("--turnos", type=int, default=500)
+    parser.add_argument("--linhas", type=int, default=50, help="linhas de cada resultado simulado")
+    parser.add_argument("--max-mb", type=float, default=0.2, help="limite de memória da sessão (MB)")
+    args = parser.parse_args()
+
+    r = medir_sessao_longa(args.turnos, args.linhas, int(args.max_mb * 1024 * 1024))
+    kb = 1024
+    print(f"{r['turnos']} turnos de {args.linhas} linhas")
+    print(f"Memória da sessão: markdown {r['markdown_bytes'] / kb:.0f} KB -> compacto "
+          f"{r['compacto_memoria_bytes'] / kb:.0f} KB em memória (dos quais {r['compacto_metadados_bytes'] / kb:.0f} KB "
+          f"de SQL e metadados) + {r['compacto_disco_bytes'] / kb:.0f} KB em disco")
+    print(f"Reenviado a cada rerun: {r['rerun_markdown_bytes'] / kb:.0f} KB -> {r['rerun_compacto_bytes'] / kb:.1f} KB")
+    reabrir = "nenhum turno passou do limite" if r["reabrir_ms"] is None else f"{r['reabrir_ms']:.2f} ms"
+    print(f"Guardar um resultado: {r['guardar_ms']:.2f} ms | rerun (turnos abertos): {r['rerun_ms']:.2f} ms | "
+          f"reabrir turno do disco: {reabrir}")
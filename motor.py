@@ -0,0 +1,290 @@
+"""
+Motor assíncrono do chatbot, para usar o pipeline fora do Streamlit (API HTTP,
+bots, outras ferramentas internas).
+
+- As etapas do PipelineProtheus (síncronas) rodam em pools de threads separados
+  para o LLM e para o banco, cada um com limite próprio de concorrência.
+- Perguntas idênticas em andamento são coalescidas: uma geração só, e cada
+  consulta (SQL normalizado + página) executa uma vez para todos que a aguardam.
+- Cada consulta respondida ganha um id (RegistroConsultas): a paginação só aceita
+  esse id, nunca SQL vindo do cliente.
+- montar_pipeline_producao() monta o mesmo pipeline do app a partir do ambiente.
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_resultados import CacheResultados
+from cache_sql import CacheGeracaoSQL, calcular_versao_dicionario, depende_do_historico
+from consulta_sql import normalizar_sql
+from dicionario import TABELAS_DICIONARIO, DicionarioSobDemanda, mapeamento_do_snapshot, sincronizar_dicionario
+from governador import Governador
+from intencao import ClassificadorIntencao
+from pipeline import ConsultaBloqueada, criar_pipeline
+from prompt import CacheContextoGemini
+from recursos import consulta_excedeu_timeout, criar_engine, criar_llm, ler_prompt_template, montar_connection_string
+from regras_protheus import REGRAS_NEGOCIO, REGRAS_PROTHEUS
+from texto import normalizar_texto
+
+MAX_CHAMADAS_LLM = 4
+MAX_CONSULTAS_BANCO = 4
+VALIDADE_CONSULTAS = 30 * 60
+
+
+class Coalescedor:
+    """
+    Uma execução por chave enquanto ela estiver em andamento; quem chega
+    depois aguarda o mesmo resultado (ou a mesma exceção).
+    """
+
+    def __init__(self):
+        self._em_andamento = {}
+        self.executadas = 0
+        self.coalescidas = 0
+
+    def _remover(self, chave, tarefa):
+        if self._em_andamento.get(chave) is tarefa:
+            del self._em_andamento[chave]
+
+    async def executar(self, chave, fabrica):
+        tarefa = self._em_andamento.get(chave)
+        if tarefa is None:
+            self.executadas += 1
+            tarefa = asyncio.ensure_future(fabrica())
+            self._em_andamento[chave] = tarefa
+            tarefa.add_done_callback(functools.partial(self._remover, chave))
+        else:
+            self.coalescidas += 1
+        # shield: um cliente que desconecta não cancela a execução dos demais
+        return await asyncio.shield(tarefa)
+
+    def estatisticas(self):
+        return {"executadas": self.executadas, "coalescidas": self.coalescidas,
+                "em_andamento": len(self._em_andamento)}
+
+
+class RegistroConsultas:
+    """
+    SQL já validado pelo pipeline, por id aleatório, para a paginação. O id expira
+    `validade_segundos` depois do último uso.
+    """
+
+    def __init__(self, validade_segundos=VALIDADE_CONSULTAS, max_consultas=10_000):
+        self.validade_segundos = validade_segundos
+        self.max_consultas = max_consultas
+        self._consultas = {}  # id -> (expira_em, sql)
+        self._lock = threading.Lock()
+
+    def registrar(self, sql_query):
+        consulta_id = secrets.token_urlsafe(12)
+        agora = time.monotonic()
+        with self._lock:
+            if len(self._consultas) >= self.max_consultas:
+                self._consultas = {chave: item for chave, item in self._consultas.items() if item[0] > agora}
+                if len(self._consultas) >= self.max_consultas:
+                    self._consultas.pop(next(iter(self._consultas)))
+            self._consultas[consulta_id] = (agora + self.validade_segundos, sql_query)
+        return consulta_id
+
+    def obter(self, consulta_id):
+        """SQL da consulta, ou None se o id não existe ou expirou."""
+        agora = time.monotonic()
+        with self._lock:
+            item = self._consultas.get(consulta_id)
+            if item is None or item[0] <= agora:
+                self._consultas.pop(consulta_id, None)
+                return None
+            self._consultas[consulta_id] = (agora + self.validade_segundos, item[1])
+        return item[1]
+
+    def __len__(self):
+        return len(self._consultas)
+
+
+def dataframe_para_json(df):
+    """{"columns": [...], "data": [[...]]}, com datas em ISO."""
+    return json.loads(df.to_json(orient="split", index=False, date_format="iso"))
+
+
+class MotorProtheus:
+    """
+    Intenção -> geração do SQL -> validação -> execução, com asyncio.
+    `max_llm` / `max_banco`: chamadas simultâneas ao LLM e consultas simultâneas
+    no banco (o pool do engine deve comportar `max_banco` conexões).
+    """
+
+    def __init__(self, pipeline, max_llm=MAX_CHAMADAS_LLM, max_banco=MAX_CONSULTAS_BANCO, rastreador=None,
+                 coalescer=True, validade_consultas=VALIDADE_CONSULTAS):
+        self.pipeline = pipeline
+        self.rastreador = rastreador
+        self.coalescer = coalescer
+        self._executor_llm = ThreadPoolExecutor(max_workers=max_llm, thread_name_prefix="motor_llm")
+        self._executor_banco = ThreadPoolExecutor(max_workers=max_banco, thread_name_prefix="motor_banco")
+        self.geracoes = Coalescedor()
+        self.consultas = Coalescedor()
+        self.registro = RegistroConsultas(validade_consultas)
+        self.requisicoes = 0
+
+    async def _em_thread(self, executor, funcao, *args):
+        """run_in_executor levando o rastro atual (contextvars) para a thread do pool."""
+        contexto = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, functools.partial(contexto.run, funcao, *args))
+
+    async def _coalescer(self, coalescedor, chave, fabrica):
+        if not self.coalescer:
+            return await fabrica()
+        return await coalescedor.executar(chave, fabrica)
+
+    # ---------- Etapas ----------
+
+    async def classificar_intencao(self, pergunta):
+        """Classificador local na própria thread do loop (microssegundos); só os incertos vão ao LLM."""
+        tipo = self.pipeline.classificador.classificar(pergunta)
+        if tipo is not None:
+            return tipo
+        return await self._coalescer(
+            self.geracoes, ("intencao", normalizar_texto(pergunta)),
+            lambda: self._em_thread(self._executor_llm, self.pipeline.classificar_intencao_llm, pergunta))
+
+    async def gerar_sql(self, pergunta, historico=""):
+        """
+        (resposta, blocos). Mesma chave que o cache de SQL: o histórico só entra
+        quando a pergunta depende dele ("e no mês passado?").
+        """
+        chave = ("sql", normalizar_texto(pergunta), historico if depende_do_historico(pergunta) else "")
+        return await self._coalescer(
+            self.geracoes, chave,
+            lambda: self._em_thread(self._executor_llm, self.pipeline.gerar_sql_real, pergunta, historico))
+
+    async def gerar_resposta_texto(self, pergunta):
+        return await self._coalescer(
+            self.geracoes, ("texto", normalizar_texto(pergunta)),
+            lambda: self._em_thread(self._executor_llm, self.pipeline.gerar_resposta_texto, pergunta))
+
+    async def executar_consulta(self, sql_query, offset=0):
+        """
+        Valida e executa uma página da consulta: retorna (df, ha_mais, limite_governador).
+        O df é compartilhado: só leitura.
+        """
+        return await self._coalescer(
+            self.consultas, ("pagina", normalizar_sql(sql_query), offset),
+            lambda: self._em_thread(self._executor_banco, self.pipeline.validar_e_executar_sql, sql_query, offset))
+
+    async def executar_pagina(self, consulta_id, offset):
+        """Página de uma consulta já respondida, pelo id; KeyError se o id não existe ou expirou."""
+        sql_query = self.registro.obter(consulta_id)
+        if sql_query is None:
+            raise KeyError(consulta_id)
+        return await self.executar_consulta(sql_query, offset)
+
+    async def _consulta_do_bloco(self, bloco):
+        sql_query, reescritas, avisos = self.pipeline.otimizar_sql(bloco)
+        consulta = {"sql": sql_query, "reescritas": reescritas, "avisos": avisos}
+        try:
+            df, ha_mais, limite_governador = await self.executar_consulta(sql_query)
+        except ConsultaBloqueada as ve:
+            return {**consulta, "erro": f"Consulta bloqueada: {ve}", "erro_no_banco": False}
+        except Exception as e:
+            if consulta_excedeu_timeout(e):
+                erro = f"A consulta excedeu {self.pipeline.timeout_consulta}s e foi cancelada."
+            else:
+                logging.getLogger("motor").warning("Erro no banco: %s", e)
+                erro = "Erro ao executar a consulta no banco."
+            return {**consulta, "erro": erro, "erro_no_banco": True}
+        return {**consulta, "consulta_id": self.registro.registrar(sql_query), "resultado": dataframe_para_json(df),
+                "ha_mais": ha_mais, "limite_governador": limite_governador}
+
+    # ---------- Pergunta completa ----------
+
+    async def responder(self, pergunta, historico=""):
+        """
+        {"tipo": "sql"|"texto", "resposta": texto, "consultas": [{sql, reescritas, avisos, consulta_id,
+        resultado | erro, ha_mais, limite_governador}]}; os blocos SQL de uma resposta executam em paralelo.
+        """
+        self.requisicoes += 1
+        rastro = self.rastreador.iniciar(pergunta=pergunta, origem="api") if self.rastreador else None
+        tipo = None
+        try:
+            tipo = await self.classificar_intencao(pergunta)
+            if tipo != "sql":
+                return {"tipo": "texto", "resposta": await self.gerar_resposta_texto(pergunta), "consultas": []}
+
+            resposta, blocos = await self.gerar_sql(pergunta, historico)
+            consultas = list(await asyncio.gather(*(self._consulta_do_bloco(bloco) for bloco in blocos)))
+            if any(consulta.get("erro_no_banco") for consulta in consultas):
+                self.pipeline.invalidar_sql_em_cache(pergunta)
+            for consulta in consultas:
+                consulta.pop("erro_no_banco", None)
+            texto = re.sub(r"```sql.*?```", "", resposta, flags=re.DOTALL).strip()
+            return {"tipo": "sql", "resposta": texto, "consultas": consultas}
+        finally:
+            if rastro is not None:
+                rastro.finalizar(tipo=tipo)
+
+    def estatisticas(self):
+        return {
+            "requisicoes": self.requisicoes,
+            "geracoes": self.geracoes.estatisticas(),
+            "consultas": {**self.consultas.estatisticas(), "registradas": len(self.registro)},
+            "planejador": self.pipeline.planejador.estatisticas(),
+            "cache_sql": self.pipeline.cache_sql.estatisticas(),
+            "pool_banco": self.pipeline.engine.pool.status(),
+        }
+
+    def fechar(self):
+        self._executor_llm.shutdown(wait=False, cancel_futures=True)
+        self._executor_banco.shutdown(wait=False, cancel_futures=True)
+
+
+def montar_pipeline_producao(db_host, db_name, db_user, db_pass, api_key, cache_contexto=True, limites_governador=None,
+                             timeout_consulta=30, caminho_snapshot=".cache/dicionario_sx3.json", sob_demanda=True,
+                             **config):
+    """
+    Mesmos componentes do app (app.py), sem Streamlit: SQL Server, Gemini e caches em .cache/.
+    `sob_demanda`: demais tabelas do ERP pelo catálogo do SX2 (DicionarioSobDemanda).
+    `config` vai para o PipelineProtheus (ex.: limitador, linhas_por_pagina).
+    """
+    engine = criar_engine(montar_connection_string(db_user, db_pass, db_host, db_name))
+    try:
+        mapeamento, indices, _ = sincronizar_dicionario(engine, TABELAS_DICIONARIO, caminho_snapshot)
+    except Exception as e:
+        logging.getLogger("motor").warning("Erro ao ler dicionário SX3/SIX, usando o snapshot: %s", e)
+        mapeamento, indices = mapeamento_do_snapshot(TABELAS_DICIONARIO, caminho_snapshot)
+    if not mapeamento:
+        raise RuntimeError("O mapeamento de tabelas está vazio. Verifique a conexão e a tabela SX3010.")
+
+    dicionario = None
+    if sob_demanda:
+        dicionario = DicionarioSobDemanda(engine, max_tabelas=32)
+        try:
+            dicionario.carregar_catalogo()
+        except Exception as e:
+            logging.getLogger("motor").warning("Catálogo do SX2 indisponível, usando só as tabelas carregadas: %s", e)
+            dicionario = None
+
+    llm = criar_llm(api_key, modelo="gemini-2.5-flash")
+    contexto = None
+    if cache_contexto:
+        try:
+            contexto = CacheContextoGemini(api_key, modelo="gemini-2.5-flash", ttl_segundos=3600)
+        except Exception as e:
+            logging.getLogger("motor").warning("Cache de contexto do Gemini indisponível: %s", e)
+    governador = Governador(limites=limites_governador or {}) if engine.dialect.name == "mssql" else None
+    conteudo_template, _ = ler_prompt_template("prompt_template.txt")
+    return criar_pipeline(
+        engine, llm, conteudo_template, mapeamento, indices,
+        calcular_versao_dicionario(mapeamento, REGRAS_NEGOCIO, REGRAS_PROTHEUS, indices),
+        REGRAS_NEGOCIO, REGRAS_PROTHEUS,
+        CacheGeracaoSQL(caminho=".cache/geracao_sql.sqlite", max_itens=500, ttl_segundos=7 * 24 * 3600),
+        CacheResultados(REGRAS_PROTHEUS, max_bytes=256 * 1024 * 1024),
+        classificador=ClassificadorIntencao(limiar=0.85), governador=governador, cache_contexto=contexto,
+        dicionario=dicionario, timeout_consulta=timeout_consulta, **config,
+    )
@@ -0,0 +1,362 @@
+"""
+Pipeline pergunta -> intenção -> SQL -> resultado, sem Streamlit.
+O app monta um PipelineProtheus por versão do dicionário; o benchmark offline
+monta o mesmo pipeline com um banco local e um LLM gravado.
+"""
+import datetime
+import logging
+import re
+import time
+
+import pandas as pd
+from sqlalchemy import text
+
+from cache_sql import depende_do_historico
+from consulta_sql import paginar_sql, sql_contagem
+from esquema import IndiceEsquema
+from intencao import PROMPT_INTENCAO, ClassificadorIntencao
+from planejador import PlanejadorSQL, resposta_do_plano
+from prompt import CadeiaSQL, PromptSQL
+from rastreamento import span, tokens_da_mensagem
+from recursos import timeout_de_consulta
+from sargabilidade import INDICES_REFERENCIA, VerificadorSargabilidade
+from texto import estimar_tokens
+
+PROMPT_RESPOSTA_CURTA = """
+Você é um assistente conversacional para usuários de negócio do Protheus.
+Responda em **português claro**, de forma **curta, direta e amigável**.
+
+Regras:
+1. Máximo de **2 frases curtas**.
+2. Tom profissional e simpático — sem jargões técnicos.
+3. Se for uma saudação ou teste (ex: "teste", "oi"), diga algo leve, como "Tudo certo — pronto pra ajudar! 😊"
+4. Se for explicação, resuma (ex: "SC5 é o cabeçalho de pedidos, com cliente e valores.").
+5. Nunca gere SQL aqui.
+
+Pergunta:
+{pergunta}
+"""
+
+# (Segurança)
+FORBIDDEN_KEYWORDS = [
+    'DELETE', 'UPDATE', 'INSERT', 'DROP', 'TRUNCATE',
+    'ALTER', 'GRANT', 'REVOKE', 'EXEC', 'EXECUTE', 'CREATE',
+    'MERGE', 'COMMIT', 'ROLLBACK'
+]
+
+# Execução limitada: o resultado nunca é carregado inteiro na memória
+LINHAS_POR_PAGINA = 50
+TAMANHO_LOTE_FETCH = 500
+
+
+class ConsultaBloqueada(ValueError):
+    """SQL recusado pelo próprio pipeline (não é SELECT, palavra-chave bloqueada ou governador)."""
+
+
+def extrair_blocos_sql(resposta):
+    return re.findall(r"```sql\s+(.*?)```", resposta, flags=re.DOTALL | re.IGNORECASE)
+
+
+def validar_sql(sql_query):
+    """
+    (Segurança) Valida a query antes de executar.
+    Levanta ConsultaBloqueada se a query for insegura.
+    """
+    sql_upper = sql_query.upper()
+
+    if not sql_upper.strip().startswith('SELECT'):
+        raise ConsultaBloqueada("Ação não permitida. Apenas consultas 'SELECT' são autorizadas.")
+
+    for keyword in FORBIDDEN_KEYWORDS:
+        if keyword in sql_upper:
+            raise ConsultaBloqueada(f"Ação não permitida. A consulta contém a palavra-chave bloqueada: '{keyword}'.")
+
+
+class PipelineProtheus:
+    """
+    Etapas do chatbot com as dependências injetadas (engine, LLM, caches).
+    Seguro para várias threads: o estado mutável fica nos caches, que têm lock próprio.
+    """
+
+    def __init__(self, engine, llm, sql_chain, versao_dicionario, indice_esquema, planejador,
+                 verificador, classificador, cache_sql, cache_resultados, governador=None,
+                 timeout_consulta=30, linhas_por_pagina=LINHAS_POR_PAGINA, tamanho_lote_fetch=TAMANHO_LOTE_FETCH,
+                 limitador=None, replica=None):
+        self.engine = engine
+        self.llm = llm
+        self.sql_chain = sql_chain
+        self.prompt_sql = sql_chain.prompt_sql
+        self.versao_dicionario = versao_dicionario
+        self.indice_esquema = indice_esquema
+        self.planejador = planejador
+        self.verificador = verificador
+        self.classificador = classificador
+        self.cache_sql = cache_sql
+        self.cache_resultados = cache_resultados
+        self.governador = governador
+        self.timeout_consulta = timeout_consulta
+        self.linhas_por_pagina = linhas_por_pagina
+        self.tamanho_lote_fetch = tamanho_lote_fetch
+        self.limitador = limitador  # BaldeDeTokens da quota do LLM (execução em lote)
+        self.replica = replica  # ReplicaAnalitica (DuckDB) para agregações, opcional
+
+    # ---------- Intenção e geração ----------
+
+    def _aguardar_quota(self):
+        if self.limitador is not None:
+            with span("quota_llm") as dados:
+                dados["espera_ms"] = round(1000 * self.limitador.adquirir(), 2)
+
+    def classificar_intencao_llm(self, pergunta):
+        self._aguardar_quota()
+        with span("intencao_llm") as dados:
+            mensagem = self.llm.invoke(PROMPT_INTENCAO.format(pergunta=pergunta))
+            dados.update(tokens_da_mensagem(mensagem))
+        resposta = mensagem.content.strip().lower()
+        return "sql" if "sql" in resposta else "texto"
+
+    def classificar_intencao(self, pergunta):
+        """Classificação local (regras + Naive Bayes); o LLM só decide os casos incertos."""
+        tipo = self.classificador.classificar(pergunta)
+        if tipo is not None:
+            return tipo
+        return self.classificar_intencao_llm(pergunta)
+
+    def gerar_resposta_texto(self, pergunta):
+        self._aguardar_quota()
+        with span("resposta_texto") as dados:
+            mensagem = self.llm.invoke(PROMPT_RESPOSTA_CURTA.format(pergunta=pergunta))
+            dados.update(tokens_da_mensagem(mensagem))
+        return mensagem.content.strip()
+
+    def gerar_sql_em_fluxo(self, pergunta, historico, relatorio=None):
+        """
+        Gera a resposta SQL em trechos, à medida que o LLM escreve (para st.write_stream).
+        Templates do planejador e acertos do cache saem de uma vez, sem LLM.
+        Perguntas que dependem do histórico ("e no mês passado?") sempre vão ao LLM.
+        `relatorio` (dict): recebe a "origem" da resposta (template, cache ou llm) e,
+        só quando o prompt vai ao LLM, o relatório de tokens (PromptSQL.relatorio_tokens),
+        antes do primeiro trecho.
+        """
+        data_hoje = datetime.date.today().strftime("%Y-%m-%d")
+        usar_cache = not depende_do_historico(pergunta)
+        if usar_cache:
+            with span("geracao_sql_local") as dados:
+                sql_planejado = self.planejador.planejar(pergunta, data_hoje)
+                em_cache = None
+                if sql_planejado is None:
+                    em_cache = self.cache_sql.obter(pergunta, data_hoje, self.versao_dicionario)
+                dados["origem"] = "template" if sql_planejado is not None else "cache" if em_cache is not None else None
+            if relatorio is not None and dados["origem"] is not None:
+                relatorio["origem"] = dados["origem"]
+            if sql_planejado is not None:
+                yield resposta_do_plano(sql_planejado)
+                return
+            if em_cache is not None:
+                yield em_cache[0]
+                return
+
+        with span("montagem_prompt") as dados:
+            # Só o sufixo é montado por pergunta; o prefixo estático já está pronto (e, com cache, no provedor)
+            sufixo = self.prompt_sql.sufixo(pergunta, data_hoje, historico)
+            dados["tokens_prefixo"] = self.prompt_sql.tokens_prefixo
+            dados["tokens_sufixo"] = estimar_tokens(sufixo)
+            dados["cache_contexto"] = self.sql_chain.cache_contexto is not None
+            if relatorio is not None:
+                relatorio.update(self.prompt_sql.relatorio_tokens(
+                    pergunta, data_hoje, historico, com_cache=dados["cache_contexto"], sufixo=sufixo))
+                relatorio["origem"] = "llm"
+        self._aguardar_quota()
+        inicio = time.perf_counter()
+        partes = []
+        mensagem = None
+        with span("gemini_sql") as dados:
+            for pedaco in self.sql_chain.stream_sufixo(sufixo):
+                # Somar os chunks consolida o usage_metadata informado pelo provedor
+                mensagem = pedaco if mensagem is None else mensagem + pedaco
+                if pedaco.content:
+                    if not partes:
+                        dados["primeiro_token_ms"] = round(1000 * (time.perf_counter() - inicio), 2)
+                    partes.append(pedaco.content)
+                    yield pedaco.content
+            dados.update(tokens_da_mensagem(mensagem))
+        latencia = time.perf_counter() - inicio
+        resposta = "".join(partes)
+        if usar_cache:
+            self.cache_sql.guardar(pergunta, data_hoje, self.versao_dicionario, resposta,
+                                   extrair_blocos_sql(resposta), latencia)
+
+    def gerar_sql_real(self, pergunta, historico):
+        """Versão sem streaming: retorna (resposta, sql_blocks)."""
+        resposta = "".join(self.gerar_sql_em_fluxo(pergunta, historico))
+        return resposta, extrair_blocos_sql(resposta)
+
+    def invalidar_sql_em_cache(self, pergunta):
+        """Remove do cache o SQL que falhou no banco, para não repetir o erro."""
+        data_hoje = datetime.date.today().strftime("%Y-%m-%d")
+        self.cache_sql.invalidar(pergunta, data_hoje, self.versao_dicionario)
+
+    def otimizar_sql(self, sql_query):
+        """Predicados como YEAR(C5_EMISSAO) = 2025 viram faixas que usam os índices do SIX."""
+        with span("sargabilidade") as dados:
+            sql_otimizado, reescritas, avisos = self.verificador.otimizar(sql_query.strip())
+            dados["reescritas"] = len(reescritas)
+        return sql_otimizado, reescritas, avisos
+
+    # ---------- Execução ----------
+
+    def governar(self, conn, sql_query, permitir_rebaixar=True):
+        """
+        Aplica o governador: retorna (SQL a executar, TOP forçado ou None) ou levanta
+        ConsultaBloqueada se rejeitado. Sem `permitir_rebaixar` (ex.: COUNT), rebaixar é rejeitar.
+        """
+        if self.governador is None:
+            return sql_query, None
+        sql_final, decisao, motivo = self.governador.avaliar(conn, sql_query)
+        if decisao == "rejeitar" or (decisao == "rebaixar" and not permitir_rebaixar):
+            raise ConsultaBloqueada(f"Consulta muito pesada para o ERP ({motivo}).")
+        if decisao == "rebaixar":
+            return sql_final, self.governador.limites["top_rebaixado"]
+        return sql_final, None
+
+    def _buscar_pagina(self, conn, sql_query, offset, limite):
+        """
+        Lê no máximo `limite` linhas a partir de `offset`, em lotes (fetchmany).
+        O OFFSET/FETCH vai para o servidor; se a reescrita não for segura,
+        as linhas anteriores ao offset são descartadas lote a lote.
+        """
+        paginado = paginar_sql(sql_query, offset, limite)
+        descartar = 0 if paginado is not None else offset
+        with span("banco") as dados:
+            result = conn.execution_options(yield_per=self.tamanho_lote_fetch).execute(text(paginado or sql_query))
+            colunas = list(result.keys())
+            linhas = []
+            try:
+                while len(linhas) < limite:
+                    lote = result.fetchmany(self.tamanho_lote_fetch)
+                    if not lote:
+                        break
+                    if descartar:
+                        pular = min(descartar, len(lote))
+                        lote, descartar = lote[pular:], descartar - pular
+                    linhas.extend(lote[:limite - len(linhas)])
+            finally:
+                result.close()  # libera o cursor sem ler o restante
+            dados["linhas"] = len(linhas)
+        with span("dataframe") as dados:
+            df = pd.DataFrame([tuple(linha) for linha in linhas], columns=colunas)
+            dados["bytes"] = int(df.memory_usage(deep=True).sum())
+        return df
+
+    def _executar_na_replica(self, sql_query, offset, limite):
+        """Agregações sobre tabelas replicadas e em dia vão para a réplica local; None = seguir para o SQL Server."""
+        if self.replica is None:
+            return None
+        df = None
+        with span("replica") as dados:
+            atende, motivo = self.replica.avaliar(sql_query)
+            if atende:
+                try:
+                    df = self.replica.executar(sql_query, offset, limite)
+                except Exception as e:
+                    logging.getLogger("replica").info("SQL não suportado na réplica, indo ao SQL Server: %s", e)
+                    motivo = "erro"
+            dados["destino"] = "replica" if df is not None else "sqlserver"
+            dados["motivo"] = motivo
+            self.replica.registrar(dados["destino"], motivo)
+        return df
+
+    def _variante_pagina(self, sql_query, offset, limite):
+        """
+        Variante da página no cache de resultados, com o TOP forçado pelo governador
+        na última execução (guardado à parte): o resultado rebaixado não se passa pelo completo.
+        """
+        decisao = self.cache_resultados.obter(sql_query, "governador")
+        # 0 guardado = execução sem TOP forçado
+        limite_governador = int(decisao.iloc[0, 0]) or None if decisao is not None else None
+        variante = f"pagina:{offset}:{limite}"
+        return (variante + f":top{limite_governador}" if limite_governador else variante), limite_governador
+
+    def validar_e_executar_sql(self, sql_query, offset=0, limite=None, timeout=None):
+        """
+        Valida e executa a consulta de forma limitada: retorna (df, ha_mais, limite_governador),
+        com no máximo `limite` linhas a partir de `offset`. `limite_governador` é o TOP que o
+        governador forçou (o resultado completo para nessa linha) ou None.
+        O timeout (segundos) é aplicado na conexão; o driver cancela a consulta no servidor.
+        """
+        limite = limite or self.linhas_por_pagina
+        with span("validacao_sql"):
+            validar_sql(sql_query)
+
+        with span("execucao_sql") as dados:
+            # Cache de resultados: mesma consulta (normalizada) e mesma página, dentro do TTL das tabelas lidas
+            variante, limite_governador = self._variante_pagina(sql_query, offset, limite)
+            df = self.cache_resultados.obter(sql_query, variante)
+            dados["cache"] = df is not None
+            if df is None:
+                # Uma linha a mais só para saber se existe próxima página
+                df = self._executar_na_replica(sql_query, offset, limite + 1)
+                limite_governador = None
+                if df is None:
+                    with self.engine.connect() as conn, timeout_de_consulta(conn, timeout or self.timeout_consulta):
+                        # Governador de custo: aprova, força TOP ou rejeita pelo plano estimado
+                        with span("governador"):
+                            sql_governado, limite_governador = self.governar(conn, sql_query)
+                        df = self._buscar_pagina(conn, sql_governado, offset, limite + 1)
+                self.cache_resultados.guardar(sql_query, pd.DataFrame({"top": [limite_governador or 0]}), "governador")
+                variante = f"pagina:{offset}:{limite}" + (f":top{limite_governador}" if limite_governador else "")
+                self.cache_resultados.guardar(sql_query, df, variante)
+            dados["linhas"] = min(len(df), limite)
+            dados["limite_governador"] = limite_governador
+
+        return df.head(limite), len(df) > limite, limite_governador
+
+    def contar_linhas(self, sql_query):
+        """Total real de linhas (COUNT no servidor); só roda quando o usuário pede."""
+        validar_sql(sql_query)
+        df = self.cache_resultados.obter(sql_query, "contagem")
+        if df is None:
+            with self.engine.connect() as conn, timeout_de_consulta(conn, self.timeout_consulta):
+                # TOP num COUNT não limita nada: aqui o governador só aprova ou rejeita
+                sql_governado, _ = self.governar(conn, sql_contagem(sql_query), permitir_rebaixar=False)
+                total = conn.execute(text(sql_governado)).scalar()
+            df = pd.DataFrame({"total": [int(total or 0)]})
+            self.cache_resultados.guardar(sql_query, df, "contagem")
+        return int(df.iloc[0, 0])
+
+    def verificar_exportacao(self, sql_query):
+        """Exportação quer o resultado completo: só a rejeição do governador se aplica, não o TOP forçado."""
+        validar_sql(sql_query)
+        if self.governador is not None:
+            with self.engine.connect() as conn:
+                _, decisao, motivo = self.governador.avaliar(conn, sql_query)
+            if decisao == "rejeitar":
+                raise ConsultaBloqueada(f"Consulta muito pesada para o ERP ({motivo}).")
+
+
+def criar_pipeline(engine, llm, conteudo_template, mapeamento, indices, versao_dicionario, regras_negocio,
+                   regras_protheus, cache_sql, cache_resultados, classificador=None, governador=None,
+                   cache_contexto=None, dicionario=None, **config):
+    """
+    Monta os componentes que dependem do dicionário (índice de esquema, prompt
+    compilado, templates, SIX). Com `cache_contexto`, o dicionário inteiro vai
+    para o prefixo cacheado no provedor. `dicionario` (DicionarioSobDemanda)
+    cobre as demais tabelas do ERP, lidas só quando uma pergunta precisa delas.
+    """
+    indice_esquema = IndiceEsquema(mapeamento, regras_protheus, top_tabelas=3, campos_por_tabela=15)
+    prompt_sql = PromptSQL(conteudo_template, regras_negocio, regras_protheus, mapeamento, indices, indice_esquema,
+                           esquema_no_prefixo=cache_contexto is not None, dicionario=dicionario)
+    return PipelineProtheus(
+        engine=engine,
+        llm=llm,
+        sql_chain=CadeiaSQL(llm, prompt_sql, cache_contexto),
+        versao_dicionario=versao_dicionario,
+        indice_esquema=indice_esquema,
+        planejador=PlanejadorSQL(regras_protheus, mapeamento),
+        verificador=VerificadorSargabilidade(indices or INDICES_REFERENCIA, mapeamento, dicionario),
+        classificador=classificador or ClassificadorIntencao(limiar=0.85),
+        cache_sql=cache_sql,
+        cache_resultados=cache_resultados,
+        governador=governador,
+        **config,
+    )
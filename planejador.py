@@ -0,0 +1,410 @@
+"""
+Planejador determinístico de SQL para os formatos de pergunta mais comuns.
+
+Calcula o caminho de join mais curto pelo grafo de REGRAS_PROTHEUS, aplica
+automaticamente D_E_L_E_T_ e _FILIAL (conforme o modo da tabela) e preenche
+templates (totais por período/filial/cliente/produto, top-N, últimos registros).
+Quando a pergunta não é reconhecida por inteiro, retorna None e o LLM assume.
+"""
+import calendar
+import datetime
+import re
+from collections import deque
+
+from esquema import grafo_relacionamentos
+from texto import normalizar_texto, tokenizar
+
+FILIAL_PADRAO = "01"
+
+MESES = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "abril": 4, "maio": 5, "junho": 6, "julho": 7,
+    "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12,
+}
+
+# Métricas: a versão "item" é usada quando a dimensão exige o nível de item (produto)
+METRICAS = [
+    {
+        "padrao": r"\b(quantidade|quantidades|unidades) vendidas?\b|\bmais vendidos?\b",
+        "cabecalho": None,
+        "item": ("SD2", "SUM(SD2.D2_QUANT)", "Quantidade Vendida", "D2_EMISSAO"),
+    },
+    {
+        "padrao": r"\b(quantidade|numero|total) de pedidos\b|\bquantos pedidos\b",
+        "cabecalho": ("SC5", "COUNT(*)", "Quantidade de Pedidos", "C5_EMISSAO"),
+        "item": None,
+    },
+    {
+        "padrao": r"\b(quantidade|numero|total) de notas( fiscais)?\b|\bquantas notas( fiscais)?\b",
+        "cabecalho": ("SF2", "COUNT(*)", "Quantidade de Notas", "F2_EMISSAO"),
+        "item": None,
+    },
+    {
+        "padrao": r"\b(total|valor) (de vendas|das vendas|vendido|faturado)\b|\bfaturamento\b|\bfaturado\b"
+                  r"|\bvendas\b|\bvenda\b|\bvendemos\b|\bvendeu\b",
+        "cabecalho": ("SF2", "SUM(SF2.F2_VALBRUT)", "Total de Vendas", "F2_EMISSAO"),
+        "item": ("SD2", "SUM(SD2.D2_TOTAL)", "Total de Vendas", "D2_EMISSAO"),
+    },
+]
+
+# Dimensões de agrupamento: (padrão, precisa de item, tabela de junção, campos, rótulos)
+DIMENSOES = [
+    ("mes", r"\bpor mes\b|\bmes a mes\b|\bmensal(mente)?\b", False, None),
+    ("ano", r"\bpor ano\b|\banual(mente)?\b", False, None),
+    ("dia", r"\bpor dia\b|\bdiari[oa]s?\b|\bdia a dia\b", False, None),
+    ("filial", r"\bpor filial\b|\bpor filiais\b", False, None),
+    ("cliente", r"\bpor cliente\b|\bclientes?\b", False, "SA1"),
+    ("produto", r"\bpor produto\b|\bprodutos?\b|\bmais vendidos?\b", True, "SB1"),
+]
+
+ULTIMOS_REGISTROS = {
+    "pedido": {
+        "padrao": r"\bultim[oa]s? (\d+ )?pedidos?( de venda)?\b",
+        "tabela": "SC5",
+        "campos": [("SC5.C5_NUM", "Número do Pedido"), ("SC5.C5_EMISSAO", "Emissão"), ("SA1.A1_NOME", "Cliente")],
+        "ordem": "SC5.C5_EMISSAO DESC, SC5.C5_NUM DESC",
+        "juncoes": ["SA1"],
+    },
+    "nota": {
+        "padrao": r"\bultim[oa]s? (\d+ )?notas?( fiscais| fiscal)?( de saida| emitidas)?\b",
+        "tabela": "SF2",
+        "campos": [("SF2.F2_DOC", "Nota Fiscal"), ("SF2.F2_SERIE", "Série"), ("SF2.F2_EMISSAO", "Emissão"),
+                   ("SA1.A1_NOME", "Cliente"), ("SF2.F2_VALBRUT", "Valor")],
+        "ordem": "SF2.F2_EMISSAO DESC, SF2.F2_DOC DESC",
+        "juncoes": ["SA1"],
+    },
+}
+
+PADRAO_TOP_N = (
+    r"\b(?:top|maiores|principais|melhores) (\d+)\b|\b(\d+) (?:maiores|principais|melhores|primeiros)\b"
+    r"|\b(\d+)(?= (?:clientes?|produtos?)\b)"
+)
+PADRAO_RANKING = r"\b(ranking|maiores|principais|melhores|mais vendidos?)\b"
+PADRAO_FILIAL = r"\bfilial (\d{2})\b"
+
+# Palavras que podem sobrar sem mudar o sentido (verbos de pedido, conectivos).
+# "ate"/"entre" NÃO: "até hoje" e "entre março e maio" são faixas que os padrões de período não cobrem
+PALAVRAS_NEUTRAS = {
+    "total", "geral", "valor", "quanto", "quanta", "foi", "foram", "agora", "atual",
+    "nosso", "nossa", "empresa", "consulta", "dado", "relatorio", "resumo", "periodo", "registro",
+    "mai", "sql", "todo", "toda", "tudo", "eu", "sao", "tem", "temo",
+}
+
+# Corpus dos templates (python planejador.py): perguntas que devem ser atendidas
+# e perguntas que devem ficar com o LLM (o template daria um SQL errado)
+CASOS_ATENDIDOS = [
+    "total de vendas por mês",
+    "Qual o faturamento deste mês?",
+    "top 5 clientes por faturamento este ano",
+    "vendas de hoje",
+    "faturamento de ontem",
+    "quantidade de pedidos do mês passado",
+    "últimos 10 pedidos",
+    "vendas por filial em março de 2025",
+    "vendas por cliente e produto",
+]
+CASOS_NEGATIVOS = [
+    "vendas até hoje",
+    "faturamento até ontem",
+    "vendas entre janeiro e março",
+    "faturamento entre 2024 e 2025",
+    "quantidade de pedidos até o mês passado",
+    "vendas do cliente 000123",
+]
+
+
+def prefixo_campo(tabela):
+    """Prefixo dos campos no Protheus: SA1 -> A1, SC5 -> C5, ZZ1 -> ZZ1."""
+    return tabela[1:] if tabela.startswith("S") else tabela
+
+
+def caminho_de_juncao(grafo, origem, destinos):
+    """
+    Árvore de junção: liga cada tabela de destino à árvore já formada pelo
+    caminho mais curto (BFS a partir de todas as tabelas da árvore).
+    Retorna a lista ordenada de arestas (tabela_na_arvore, tabela_nova).
+    """
+    arvore = [origem]
+    arestas = []
+    for destino in destinos:
+        if destino in arvore:
+            continue
+        anteriores = {t: None for t in arvore}
+        fila = deque(arvore)
+        while fila and destino not in anteriores:
+            atual = fila.popleft()
+            for vizinha in sorted(grafo.get(atual, {})):
+                if vizinha not in anteriores:
+                    anteriores[vizinha] = atual
+                    fila.append(vizinha)
+        if destino not in anteriores:
+            return None
+        caminho = [destino]
+        while anteriores[caminho[-1]] is not None:
+            caminho.append(anteriores[caminho[-1]])
+        caminho.reverse()
+        for anterior, proxima in zip(caminho, caminho[1:]):
+            arestas.append((anterior, proxima))
+            arvore.append(proxima)
+    return arestas
+
+
+def _periodo(normalizada, hoje):
+    """Intervalo de datas (AAAAMMDD, AAAAMMDD) e os padrões que o reconheceram."""
+    def fmt(data):
+        return data.strftime("%Y%m%d")
+
+    m = re.search(r"\bultimos (\d+) dias\b", normalizada)
+    if m:
+        return (fmt(hoje - datetime.timedelta(days=int(m.group(1)))), fmt(hoje)), [re.escape(m.group(0))]
+    if re.search(r"\bhoje\b|\bdo dia\b", normalizada):
+        return (fmt(hoje), fmt(hoje)), [r"\bhoje\b", r"\bdo dia\b"]
+    if re.search(r"\bontem\b", normalizada):
+        ontem = hoje - datetime.timedelta(days=1)
+        return (fmt(ontem), fmt(ontem)), [r"\bontem\b"]
+    m = re.search(r"\b(mes passado|mes anterior|ultimo mes)\b", normalizada)
+    if m:
+        fim = hoje.replace(day=1) - datetime.timedelta(days=1)
+        return (fmt(fim.replace(day=1)), fmt(fim)), [re.escape(m.group(0))]
+    m = re.search(r"\b((d|n)?este mes|mes atual|do mes|no mes|neste mes)\b", normalizada)
+    if m:
+        return (fmt(hoje.replace(day=1)), fmt(hoje)), [re.escape(m.group(0))]
+    m = re.search(r"\b(ano passado|ano anterior)\b", normalizada)
+    if m:
+        ano = hoje.year - 1
+        return (f"{ano}0101", f"{ano}1231"), [re.escape(m.group(0))]
+    m = re.search(r"\b((d|n)?este ano|ano atual|do ano|no ano)\b", normalizada)
+    if m:
+        return (f"{hoje.year}0101", fmt(hoje)), [re.escape(m.group(0))]
+    m = re.search(r"\b(" + "|".join(MESES) + r")( de)?( (20\d\d))?\b", normalizada)
+    if m:
+        ano = int(m.group(4)) if m.group(4) else hoje.year
+        mes = MESES[m.group(1)]
+        ultimo_dia = calendar.monthrange(ano, mes)[1]
+        return (f"{ano}{mes:02d}01", f"{ano}{mes:02d}{ultimo_dia:02d}"), [re.escape(m.group(0))]
+    m = re.search(r"\b(20\d\d)\b", normalizada)
+    if m:
+        return (f"{m.group(1)}0101", f"{m.group(1)}1231"), [re.escape(m.group(0))]
+    return None, []
+
+
+class PlanejadorSQL:
+    """Gera SQL sem LLM para perguntas que casam por completo com um template."""
+
+    def __init__(self, regras_protheus, mapeamento=None, top_padrao=10):
+        self.regras = regras_protheus
+        self.grafo = grafo_relacionamentos(regras_protheus)
+        self.mapeamento = mapeamento
+        self.top_padrao = top_padrao
+        self.perguntas = 0
+        self.atendidas = 0
+
+    # ---------- Regras do Protheus ----------
+
+    def _filtros_tabela(self, tabela, filial, por_filial):
+        prefixo = prefixo_campo(tabela)
+        filtros = [f"{tabela}.D_E_L_E_T_ = ' '"]
+        if self.regras.get(tabela, {}).get("modo") == "C":
+            filtros.append(f"{tabela}.{prefixo}_FILIAL = ''")
+        elif not por_filial:
+            filtros.append(f"{tabela}.{prefixo}_FILIAL = '{filial}'")
+        return filtros
+
+    def _condicao_juncao(self, a, b):
+        campos_a, campos_b = self.grafo[a][b]
+        condicoes = [f"{b}.{cb} = {a}.{ca}" for ca, cb in zip(campos_a, campos_b)]
+        # Entre duas tabelas exclusivas, a filial também faz parte da chave
+        if self.regras.get(a, {}).get("modo") == "E" and self.regras.get(b, {}).get("modo") == "E":
+            condicoes.append(f"{b}.{prefixo_campo(b)}_FILIAL = {a}.{prefixo_campo(a)}_FILIAL")
+        return condicoes
+
+    def montar_from(self, fato, juncoes, filial=FILIAL_PADRAO, por_filial=False):
+        """FROM + JOINs pelo caminho mais curto, com D_E_L_E_T_ e _FILIAL de cada tabela."""
+        arestas = caminho_de_juncao(self.grafo, fato, juncoes)
+        if arestas is None:
+            return None, None
+        linhas = [f"FROM {self.regras[fato]['tabela_fisica']} {fato}"]
+        for anterior, nova in arestas:
+            condicoes = self._condicao_juncao(anterior, nova) + self._filtros_tabela(nova, filial, por_filial)
+            linhas.append(f"INNER JOIN {self.regras[nova]['tabela_fisica']} {nova} ON " + " AND ".join(condicoes))
+        return "\n".join(linhas), self._filtros_tabela(fato, filial, por_filial)
+
+    def _campos_existem(self, sql):
+        """Com o dicionário carregado, todo campo usado precisa existir no SX3."""
+        if not self.mapeamento:
+            return True
+        for tabela, campo in re.findall(r"\b([A-Z][A-Z0-9]{2})\.([A-Z0-9]+_[A-Z0-9_]+)\b", sql):
+            if campo in ("D_E_L_E_T_",) or campo.endswith("_FILIAL"):
+                continue
+            if tabela not in self.mapeamento or campo not in self.mapeamento[tabela]:
+                return False
+        return True
+
+    # ---------- Templates ----------
+
+    def planejar(self, pergunta, data_hoje):
+        """
+        Retorna o SQL do template ou None se a pergunta não for reconhecida
+        com confiança (sobra alguma palavra que o template não explica).
+        """
+        self.perguntas += 1
+        normalizada = normalizar_texto(pergunta)
+        hoje = datetime.datetime.strptime(data_hoje, "%Y-%m-%d").date()
+        reconhecidos = []
+
+        m_filial = re.search(PADRAO_FILIAL, normalizada)
+        filial = m_filial.group(1) if m_filial else FILIAL_PADRAO
+        if m_filial:
+            reconhecidos.append(PADRAO_FILIAL)
+
+        periodo, padroes_periodo = _periodo(normalizada, hoje)
+        reconhecidos += padroes_periodo
+
+        sql = self._template_ultimos(normalizada, reconhecidos, filial, periodo)
+        if sql is None:
+            sql = self._template_agregado(normalizada, reconhecidos, filial, periodo)
+        if sql is None or not self._campos_existem(sql):
+            return None
+
+        # Confiança: nenhuma palavra significativa pode ficar sem explicação
+        # (trechos marcados sobre a pergunta original: um padrão não apaga o contexto de outro)
+        restante = list(normalizada)
+        for padrao in reconhecidos:
+            for m in re.finditer(padrao, normalizada):
+                restante[m.start():m.end()] = " " * (m.end() - m.start())
+        restante = "".join(restante)
+        # Números soltos (código de cliente, pedido) também invalidam o template
+        sobras = [t for t in tokenizar(restante) if t not in PALAVRAS_NEUTRAS]
+        if sobras:
+            return None
+        self.atendidas += 1
+        return sql
+
+    def estatisticas(self):
+        return {
+            "perguntas": self.perguntas,
+            "atendidas": self.atendidas,
+            "taxa_atendimento": self.atendidas / self.perguntas if self.perguntas else 0.0,
+        }
+
+    def _template_ultimos(self, normalizada, reconhecidos, filial, periodo):
+        for template in ULTIMOS_REGISTROS.values():
+            m = re.search(template["padrao"], normalizada)
+            if not m:
+                continue
+            reconhecidos.append(template["padrao"])
+            quantidade = int(m.group(1)) if m.group(1) else self.top_padrao
+            fato = template["tabela"]
+            clausula_from, filtros = self.montar_from(fato, template["juncoes"], filial)
+            if clausula_from is None:
+                return None
+            if periodo:
+                campo_data = template["ordem"].split()[0]
+                filtros.append(f"{campo_data} BETWEEN '{periodo[0]}' AND '{periodo[1]}'")
+            campos = ",\n    ".join(f'{campo} AS "{alias}"' for campo, alias in template["campos"])
+            return (
+                f"SELECT TOP {quantidade}\n    {campos}\n{clausula_from}\n"
+                f"WHERE " + "\n  AND ".join(filtros) + f"\nORDER BY {template['ordem']};"
+            )
+        return None
+
+    def _template_agregado(self, normalizada, reconhecidos, filial, periodo):
+        metrica = next((m for m in METRICAS if re.search(m["padrao"], normalizada)), None)
+        if metrica is None:
+            return None
+        reconhecidos.append(metrica["padrao"])
+
+        dimensoes = []
+        for nome, padrao, precisa_item, juncao in DIMENSOES:
+            if re.search(padrao, normalizada):
+                dimensoes.append((nome, precisa_item, juncao))
+                reconhecidos.append(padrao)
+        if len(dimensoes) > 2:
+            return None
+
+        nivel_item = any(precisa_item for _, precisa_item, _ in dimensoes) or metrica["cabecalho"] is None
+        definicao = metrica["item"] if nivel_item else metrica["cabecalho"]
+        if definicao is None:
+            return None
+        fato, expressao, alias_metrica, campo_data = definicao
+        data = f"{fato}.{campo_data}"
+        por_filial = any(nome == "filial" for nome, _, _ in dimensoes)
+
+        # Top-N / ranking
+        m_top = re.search(PADRAO_TOP_N, normalizada)
+        top = None
+        if m_top:
+            top = int(next(grupo for grupo in m_top.groups() if grupo))
+            reconhecidos.append(PADRAO_TOP_N)
+        elif re.search(PADRAO_RANKING, normalizada) and dimensoes:
+            top = self.top_padrao
+            reconhecidos.append(PADRAO_RANKING)
+
+        selecao, agrupamento, juncoes = [], [], []
+        for nome, _, juncao in dimensoes:
+            if nome == "mes":
+                selecao.append(f'LEFT({data}, 6) AS "Mês"')
+                agrupamento.append(f"LEFT({data}, 6)")
+            elif nome == "ano":
+                selecao.append(f'LEFT({data}, 4) AS "Ano"')
+                agrupamento.append(f"LEFT({data}, 4)")
+            elif nome == "dia":
+                selecao.append(f'{data} AS "Dia"')
+                agrupamento.append(data)
+            elif nome == "filial":
+                selecao.append(f'{fato}.{prefixo_campo(fato)}_FILIAL AS "Filial"')
+                agrupamento.append(f"{fato}.{prefixo_campo(fato)}_FILIAL")
+            elif nome == "cliente":
+                juncoes.append(juncao)
+                selecao += ['SA1.A1_COD AS "Código Cliente"', 'SA1.A1_LOJA AS "Loja"', 'SA1.A1_NOME AS "Cliente"']
+                agrupamento += ["SA1.A1_COD", "SA1.A1_LOJA", "SA1.A1_NOME"]
+            elif nome == "produto":
+                juncoes.append(juncao)
+                selecao += ['SB1.B1_COD AS "Código Produto"', 'SB1.B1_DESC AS "Produto"']
+                agrupamento += ["SB1.B1_COD", "SB1.B1_DESC"]
+
+        clausula_from, filtros = self.montar_from(fato, juncoes, filial, por_filial)
+        if clausula_from is None:
+            return None
+        if periodo:
+            filtros.append(f"{data} BETWEEN '{periodo[0]}' AND '{periodo[1]}'")
+        if fato == "SF2" or fato == "SD2":
+            # Só notas de venda (tipo normal) entram no faturamento
+            campo_tipo = "F2_TIPO" if fato == "SF2" else "D2_TIPO"
+            filtros.append(f"{fato}.{campo_tipo} = 'N'")
+
+        selecao.append(f'{expressao} AS "{alias_metrica}"')
+        sql = "SELECT" + (f" TOP {top}" if top and agrupamento else "")
+        sql += "\n    " + ",\n    ".join(selecao) + f"\n{clausula_from}\nWHERE " + "\n  AND ".join(filtros)
+        if agrupamento:
+            sql += "\nGROUP BY " + ", ".join(agrupamento)
+            if top:
+                sql += f"\nORDER BY {expressao} DESC"
+            else:
+                sql += "\nORDER BY " + ", ".join(agrupamento)
+        return sql + ";"
+
+
+def resposta_do_plano(sql):
+    """Mesmo formato da resposta do LLM (bloco ```sql```)."""
+    return f"```sql\n{sql}\n```"
+
+
+if __name__ == "__main__":
+    import sys
+
+    from regras_protheus import REGRAS_PROTHEUS
+
+    planejador = PlanejadorSQL(REGRAS_PROTHEUS)
+    falhas = 0
+    for pergunta, esperado in [(p, True) for p in CASOS_ATENDIDOS] + [(p, False) for p in CASOS_NEGATIVOS]:
+        sql = planejador.planejar(pergunta, "2026-10-17")
+        atendida = sql is not None
+        # Colunas repetidas quebram o resumo do histórico, o Arrow e o Parquet do lote
+        aliases = re.findall(r'AS "([^"]+)"', sql or "")
+        repetidas = sorted({alias for alias in aliases if aliases.count(alias) > 1})
+        ok = atendida == esperado and not repetidas
+        falhas += not ok
+        detalhe = f" (colunas repetidas: {', '.join(repetidas)})" if repetidas else ""
+        print(f"{'ok ' if ok else 'ERRO'} {'template' if atendida else 'LLM':<8} {pergunta}{detalhe}")
+    print(f"{falhas} falha(s) em {len(CASOS_ATENDIDOS) + len(CASOS_NEGATIVOS)} casos")
+    sys.exit(1 if falhas else 0)
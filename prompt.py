@@ -0,0 +1,341 @@
+"""
+Prompt do SQL em duas partes:
+
+- prefixo estático (instruções, regras e dicionário em formato compacto),
+  compilado uma vez por versão do dicionário;
+- sufixo pequeno por pergunta (data, histórico e pergunta).
+
+Com cache de contexto, o prefixo vai uma vez para o provedor (Gemini) e cada
+pergunta envia só o sufixo. CacheContextoLocal faz o mesmo papel no benchmark.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+
+from esquema import recortar_campos
+from rastreamento import span
+from recursos import formatar_regras
+from texto import estimar_tokens
+
+VARIAVEIS_POR_PERGUNTA = ("mapeamento", "data_hoje", "historico", "pergunta")
+
+LEGENDA_TIPOS = "Tipos: C=caractere, N=numérico, D=data CHAR(8) AAAAMMDD, L=lógico, M=memo."
+
+PADRAO_DESCRICAO_CAMPO = re.compile(r"^Tipo:\s*(?P<tipo>[^,]*),\s*Descrição:\s*(?P<descricao>.*)$", re.DOTALL)
+
+
+def compactar_texto(texto):
+    """Sem espaços de alinhamento, réguas de tabela markdown e linhas em branco repetidas."""
+    linhas = []
+    for linha in texto.splitlines():
+        linha = re.sub(r"[ \t]{2,}", " ", linha).strip()
+        if re.fullmatch(r"[|:\- ]*-{3,}[|:\- ]*|#\s*=+", linha):
+            continue
+        if not linha and (not linhas or not linhas[-1]):
+            continue
+        linhas.append(linha)
+    return "\n".join(linhas).strip()
+
+
+def serializar_regras(regras_negocio, regras_protheus):
+    """
+    {regras} compacto: regras de negócio sem alinhamento e uma linha por tabela
+    e por relacionamento, no lugar do json.dumps(indent=2) de REGRAS_PROTHEUS.
+    """
+    linhas = [compactar_texto(regras_negocio), "", "Tabelas (lógica física modo chave: descrição):"]
+    relacionamentos = {}
+    for tabela, regra in regras_protheus.items():
+        linhas.append(
+            f"{tabela} {regra.get('tabela_fisica', tabela + '010')} {regra.get('modo', '?')} "
+            f"{'+'.join(regra.get('chave_unica', []))}: {regra.get('descricao', '')}"
+            + (f" ({regra['tipo_registro']})" if regra.get("tipo_registro") else "")
+        )
+        for relacionamento in regra.get("relacionamentos", []):
+            tipo = relacionamento.get("tipo", "")
+            if "destino" in relacionamento:
+                lado_a = (tabela, tuple(relacionamento["origem_campos"]))
+                lado_b = (relacionamento["destino"], tuple(relacionamento["destino_campos"]))
+            else:
+                # Cardinalidade descrita do lado desta tabela: inverte para ler da origem ("N:1" -> "1:N")
+                lado_a = (relacionamento["origem"], tuple(relacionamento["origem_campos"]))
+                lado_b = (tabela, tuple(relacionamento["destino_campos"]))
+                tipo = ":".join(reversed(tipo.split(":")))
+            # Cada relacionamento aparece nas duas tabelas: uma linha só
+            relacionamentos.setdefault(frozenset((lado_a, lado_b)), (lado_a, lado_b, tipo))
+    linhas.append("Relacionamentos (modo C usa _FILIAL = ''; modo E usa a filial):")
+    for (tabela_a, campos_a), (tabela_b, campos_b), tipo in relacionamentos.values():
+        linhas.append(f"{tabela_a}.{'+'.join(campos_a)} = {tabela_b}.{'+'.join(campos_b)} {tipo}".rstrip())
+    return "\n".join(linhas)
+
+
+def serializar_esquema(mapeamento, indices=None):
+    """
+    {mapeamento} compacto: cabeçalho por tabela com os índices do SIX e uma
+    linha por campo ("C5_EMISSAO D DT Emissão"), no lugar do JSON indentado.
+    """
+    linhas = [LEGENDA_TIPOS]
+    for tabela, campos in mapeamento.items():
+        cabecalho = f"[{tabela} {tabela}010]"
+        if indices and indices.get(tabela):
+            cabecalho += " índices: " + " | ".join("+".join(chave) for chave in indices[tabela])
+        linhas.append(cabecalho)
+        for campo, descricao in campos.items():
+            encontrado = PADRAO_DESCRICAO_CAMPO.match(descricao or "")
+            if encontrado:
+                linhas.append(f"{campo} {encontrado['tipo'].strip() or '?'} {encontrado['descricao'].strip()}")
+            else:
+                linhas.append(f"{campo} {descricao}")
+    return "\n".join(linhas)
+
+
+def serializar_sob_demanda(detalhes, pergunta, tabelas_carregadas=()):
+    """
+    Tabelas lidas sob demanda (SX2/SX9): modo e relacionamentos com as tabelas
+    conhecidas, e o recorte dos campos para a pergunta, no mesmo formato compacto.
+    """
+    linhas = ["Tabelas adicionais (lógica física modo: descrição):"]
+    conhecidas = set(tabelas_carregadas) | set(detalhes)
+    recorte, indices = {}, {}
+    for tabela, detalhe in detalhes.items():
+        linhas.append(f"{tabela} {detalhe['fisica']} {detalhe['modo'] or '?'}: {detalhe['nome']}")
+        for campos, outra, campos_outra in detalhe["relacionamentos"]:
+            if outra in conhecidas and outra != tabela:
+                linhas.append(f"{tabela}.{'+'.join(campos)} = {outra}.{'+'.join(campos_outra)}")
+        recorte[tabela] = recortar_campos(detalhe["campos"], pergunta, detalhe["indices"])
+        indices[tabela] = detalhe["indices"]
+    # A legenda dos tipos já está no recorte do dicionário carregado
+    return "\n".join(linhas) + "\n" + serializar_esquema(recorte, indices).split("\n", 1)[1]
+
+
+def dividir_template(conteudo):
+    """
+    (prefixo, sufixo) do template: o sufixo começa na seção ("---") que
+    contém a primeira variável por pergunta; tudo antes é estático.
+    """
+    posicoes = [conteudo.find("{" + variavel + "}") for variavel in VARIAVEIS_POR_PERGUNTA]
+    posicoes = [posicao for posicao in posicoes if posicao >= 0]
+    if not posicoes:
+        return conteudo, ""
+    corte = conteudo.rfind("\n---", 0, min(posicoes))
+    corte = corte + 1 if corte >= 0 else conteudo.rfind("\n", 0, min(posicoes)) + 1
+    return conteudo[:corte], conteudo[corte:]
+
+
+class PromptSQL:
+    """
+    Prefixo e sufixo prontos para uma versão do dicionário. Sem cache de contexto,
+    o {mapeamento} do sufixo é o recorte do IndiceEsquema para a pergunta; com
+    `esquema_no_prefixo`, o dicionário inteiro vai para o fim do prefixo (cacheado).
+    Com `dicionario` (DicionarioSobDemanda), tabelas fora do dicionário carregado
+    que a pergunta pede entram só no sufixo daquela pergunta.
+    """
+
+    def __init__(self, conteudo_template, regras_negocio, regras_protheus, mapeamento, indices, indice_esquema,
+                 esquema_no_prefixo=False, dicionario=None):
+        self.indices = indices or {}
+        self.indice_esquema = indice_esquema
+        self.esquema_no_prefixo = esquema_no_prefixo
+        self.dicionario = dicionario
+        template_prefixo, self.template_sufixo = dividir_template(conteudo_template)
+        self.prefixo = template_prefixo.replace("{regras}", serializar_regras(regras_negocio, regras_protheus))
+        if esquema_no_prefixo:
+            self.prefixo += f"\n📗 Dicionário completo (SX3/SIX):\n{serializar_esquema(mapeamento, self.indices)}\n\n"
+        self.tokens_prefixo = estimar_tokens(self.prefixo)
+
+        # Referência para o relatório: template com regras e recorte em JSON indentado, tudo a cada pergunta
+        self._tokens_template = estimar_tokens(re.sub(r"\{\w+\}", "", conteudo_template))
+        self._tokens_regras_anterior = estimar_tokens(formatar_regras(regras_negocio, regras_protheus))
+
+    def esquema_da_pergunta(self, pergunta):
+        reduzido, _ = self.indice_esquema.selecionar(pergunta)
+        return serializar_esquema(reduzido, {t: self.indices[t] for t in reduzido if t in self.indices})
+
+    def esquema_sob_demanda(self, pergunta):
+        """Tabelas adicionais da pergunta, lidas do SX3/SIX/SX9 na primeira vez ("" se nenhuma)."""
+        if self.dicionario is None:
+            return ""
+        carregadas = self.indice_esquema.mapeamento
+        tabelas = self.dicionario.tabelas_da_pergunta(pergunta, self.indice_esquema.idf, excluir=carregadas)
+        if not tabelas:
+            return ""
+        with span("dicionario_sob_demanda") as dados:
+            detalhes = self.dicionario.detalhes(tabelas)
+            dados["tabelas"] = ",".join(detalhes)
+        return serializar_sob_demanda(detalhes, pergunta, carregadas) if detalhes else ""
+
+    def sufixo(self, pergunta, data_hoje, historico):
+        if self.esquema_no_prefixo:
+            mapeamento = "(dicionário completo no início do prompt)"
+        else:
+            mapeamento = self.esquema_da_pergunta(pergunta)
+        adicionais = self.esquema_sob_demanda(pergunta)
+        if adicionais:
+            mapeamento += "\n" + adicionais
+        valores = {"mapeamento": mapeamento, "data_hoje": data_hoje, "historico": historico, "pergunta": pergunta}
+        # replace em vez de format: o template tem chaves literais
+        texto = self.template_sufixo
+        for nome, valor in valores.items():
+            texto = texto.replace("{" + nome + "}", valor)
+        return texto
+
+    def relatorio_tokens(self, pergunta, data_hoje="", historico="", com_cache=False, sufixo=None):
+        """
+        Tokens por requisição: formato anterior (regras e recorte do mapeamento em JSON
+        indentado, prompt inteiro a cada pergunta) x prefixo + sufixo atuais. Com cache
+        de contexto, o prefixo não é reenviado. `sufixo`: o já montado para o LLM.
+        """
+        reduzido, tabelas = self.indice_esquema.selecionar(pergunta)
+        anterior = (self._tokens_template + self._tokens_regras_anterior
+                    + estimar_tokens(json.dumps(reduzido, indent=2, ensure_ascii=False))
+                    + estimar_tokens(data_hoje + historico + pergunta))
+        sufixo = estimar_tokens(sufixo if sufixo is not None else self.sufixo(pergunta, data_hoje, historico))
+        enviados = sufixo if com_cache else self.tokens_prefixo + sufixo
+        return {
+            "tabelas": tabelas,
+            "tokens_anterior": anterior,
+            "tokens_prefixo": self.tokens_prefixo,
+            "tokens_sufixo": sufixo,
+            "tokens_enviados": enviados,
+            "tokens_economizados": anterior - enviados,
+            "reducao": 1 - enviados / anterior if anterior else 0.0,
+        }
+
+
+class _LLMComPrefixoLocal:
+    """LLM que recebe só o sufixo e completa com o prefixo guardado no cache local."""
+
+    def __init__(self, llm, prefixo):
+        self.llm = llm
+        self.prefixo = prefixo
+
+    def stream(self, sufixo):
+        return self.llm.stream(self.prefixo + sufixo)
+
+
+class CacheContextoLocal:
+    """
+    Stand-in do cache de contexto do provedor (benchmark/sem API): guarda o
+    prefixo por hash, com TTL, e contabiliza os tokens que deixariam de ser enviados.
+    """
+
+    def __init__(self, ttl_segundos=3600):
+        self.ttl_segundos = ttl_segundos
+        self._itens = {}  # nome -> (prefixo, expira_em)
+        self._lock = threading.Lock()
+        self.criados = 0
+        self.acertos = 0
+        self.tokens_reaproveitados = 0
+
+    def obter_ou_criar(self, prefixo):
+        nome = "local/" + hashlib.sha256(prefixo.encode("utf-8")).hexdigest()[:16]
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(nome)
+            if item is not None and item[1] > agora:
+                self.acertos += 1
+                self.tokens_reaproveitados += estimar_tokens(prefixo)
+            else:
+                self._itens[nome] = (prefixo, agora + self.ttl_segundos)
+                self.criados += 1
+        return nome
+
+    def llm_com_cache(self, llm, nome):
+        with self._lock:
+            prefixo, _ = self._itens[nome]
+        return _LLMComPrefixoLocal(llm, prefixo)
+
+    def estatisticas(self):
+        with self._lock:
+            return {"criados": self.criados, "acertos": self.acertos, "tokens_reaproveitados": self.tokens_reaproveitados}
+
+
+class CacheContextoGemini:
+    """
+    Cache de contexto explícito do Gemini (API generativelanguage, já dependência do
+    langchain-google-genai): o prefixo vira um CachedContent com TTL e as chamadas usam
+    `cached_content`, enviando só o sufixo. Prefixos abaixo do mínimo do provedor
+    (~1024 tokens no 2.5 Flash) não são cacheados.
+    """
+
+    MIN_TOKENS = 1024
+
+    def __init__(self, api_key, modelo="gemini-2.5-flash", ttl_segundos=3600):
+        from google.ai import generativelanguage_v1beta as glm
+        from google.api_core.client_options import ClientOptions
+
+        self._glm = glm
+        self.api_key = api_key
+        self.modelo = modelo
+        self.ttl_segundos = ttl_segundos
+        self._cliente = glm.CacheServiceClient(client_options=ClientOptions(api_key=api_key))
+        self._itens = {}  # hash do prefixo -> (nome, expira_em)
+        self._llms = {}
+        self._lock = threading.Lock()
+        self.criados = 0
+        self.acertos = 0
+        self.tokens_reaproveitados = 0
+
+    def obter_ou_criar(self, prefixo):
+        if estimar_tokens(prefixo) < self.MIN_TOKENS:
+            raise ValueError("Prefixo menor que o mínimo do cache de contexto.")
+        chave = hashlib.sha256(prefixo.encode("utf-8")).hexdigest()
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            # Margem de 60s: não usar um cache prestes a expirar no provedor
+            if item is not None and item[1] - 60 > agora:
+                self.acertos += 1
+                self.tokens_reaproveitados += estimar_tokens(prefixo)
+                return item[0]
+            cache = self._cliente.create_cached_content(cached_content=self._glm.CachedContent(
+                model=f"models/{self.modelo}",
+                display_name=f"chatbot-protheus-{chave[:12]}",
+                system_instruction=self._glm.Content(parts=[self._glm.Part(text=prefixo)]),
+                ttl={"seconds": self.ttl_segundos},
+            ))
+            self._itens[chave] = (cache.name, agora + self.ttl_segundos)
+            self.criados += 1
+            return cache.name
+
+    def llm_com_cache(self, llm, nome):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        with self._lock:
+            if nome not in self._llms:
+                self._llms[nome] = ChatGoogleGenerativeAI(model=self.modelo, google_api_key=self.api_key,
+                                                          temperature=0.0, cached_content=nome)
+            return self._llms[nome]
+
+    def estatisticas(self):
+        with self._lock:
+            return {"criados": self.criados, "acertos": self.acertos, "tokens_reaproveitados": self.tokens_reaproveitados}
+
+
+class CadeiaSQL:
+    """
+    Substitui `PromptTemplate | llm`. Com cache de contexto envia só o sufixo;
+    se o cache falhar (ou não existir), manda prefixo + sufixo.
+    """
+
+    def __init__(self, llm, prompt_sql, cache_contexto=None):
+        self.llm = llm
+        self.prompt_sql = prompt_sql
+        self.cache_contexto = cache_contexto
+
+    def stream(self, entrada):
+        """entrada: {pergunta, data_hoje, historico}."""
+        return self.stream_sufixo(self.prompt_sql.sufixo(entrada["pergunta"], entrada["data_hoje"], entrada["historico"]))
+
+    def stream_sufixo(self, sufixo):
+        if self.cache_contexto is not None:
+            try:
+                nome = self.cache_contexto.obter_ou_criar(self.prompt_sql.prefixo)
+                llm = self.cache_contexto.llm_com_cache(self.llm, nome)
+            except Exception as e:
+                logging.warning("Cache de contexto indisponível, enviando o prompt inteiro: %s", e)
+            else:
+                return llm.stream(sufixo)
+        return self.llm.stream(self.prompt_sql.prefixo + sufixo)
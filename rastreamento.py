@@ -0,0 +1,153 @@
+"""
+Rastreamento por etapa: cada resposta vira um rastro com spans (intenção,
+montagem do prompt, Gemini, validação, execução no banco, renderização),
+com duração, tokens, linhas e bytes. Os rastros vão para um JSONL rotativo.
+"""
+import contextvars
+import datetime
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from recursos import MedidorLatencia
+
+_rastro_atual = contextvars.ContextVar("rastro_atual", default=None)
+
+
+class Rastro:
+    """Spans de uma resposta. Pode receber spans de várias threads (consultas em paralelo)."""
+
+    def __init__(self, rastreador, atributos):
+        self.rastreador = rastreador
+        self.id = uuid.uuid4().hex[:16]
+        self.inicio = time.perf_counter()
+        self.inicio_em = datetime.datetime.now().isoformat(timespec="milliseconds")
+        self.atributos = atributos
+        self.spans = []
+        self._lock = threading.Lock()
+        self._token = None
+
+    @contextmanager
+    def span(self, nome, **atributos):
+        """Os atributos podem ser completados dentro do bloco (ex.: dados["linhas"] = len(df))."""
+        dados = dict(atributos)
+        inicio = time.perf_counter()
+        try:
+            yield dados
+        except BaseException as e:
+            dados["erro"] = type(e).__name__
+            raise
+        finally:
+            fim = time.perf_counter()
+            with self._lock:
+                self.spans.append({
+                    "nome": nome,
+                    "inicio_ms": round(1000 * (inicio - self.inicio), 2),
+                    "duracao_ms": round(1000 * (fim - inicio), 2),
+                    "thread": threading.current_thread().name,
+                    **dados,
+                })
+
+    def finalizar(self, **atributos):
+        if self._token is not None:
+            _rastro_atual.reset(self._token)
+            self._token = None
+        self.atributos.update(atributos)
+        self.rastreador.registrar(self)
+
+
+@contextmanager
+def span(nome, **atributos):
+    """Span no rastro atual; sem rastro ativo (ex.: paginação), só executa o bloco."""
+    rastro = _rastro_atual.get()
+    if rastro is None:
+        yield dict(atributos)
+        return
+    with rastro.span(nome, **atributos) as dados:
+        yield dados
+
+
+def rastrear(nome):
+    """Decorador: a chamada inteira vira um span."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with span(nome):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+def submeter_com_rastro(executor, funcao, *args, **kwargs):
+    """executor.submit levando o rastro atual para a thread do pool."""
+    return executor.submit(contextvars.copy_context().run, funcao, *args, **kwargs)
+
+
+def tokens_da_mensagem(mensagem):
+    """Tokens informados pelo provedor (usage_metadata do langchain), quando houver."""
+    uso = getattr(mensagem, "usage_metadata", None) or {}
+    if not uso:
+        return {}
+    tokens = {"tokens_prompt": uso.get("input_tokens", 0), "tokens_resposta": uso.get("output_tokens", 0)}
+    em_cache = (uso.get("input_token_details") or {}).get("cache_read")
+    if em_cache:
+        tokens["tokens_cache"] = em_cache
+    return tokens
+
+
+class Rastreador:
+    """
+    Abre rastros, guarda p50/p95 por etapa (todas as sessões) e grava cada
+    rastro como uma linha JSON em arquivo rotativo (max_bytes x arquivos).
+    """
+
+    def __init__(self, caminho=".cache/rastros/rastros.jsonl", max_bytes=10 * 1024 * 1024, arquivos=5,
+                 max_amostras=1000):
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self.caminho = caminho
+        self._logger = logging.Logger(f"rastros:{caminho}")
+        self._logger.propagate = False
+        handler = logging.handlers.RotatingFileHandler(caminho, maxBytes=max_bytes, backupCount=arquivos,
+                                                       encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger.addHandler(handler)
+        self._medidores = defaultdict(lambda: MedidorLatencia(max_amostras))
+        self._tokens = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def iniciar(self, **atributos):
+        """Novo rastro, ativo no contexto atual até `finalizar()`."""
+        rastro = Rastro(self, atributos)
+        rastro._token = _rastro_atual.set(rastro)
+        return rastro
+
+    def registrar(self, rastro):
+        total = time.perf_counter() - rastro.inicio
+        with rastro._lock:
+            spans = list(rastro.spans)
+        with self._lock:
+            self._medidores["total"].registrar_duracao(total)
+            for dados in spans:
+                self._medidores[dados["nome"]].registrar_duracao(dados["duracao_ms"] / 1000)
+                self._tokens[dados["nome"]] += dados.get("tokens_prompt", 0) + dados.get("tokens_resposta", 0)
+        self._logger.info(json.dumps({
+            "id": rastro.id,
+            "inicio": rastro.inicio_em,
+            "total_ms": round(1000 * total, 2),
+            **rastro.atributos,
+            "spans": sorted(spans, key=lambda dados: dados["inicio_ms"]),
+        }, ensure_ascii=False, default=str))
+
+    def resumo(self):
+        """{etapa: {amostras, p50_ms, p95_ms, tokens}}, com "total" primeiro."""
+        with self._lock:
+            nomes = sorted(self._medidores, key=lambda nome: (nome != "total", nome))
+            return {nome: {**self._medidores[nome].resumo(), "tokens": self._tokens[nome]} for nome in nomes}
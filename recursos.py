@@ -0,0 +1,146 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine
+
+PROMPT_FALLBACK = """
+    ERRO: prompt_template.txt não encontrado.
+    Pergunta: {pergunta}
+    Gere um SQL simples baseado nesta pergunta, usando {mapeamento}.
+    """
+
+# Pool dimensionado para várias sessões simultâneas do Streamlit
+CONFIG_POOL = {
+    "pool_size": 5,          # conexões mantidas abertas
+    "max_overflow": 10,      # conexões extras em picos
+    "pool_timeout": 30,      # segundos aguardando uma conexão livre
+    "pool_recycle": 1800,    # recicla antes do timeout de inatividade do SQL Server/firewall
+    "pool_pre_ping": True,   # descarta conexões mortas antes de usar
+}
+
+
+def montar_connection_string(usuario, senha, host, banco):
+    return (
+        f"mssql+pyodbc://{usuario}:{senha}@{host}/"
+        f"{banco}?driver=ODBC+Driver+17+for+SQL+Server"
+    )
+
+
+def criar_engine(connection_string, **config_pool):
+    """Engine com pool compartilhado pelo processo; testa a conexão uma única vez."""
+    engine = create_engine(connection_string, **{**CONFIG_POOL, **config_pool})
+    with engine.connect():
+        pass
+    return engine
+
+
+@contextmanager
+def timeout_de_consulta(conn, segundos):
+    """
+    Timeout de consulta na conexão (SQL_ATTR_QUERY_TIMEOUT do pyodbc): ao estourar,
+    o driver cancela a instrução no servidor e levanta erro HYT00, liberando a
+    thread e a sessão. Restaura o valor anterior antes de devolver a conexão ao pool.
+    Drivers sem esse atributo (ex.: sqlite) seguem sem timeout.
+    """
+    driver = conn.connection.driver_connection
+    anterior = getattr(driver, "timeout", None)
+    if anterior is None or not segundos:
+        yield conn
+        return
+    driver.timeout = int(segundos)
+    try:
+        yield conn
+    finally:
+        driver.timeout = anterior
+
+
+def consulta_excedeu_timeout(erro):
+    mensagem = str(erro)
+    return "HYT00" in mensagem or "timeout expired" in mensagem.lower()
+
+
+def criar_llm(api_key, modelo="gemini-2.5-flash"):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(model=modelo, google_api_key=api_key, temperature=0.0)
+
+
+def ler_prompt_template(caminho="prompt_template.txt"):
+    """Retorna (conteúdo, encontrado)."""
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            return arquivo.read(), True
+    except FileNotFoundError:
+        return PROMPT_FALLBACK, False
+
+
+def formatar_regras(regras_negocio, regras_protheus):
+    """Texto de {regras} do prompt; serializado uma vez por processo."""
+    return regras_negocio + "\n\n" + json.dumps(regras_protheus, ensure_ascii=False, indent=2)
+
+
+class MedidorLatencia:
+    """
+    Amostras de latência de todas as sessões do processo (ex.: custo de cada
+    rerun do script, tempo até o primeiro token, tempo até a primeira linha).
+    """
+
+    def __init__(self, max_amostras=500):
+        self._amostras = deque(maxlen=max_amostras)
+        self._lock = threading.Lock()
+
+    def registrar(self, inicio):
+        self.registrar_duracao(time.perf_counter() - inicio)
+
+    def registrar_duracao(self, segundos):
+        with self._lock:
+            self._amostras.append(segundos)
+
+    def resumo(self):
+        with self._lock:
+            amostras = sorted(self._amostras)
+        if not amostras:
+            return {"amostras": 0, "p50_ms": 0.0, "p95_ms": 0.0}
+        return {
+            "amostras": len(amostras),
+            "p50_ms": 1000 * amostras[len(amostras) // 2],
+            "p95_ms": 1000 * amostras[int(0.95 * (len(amostras) - 1))],
+        }
+
+
+class BaldeDeTokens:
+    """
+    Limitador de taxa (token bucket) para a quota do Gemini, compartilhado pelas
+    threads: `por_minuto` chamadas em média, com rajadas de até `rajada`.
+    """
+
+    def __init__(self, por_minuto, rajada=None):
+        self.taxa = por_minuto / 60.0
+        self.capacidade = float(rajada or max(1, por_minuto // 10))
+        self._tokens = self.capacidade
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+        self.chamadas = 0
+        self.espera_total = 0.0
+
+    def adquirir(self):
+        """Bloqueia até haver um token; retorna os segundos esperados."""
+        with self._lock:
+            agora = time.monotonic()
+            self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+            self._ultimo = agora
+            # Reserva já o token: quem chega depois espera na fila, na ordem
+            self._tokens -= 1
+            espera = -self._tokens / self.taxa if self._tokens < 0 else 0.0
+            self.chamadas += 1
+            self.espera_total += espera
+        if espera:
+            time.sleep(espera)
+        return espera
+
+    def estatisticas(self):
+        with self._lock:
+            return {"chamadas": self.chamadas, "espera_total_s": round(self.espera_total, 2)}
@@ -107,6 +107,7 @@ REGRAS_PROTHEUS = {
         "tabela_fisica": "SA1010",
         "chave_unica": ["A1_FILIAL", "A1_COD", "A1_LOJA"],
         "modo": "C",
+        "tipo_registro": "Cadastro",
         "relacionamentos": [
             {"destino": "SC5", "origem_campos": ["A1_COD", "A1_LOJA"], "destino_campos": ["C5_CLIENTE", "C5_LOJACLI"], "tipo": "1:N"},
             {"destino": "SF2", "origem_campos": ["A1_COD", "A1_LOJA"], "destino_campos": ["F2_CLIENTE", "F2_LOJA"], "tipo": "1:N"}
@@ -119,6 +120,7 @@ REGRAS_PROTHEUS = {
         "tabela_fisica": "SA2010",
         "chave_unica": ["A2_FILIAL", "A2_COD", "A2_LOJA"],
         "modo": "C",
+        "tipo_registro": "Cadastro",
         "relacionamentos": [
             {"destino": "SF2", "origem_campos": ["A2_COD", "A2_LOJA"], "destino_campos": ["F2_CLIENTE", "F2_LOJA"], "tipo": "1:N"},
             {"destino": "SC5", "origem_campos": ["A2_COD"], "destino_campos": ["C5_FORNISS"], "tipo": "1:N"}
@@ -131,6 +133,7 @@ REGRAS_PROTHEUS = {
         "tabela_fisica": "SC5010",
         "chave_unica": ["C5_FILIAL", "C5_NUM"],
         "modo": "E",
+        "tipo_registro": "Movimento",
         "relacionamentos": [
             {"origem": "SA1", "origem_campos": ["A1_COD", "A1_LOJA"], "destino_campos": ["C5_CLIENTE", "C5_LOJACLI"], "tipo": "N:1"},
             {"destino": "SC6", "origem_campos": ["C5_NUM"], "destino_campos": ["C6_NUM"], "tipo": "1:N"}
@@ -142,6 +145,7 @@ REGRAS_PROTHEUS = {
         "tabela_fisica": "SC6010",
         "chave_unica": ["C6_FILIAL", "C6_NUM", "C6_ITEM"],
         "modo": "E",
+        "tipo_registro": "Movimento",
         "relacionamentos": [
             {"origem": "SC5", "origem_campos": ["C5_NUM"], "destino_campos": ["C6_NUM"], "tipo": "N:1"},
             {"origem": "SB1", "origem_campos": ["B1_COD"], "destino_campos": ["C6_PRODUTO"], "tipo": "N:1"}
@@ -153,6 +157,7 @@ REGRAS_PROTHEUS = {
         "tabela_fisica": "SF2010",
         "chave_unica": ["F2_FILIAL", "F2_DOC", "F2_SERIE"],
         "modo": "E",
+        "tipo_registro": "Movimento",
         "relacionamentos": [
             {"origem": "SA1", "origem_campos": ["A1_COD", "A1_LOJA"], "destino_campos": ["F2_CLIENTE", "F2_LOJA"], "tipo": "N:1"},
             {"destino": "SD2", "origem_campos": ["F2_DOC", "F2_SERIE", "F2_CLIENTE", "F2_LOJA"], "destino_campos": ["D2_DOC", "D2_SERIE", "D2_CLIENTE", "D2_LOJA"], "tipo": "1:N"}
@@ -164,6 +169,7 @@ REGRAS_PROTHEUS = {
         "tabela_fisica": "SD2010",
         "chave_unica": ["D2_FILIAL", "D2_DOC", "D2_ITEM"],
         "modo": "E",
+        "tipo_registro": "Movimento",
         "relacionamentos": [
             {"origem": "SF2", "origem_campos": ["F2_DOC", "F2_SERIE", "F2_CLIENTE", "F2_LOJA"], "destino_campos": ["D2_DOC", "D2_SERIE", "D2_CLIENTE", "D2_LOJA"], "tipo": "N:1"},
             {"origem": "SB1", "origem_campos": ["B1_COD"], "destino_campos": ["D2_COD"], "tipo": "N:1"}
@@ -174,13 +180,15 @@ REGRAS_PROTHEUS = {
         "descricao": "Produtos",
         "tabela_fisica": "SB1010",
         "chave_unica": ["B1_COD"],
-        "modo": "C"
+        "modo": "C",
+        "tipo_registro": "Cadastro"
     },
 
     "SB2": {
         "descricao": "Saldos de Estoque",
         "tabela_fisica": "SB2010",
         "chave_unica": ["B2_FILIAL", "B2_COD", "B2_LOCAL"],
-        "modo": "E"
+        "modo": "E",
+        "tipo_registro": "Movimento"
     }
 }
@@ -0,0 +1,585 @@
+"""
+Réplica analítica local: DuckDB sobre snapshots Parquet das tabelas de movimento,
+para que agregações pesadas (vendas por mês/filial/produto) não disputem o
+SQL Server com o faturamento.
+
+- Extração incremental pela marca d'água de R_E_C_N_O_: cada sincronização lê só
+  os registros novos e grava uma parte Parquet imutável por tabela.
+- D_E_L_E_T_ é alterado no lugar: a cada sincronização a lista de R_E_C_N_O_
+  excluídos (até a marca d'água) é relida e a view da tabela marca esses
+  registros com '*'.
+- Alterações de outros campos não mudam o R_E_C_N_O_. Se a tabela tem S_T_A_M_P_,
+  a extração também traz os registros com S_T_A_M_P_ acima da marca e a view fica
+  com a versão mais recente de cada R_E_C_N_O_. Sem ela, só a recarga completa
+  (a cada `recarga_completa_segundos`) alcança esses casos: nas tabelas alteradas
+  no lugar (pedidos e cadastros) a defasagem conta a partir da última recarga.
+- Roteamento (PipelineProtheus): SELECT agregado só sobre tabelas replicadas e
+  sincronizadas há menos de `max_defasagem_segundos` vai para o DuckDB; consultas
+  de detalhe, tabelas fora da réplica, réplica defasada ou erro no DuckDB seguem
+  para o SQL Server.
+
+Campos CHAR do Protheus vêm com espaços à direita, que o SQL Server ignora nas
+comparações: na réplica os textos são gravados sem eles e os literais do SQL
+também são aparados antes da execução.
+
+    python replica.py benchmark --escala 10     # SQLite sintético x réplica DuckDB
+    python replica.py sincronizar               # SQL Server (variáveis PROTHEUS_DB_*)
+"""
+import argparse
+import datetime
+import decimal
+import json
+import logging
+import os
+import re
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import inspect, text
+
+from consulta_sql import PADRAO_LITERAL, consulta_agregada, paginar_sql, tabelas_da_consulta, top_para_limit
+
+# Movimentos de venda e os cadastros usados nos agrupamentos. SB2 (saldos) fica de
+# fora: é alterado no lugar a cada movimentação e a marca d'água não o acompanha.
+TABELAS_REPLICA = ["SD2", "SF2", "SC5", "SC6", "SB1", "SA1", "SA2"]
+
+# Alteradas no lugar no dia a dia (entrega do pedido, preço, cadastro do cliente):
+# sem S_T_A_M_P_, a defasagem conta desde a última recarga completa
+TABELAS_ALTERADAS_NO_LUGAR = {"SC5", "SC6", "SB1", "SA1", "SA2"}
+
+# Funções T-SQL sem equivalente direto; datas do Protheus são texto AAAAMMDD
+MACROS_DUCKDB = [
+    "CREATE OR REPLACE MACRO ANO_PROTHEUS(d) AS CAST(substr(CAST(d AS VARCHAR), 1, 4) AS INTEGER)",
+    "CREATE OR REPLACE MACRO MES_PROTHEUS(d) AS CAST(substr(CAST(d AS VARCHAR), 5, 2) AS INTEGER)",
+    "CREATE OR REPLACE MACRO DIA_PROTHEUS(d) AS CAST(substr(CAST(d AS VARCHAR), 7, 2) AS INTEGER)",
+    "CREATE OR REPLACE MACRO CONVERTER_TEXTO(n, valor, estilo) AS left(CAST(valor AS VARCHAR), n)",
+    """CREATE OR REPLACE MACRO SOMAR_DATA(unidade, quantidade, d) AS strftime(
+           strptime(left(CAST(d AS VARCHAR), 8), '%Y%m%d') + CASE
+               WHEN upper(unidade) IN ('DAY', 'DD', 'D') THEN to_days(CAST(quantidade AS INTEGER))
+               WHEN upper(unidade) IN ('YEAR', 'YY', 'YYYY') THEN to_years(CAST(quantidade AS INTEGER))
+               ELSE to_months(CAST(quantidade AS INTEGER)) END,
+           '%Y%m%d')""",
+]
+
+
+def traduzir_para_duckdb(sql):
+    """T-SQL gerado pelo pipeline -> DuckDB (TOP, funções de data/texto e literais sem espaços à direita)."""
+    sql = PADRAO_LITERAL.sub(lambda m: "'" + m.group(1)[1:-1].rstrip() + "'", sql.strip().rstrip(";"))
+    sql = re.sub(r"\bCOUNT_BIG\(", "COUNT(", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bISNULL\(", "COALESCE(", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bGETDATE\(\s*\)", "strftime(current_date, '%Y%m%d')", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bCONVERT\(\s*VARCHAR\s*\((\d+)\)\s*,", r"CONVERTER_TEXTO(\1,", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bDATEADD\(\s*(\w+)\s*,", r"SOMAR_DATA('\1',", sql, flags=re.IGNORECASE)
+    for funcao, macro in (("YEAR", "ANO_PROTHEUS"), ("MONTH", "MES_PROTHEUS"), ("DAY", "DIA_PROTHEUS")):
+        sql = re.sub(rf"\b{funcao}\(", f"{macro}(", sql, flags=re.IGNORECASE)
+    return top_para_limit(sql)
+
+
+def _marca_stamp(valor):
+    """S_T_A_M_P_ como texto ISO com milissegundos (o SQL Server converte sem ambiguidade para datetime)."""
+    if isinstance(valor, datetime.datetime):
+        return valor.isoformat(timespec="milliseconds")
+    return None if valor is None else str(valor)
+
+
+def _tipo_arrow(tipo_sql):
+    """(tipo Arrow, conversão do valor) da coluna; None para binários (campos memo), que não são replicados."""
+    try:
+        python = tipo_sql.python_type
+    except NotImplementedError:
+        python = str
+    if python is bytes:
+        return None
+    if python is str:
+        return pa.string(), lambda valor: valor.rstrip() if isinstance(valor, str) else valor
+    if python is int:
+        return pa.int64(), None
+    if python in (float, decimal.Decimal):
+        return pa.float64(), lambda valor: None if valor is None else float(valor)
+    if python is datetime.datetime:
+        return pa.timestamp("us"), None
+    if python is datetime.date:
+        return pa.date32(), None
+    if python is bool:
+        return pa.bool_(), None
+    return pa.string(), lambda valor: None if valor is None else str(valor).rstrip()
+
+
+class ReplicaAnalitica:
+    """
+    Snapshots em `pasta` ({tabela}/parte_NNNNNN.parquet + estado.json) e um DuckDB
+    em memória com uma view por tabela física (SD2010, ...). Seguro para várias
+    threads: cada consulta usa o próprio cursor; as partes nunca são alteradas.
+    """
+
+    def __init__(self, pasta=".cache/replica", tabelas=TABELAS_REPLICA, max_defasagem_segundos=900,
+                 recarga_completa_segundos=24 * 3600, tamanho_lote=50_000, max_partes=32,
+                 alteradas_no_lugar=TABELAS_ALTERADAS_NO_LUGAR):
+        import duckdb
+
+        self.pasta = pasta
+        self.tabelas = list(tabelas)
+        self.alteradas_no_lugar = set(alteradas_no_lugar)
+        self.max_defasagem_segundos = max_defasagem_segundos
+        self.recarga_completa_segundos = recarga_completa_segundos
+        self.tamanho_lote = tamanho_lote
+        self.max_partes = max_partes
+        os.makedirs(pasta, exist_ok=True)
+        self._conexao = duckdb.connect()
+        for macro in MACROS_DUCKDB:
+            self._conexao.execute(macro)
+        self._lock = threading.Lock()
+        self._lock_sincronizacao = threading.Lock()
+        self._parar = threading.Event()
+        self._estado = self._carregar_estado()
+        self._contadores = Counter()
+        self._desvios = Counter()
+        for tabela in self._estado:
+            self._recriar_view(tabela)
+
+    # ---------- Estado e views ----------
+
+    def _caminho_estado(self):
+        return os.path.join(self.pasta, "estado.json")
+
+    def _carregar_estado(self):
+        """{tabela: {marca, stamp, partes, excluidos, linhas, sincronizado_em, recarga_em, sequencia}}."""
+        try:
+            with open(self._caminho_estado(), encoding="utf-8") as arquivo:
+                estado = json.load(arquivo)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return {tabela: info for tabela, info in estado.items()
+                if tabela in self.tabelas and all(os.path.exists(os.path.join(self.pasta, tabela, parte))
+                                                  for parte in info["partes"])}
+
+    def _salvar_estado(self):
+        temporario = self._caminho_estado() + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(self._estado, arquivo, indent=1)
+        os.replace(temporario, self._caminho_estado())
+
+    def _origem(self, tabela, info):
+        """Partes da tabela; com S_T_A_M_P_, só a versão da parte mais recente de cada R_E_C_N_O_."""
+        pasta = os.path.join(self.pasta, tabela)
+        partes = ", ".join(f"'{os.path.join(pasta, parte)}'" for parte in info["partes"])
+        if not info.get("com_stamp"):
+            return f"read_parquet([{partes}], union_by_name = true)"
+        return (f"(SELECT * EXCLUDE (filename) FROM read_parquet([{partes}], union_by_name = true, filename = true) "
+                f"QUALIFY row_number() OVER (PARTITION BY R_E_C_N_O_ ORDER BY filename DESC) = 1)")
+
+    def _recriar_view(self, tabela):
+        info = self._estado[tabela]
+        pasta = os.path.join(self.pasta, tabela)
+        origem = self._origem(tabela, info)
+        if info.get("excluidos"):
+            sql = (f"SELECT t.* REPLACE (CASE WHEN e.R_E_C_N_O_ IS NULL THEN t.D_E_L_E_T_ ELSE '*' END AS D_E_L_E_T_) "
+                   f"FROM {origem} t LEFT JOIN read_parquet('{os.path.join(pasta, info['excluidos'])}') e "
+                   f"ON e.R_E_C_N_O_ = t.R_E_C_N_O_")
+        else:
+            sql = f"SELECT * FROM {origem}"
+        with self._lock:
+            self._conexao.execute(f"CREATE OR REPLACE VIEW {tabela}010 AS {sql}")
+
+    # ---------- Extração ----------
+
+    def _colunas(self, conn, tabela):
+        """[(nome, tipo Arrow, conversão)] das colunas físicas, sem binários."""
+        colunas = []
+        for coluna in inspect(conn).get_columns(f"{tabela}010"):
+            tipo = _tipo_arrow(coluna["type"])
+            if tipo is not None:
+                colunas.append((coluna["name"].upper(), *tipo))
+        return colunas
+
+    def _extrair(self, conn, tabela, colunas, marca, stamp, caminho):
+        """
+        Registros com R_E_C_N_O_ > marca (ou S_T_A_M_P_ > stamp, se a tabela tiver a
+        coluna), em lotes, direto para Parquet. Retorna (linhas, alteradas, nova marca, novo stamp).
+        """
+        esquema = pa.schema([(nome, tipo) for nome, tipo, _ in colunas])
+        nomes = [nome for nome, _, _ in colunas]
+        posicao_recno = nomes.index("R_E_C_N_O_")
+        posicao_stamp = nomes.index("S_T_A_M_P_") if "S_T_A_M_P_" in nomes else None
+        filtro = "R_E_C_N_O_ > :marca"
+        if posicao_stamp is not None:
+            filtro += " OR S_T_A_M_P_ IS NOT NULL" if stamp is None else " OR S_T_A_M_P_ > :stamp"
+        consulta = text(f"SELECT {', '.join(nomes)} FROM {tabela}010 WHERE {filtro} ORDER BY R_E_C_N_O_")
+        result = conn.execution_options(yield_per=self.tamanho_lote).execute(consulta, {"marca": marca, "stamp": stamp})
+        escritor = None
+        linhas = alteradas = 0
+        marca_inicial = marca
+        try:
+            while True:
+                lote = result.fetchmany(self.tamanho_lote)
+                if not lote:
+                    break
+                arrays = []
+                for i, (_, tipo, converter) in enumerate(colunas):
+                    valores = [linha[i] for linha in lote]
+                    arrays.append(pa.array([converter(v) for v in valores] if converter else valores, type=tipo))
+                if escritor is None:
+                    escritor = pq.ParquetWriter(caminho + ".tmp", esquema, compression="zstd")
+                escritor.write_table(pa.Table.from_arrays(arrays, schema=esquema))
+                linhas += len(lote)
+                alteradas += sum(1 for linha in lote if linha[posicao_recno] <= marca_inicial)
+                marca = max(marca, int(lote[-1][posicao_recno]))
+                if posicao_stamp is not None:
+                    stamps = [_marca_stamp(linha[posicao_stamp]) for linha in lote if linha[posicao_stamp] is not None]
+                    stamp = max([stamp, *stamps] if stamp is not None else stamps, default=None)
+        finally:
+            result.close()
+            if escritor is not None:
+                escritor.close()
+        if escritor is not None:
+            os.replace(caminho + ".tmp", caminho)
+        return linhas, alteradas, marca, stamp
+
+    def _gravar_excluidos(self, conn, tabela, marca, caminho):
+        recnos = conn.execute(text(f"SELECT R_E_C_N_O_ FROM {tabela}010 WHERE D_E_L_E_T_ <> ' ' "
+                                   f"AND R_E_C_N_O_ <= :marca"), {"marca": marca}).scalars().all()
+        if not recnos:
+            return 0
+        pq.write_table(pa.table({"R_E_C_N_O_": pa.array(recnos, type=pa.int64())}), caminho)
+        return len(recnos)
+
+    def _compactar(self, tabela, info):
+        """Junta as partes numa só quando passam de `max_partes` (sincronizações frequentes geram muitas)."""
+        pasta = os.path.join(self.pasta, tabela)
+        info["sequencia"] += 1
+        nova = f"parte_{info['sequencia']:06d}.parquet"
+        with self._lock, self._conexao.cursor() as cursor:
+            cursor.execute(f"COPY (SELECT * FROM {self._origem(tabela, info)}) "
+                           f"TO '{os.path.join(pasta, nova)}' (FORMAT parquet, COMPRESSION zstd)")
+        info["partes"] = [nova]
+
+    def _sincronizar_tabela(self, conn, tabela, agora):
+        pasta = os.path.join(self.pasta, tabela)
+        os.makedirs(pasta, exist_ok=True)
+        info = self._estado.get(tabela)
+        completa = info is None or agora - info["recarga_em"] > self.recarga_completa_segundos
+        if completa:
+            info = {"marca": 0, "stamp": None, "partes": [], "excluidos": None, "linhas": 0, "recarga_em": agora,
+                    "sequencia": (info or {}).get("sequencia", 0)}
+        else:
+            info = dict(info, partes=list(info["partes"]))
+
+        info["sequencia"] += 1
+        parte = f"parte_{info['sequencia']:06d}.parquet"
+        colunas = self._colunas(conn, tabela)
+        info["com_stamp"] = any(nome == "S_T_A_M_P_" for nome, _, _ in colunas)
+        lidas, alteradas, info["marca"], info["stamp"] = self._extrair(
+            conn, tabela, colunas, info["marca"], info.get("stamp"), os.path.join(pasta, parte))
+        novas = lidas - alteradas
+        if lidas or not info["partes"]:
+            if not lidas:  # tabela vazia: parte vazia só para a view ter o esquema
+                pq.write_table(pa.schema([(nome, tipo) for nome, tipo, _ in colunas]).empty_table(),
+                               os.path.join(pasta, parte))
+            info["partes"].append(parte)
+            info["linhas"] += novas
+        if len(info["partes"]) > self.max_partes:
+            self._compactar(tabela, info)
+
+        excluidos = f"excluidos_{info['sequencia']:06d}.parquet"
+        quantidade = self._gravar_excluidos(conn, tabela, info["marca"], os.path.join(pasta, excluidos))
+        info["excluidos"] = excluidos if quantidade else None
+        # A lista de excluídos é sempre a completa: só houve exclusão nova se a quantidade mudou
+        mudou = completa or lidas > 0 or quantidade != info.get("quantidade_excluidos", 0)
+        info["quantidade_excluidos"] = quantidade
+        info["sincronizado_em"] = agora
+        self._estado[tabela] = info
+        self._recriar_view(tabela)
+        return {"modo": "completa" if completa else "incremental", "novas": novas,
+                "alteradas": alteradas, "excluidos": quantidade, "mudou": mudou}
+
+    def _remover_arquivos_antigos(self, tabela):
+        """Partes que saíram do estado; consultas em andamento ainda podem segurá-las (Windows): tenta de novo depois."""
+        info = self._estado[tabela]
+        em_uso = set(info["partes"]) | {info.get("excluidos")}
+        pasta = os.path.join(self.pasta, tabela)
+        for nome in os.listdir(pasta):
+            if nome.endswith(".parquet") and nome not in em_uso:
+                try:
+                    os.remove(os.path.join(pasta, nome))
+                except OSError:
+                    pass
+
+    def sincronizar(self, engine):
+        """Atualiza todas as tabelas; retorna {tabela: {modo, novas, alteradas, excluidos, mudou, ms}}."""
+        relatorio = {}
+        with self._lock_sincronizacao, engine.connect() as conn:
+            for tabela in self.tabelas:
+                inicio = time.perf_counter()
+                relatorio[tabela] = self._sincronizar_tabela(conn, tabela, time.time())
+                relatorio[tabela]["ms"] = round(1000 * (time.perf_counter() - inicio), 1)
+                conn.rollback()  # encerra a transação de leitura entre tabelas
+            self._salvar_estado()
+            for tabela in self.tabelas:
+                self._remover_arquivos_antigos(tabela)
+        return relatorio
+
+    def iniciar_sincronizacao_periodica(self, engine, intervalo_segundos=300, ao_alterar=None):
+        """
+        Thread daemon: sincroniza já e depois a cada `intervalo_segundos`.
+        `ao_alterar(tabela)` é chamado para cada tabela cujos dados mudaram na sincronização
+        (ex.: CacheResultados.invalidar_tabela).
+        """
+        def laco():
+            while True:
+                try:
+                    relatorio = self.sincronizar(engine)
+                    if ao_alterar is not None:
+                        for tabela, dados in relatorio.items():
+                            if dados["mudou"]:
+                                ao_alterar(tabela)
+                except Exception as e:
+                    logging.warning("Sincronização da réplica analítica falhou: %s", e)
+                if self._parar.wait(intervalo_segundos):
+                    return
+
+        thread = threading.Thread(target=laco, name="replica_analitica", daemon=True)
+        thread.start()
+        return thread
+
+    def parar(self):
+        self._parar.set()
+
+    # ---------- Roteamento e execução ----------
+
+    def defasagem(self, tabela):
+        """Segundos desde a última sincronização; desde a última recarga se a tabela muda no lugar sem S_T_A_M_P_."""
+        info = self._estado.get(tabela)
+        if info is None:
+            return None
+        if tabela in self.alteradas_no_lugar and not info.get("com_stamp"):
+            return time.time() - info["recarga_em"]
+        return time.time() - info["sincronizado_em"]
+
+    def avaliar(self, sql_query):
+        """(atende, motivo): só SELECT agregado sobre tabelas replicadas e em dia."""
+        if not consulta_agregada(sql_query):
+            return False, "detalhe"
+        tabelas = tabelas_da_consulta(sql_query)
+        fora = [tabela for tabela in tabelas if tabela not in self._estado]
+        if not tabelas or fora:
+            return False, "fora da réplica"
+        if max(self.defasagem(tabela) for tabela in tabelas) > self.max_defasagem_segundos:
+            return False, "defasada"
+        return True, "agregada"
+
+    def executar(self, sql_query, offset=0, limite=None):
+        """Executa no DuckDB (página `offset`/`limite`, como o SQL Server); levanta exceção se não suportar o SQL."""
+        paginado = paginar_sql(sql_query, offset, limite) if limite else None
+        with self._conexao.cursor() as cursor:
+            df = cursor.execute(traduzir_para_duckdb(paginado or sql_query)).df()
+        if limite and paginado is None:
+            df = df.iloc[offset:offset + limite].reset_index(drop=True)
+        return df
+
+    def registrar(self, destino, motivo):
+        with self._lock:
+            self._contadores[destino] += 1
+            if destino != "replica":
+                self._desvios[motivo] += 1
+
+    def estatisticas(self):
+        with self._lock:
+            contadores, desvios = dict(self._contadores), dict(self._desvios)
+        return {
+            "consultas": contadores,
+            "desvios": desvios,
+            "tabelas": {tabela: {"linhas": info["linhas"], "partes": len(info["partes"]),
+                                 "defasagem_s": round(self.defasagem(tabela))}
+                        for tabela, info in self._estado.items()},
+        }
+
+
+# =======================================
+# Benchmark: SQLite sintético (stand-in do SQL Server) x réplica
+# =======================================
+
+# Agregações pesadas típicas, além das do corpus
+CONSULTAS_PESADAS = [
+    """SELECT LEFT(SD2.D2_EMISSAO, 6) AS "Mês", SD2.D2_FILIAL AS "Filial", SB1.B1_DESC AS "Produto",
+              SUM(SD2.D2_QUANT) AS "Quantidade", SUM(SD2.D2_TOTAL) AS "Total"
+       FROM SD2010 SD2
+       INNER JOIN SB1010 SB1 ON SB1.B1_COD = SD2.D2_COD AND SB1.D_E_L_E_T_ = ' ' AND SB1.B1_FILIAL = ''
+       WHERE SD2.D_E_L_E_T_ = ' '
+       GROUP BY LEFT(SD2.D2_EMISSAO, 6), SD2.D2_FILIAL, SB1.B1_DESC""",
+    """SELECT SA1.A1_EST AS "Estado", COUNT(DISTINCT SC5.C5_NUM) AS "Pedidos", SUM(SC6.C6_VALOR) AS "Valor",
+              SUM(SC6.C6_QTDVEN - SC6.C6_QTDENT) AS "Saldo a Entregar"
+       FROM SC5010 SC5
+       INNER JOIN SC6010 SC6 ON SC6.C6_NUM = SC5.C5_NUM AND SC6.C6_FILIAL = SC5.C5_FILIAL AND SC6.D_E_L_E_T_ = ' '
+       INNER JOIN SA1010 SA1 ON SA1.A1_COD = SC5.C5_CLIENTE AND SA1.A1_LOJA = SC5.C5_LOJACLI
+              AND SA1.D_E_L_E_T_ = ' ' AND SA1.A1_FILIAL = ''
+       WHERE SC5.D_E_L_E_T_ = ' '
+       GROUP BY SA1.A1_EST""",
+    """SELECT TOP 20 SD2.D2_COD AS "Produto", COUNT(*) AS "Itens", SUM(SD2.D2_TOTAL) AS "Total"
+       FROM SD2010 SD2
+       WHERE SD2.D_E_L_E_T_ = ' ' AND YEAR(SD2.D2_EMISSAO) = YEAR(GETDATE())
+       GROUP BY SD2.D2_COD
+       ORDER BY SUM(SD2.D2_TOTAL) DESC""",
+]
+
+
+def _normalizar_resultado(df):
+    """Linhas comparáveis entre os dois bancos: textos aparados e números arredondados, sem ordem."""
+    linhas = []
+    for linha in df.itertuples(index=False):
+        linhas.append(tuple(round(float(v), 2) if isinstance(v, (int, float)) and not isinstance(v, bool)
+                            else str(v).rstrip() for v in linha))
+    return sorted(linhas)
+
+
+def _marcar_stamp(caminho, tabelas):
+    """S_T_A_M_P_ nas tabelas sintéticas (o banco do benchmark não tem), como no Protheus com a marca ligada."""
+    import sqlite3
+
+    conn = sqlite3.connect(caminho)
+    try:
+        for tabela in tabelas:
+            conn.execute(f"ALTER TABLE {tabela}010 ADD COLUMN S_T_A_M_P_ TEXT")
+            conn.execute(f"UPDATE {tabela}010 SET S_T_A_M_P_ = '2024-01-01T00:00:00.000'")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _simular_movimento(caminho, novas_notas, taxa_exclusao, semente, taxa_entrega=0.05):
+    """
+    Novas notas no SQLite (cópias das últimas, com R_E_C_N_O_ novos), exclusões
+    lógicas de notas antigas e entregas de pedidos (C6_QTDENT alterado no lugar).
+    """
+    import random
+    import sqlite3
+
+    aleatorio = random.Random(semente)
+    conn = sqlite3.connect(caminho)
+    try:
+        for tabela in ("SF2010", "SD2010"):
+            colunas = [linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela})")]
+            dados = [c for c in colunas if c != "R_E_C_N_O_"]
+            maximo = conn.execute(f"SELECT MAX(R_E_C_N_O_) FROM {tabela}").fetchone()[0]
+            conn.execute(f"INSERT INTO {tabela} ({', '.join(dados)}) SELECT {', '.join(dados)} FROM {tabela} "
+                         f"WHERE R_E_C_N_O_ > ?", (maximo - novas_notas,))
+            excluir = [(recno,) for recno in range(1, maximo + 1) if aleatorio.random() < taxa_exclusao]
+            conn.executemany(f"UPDATE {tabela} SET D_E_L_E_T_ = '*' WHERE R_E_C_N_O_ = ?", excluir)
+        pendentes = conn.execute("SELECT R_E_C_N_O_ FROM SC6010 WHERE C6_QTDENT < C6_QTDVEN").fetchall()
+        entregas = [linha for linha in pendentes if aleatorio.random() < taxa_entrega]
+        conn.executemany("UPDATE SC6010 SET C6_QTDENT = C6_QTDVEN, S_T_A_M_P_ = strftime('%Y-%m-%dT%H:%M:%f', 'now') "
+                         "WHERE R_E_C_N_O_ = ?", entregas)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def comparar_caminhos(escala=5, repeticoes=5, semente=42):
+    """Mesmas agregações no SQLite sintético e na réplica DuckDB: tempos, resultados iguais e sincronização."""
+    import pandas as pd
+
+    from benchmark import carregar_corpus, criar_banco_sintetico, criar_engine_sintetica
+    from pipeline import extrair_blocos_sql
+
+    consultas = []
+    for item in carregar_corpus():
+        for bloco in extrair_blocos_sql(item.get("resposta", "")):
+            if consulta_agregada(bloco) and set(tabelas_da_consulta(bloco)) <= set(TABELAS_REPLICA):
+                consultas.append((item["pergunta"], bloco))
+    consultas += [(f"pesada {i}", sql) for i, sql in enumerate(CONSULTAS_PESADAS, 1)]
+
+    with tempfile.TemporaryDirectory(prefix="replica_protheus_") as pasta:
+        caminho = os.path.join(pasta, "protheus.sqlite")
+        volumes = criar_banco_sintetico(caminho, escala, semente)
+        _marcar_stamp(caminho, ["SC5", "SC6"])
+        engine = criar_engine_sintetica(caminho)
+        replica = ReplicaAnalitica(os.path.join(pasta, "replica"))
+        inicio = time.perf_counter()
+        carga = replica.sincronizar(engine)
+        carga_ms = 1000 * (time.perf_counter() - inicio)
+
+        resultados = []
+        for nome, sql in consultas:
+            tempos_sqlite, tempos_replica = [], []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                with engine.connect() as conn:
+                    df_sqlite = pd.read_sql_query(text(sql), conn)
+                tempos_sqlite.append(time.perf_counter() - inicio)
+                inicio = time.perf_counter()
+                df_replica = replica.executar(sql)
+                tempos_replica.append(time.perf_counter() - inicio)
+            resultados.append({
+                "consulta": nome, "linhas": len(df_sqlite),
+                "sqlite_ms": 1000 * statistics.median(tempos_sqlite),
+                "replica_ms": 1000 * statistics.median(tempos_replica),
+                "iguais": _normalizar_resultado(df_sqlite) == _normalizar_resultado(df_replica),
+            })
+
+        # Sincronização incremental depois de novas notas, exclusões lógicas e entregas (alteração no lugar)
+        _simular_movimento(caminho, novas_notas=200 * escala, taxa_exclusao=0.01, semente=semente)
+        engine.dispose()
+        inicio = time.perf_counter()
+        incremental = replica.sincronizar(engine)
+        incremental_ms = 1000 * (time.perf_counter() - inicio)
+        incremental_ok = True
+        for conferencia in ("SELECT COUNT(*) AS n, SUM(F2_VALBRUT) AS total FROM SF2010 WHERE D_E_L_E_T_ = ' '",
+                            CONSULTAS_PESADAS[1]):
+            with engine.connect() as conn:
+                esperado = pd.read_sql_query(text(conferencia), conn)
+            incremental_ok &= _normalizar_resultado(esperado) == _normalizar_resultado(replica.executar(conferencia))
+        engine.dispose()
+        replica.parar()
+
+    return {
+        "volumes": volumes, "carga_ms": carga_ms, "carga": carga, "consultas": resultados,
+        "incremental_ms": incremental_ms, "incremental": incremental, "incremental_ok": incremental_ok,
+    }
+
+
+def imprimir_comparacao(relatorio):
+    print(f"Linhas: {relatorio['volumes']}")
+    print(f"Carga inicial da réplica: {relatorio['carga_ms']:.0f} ms\n")
+    print(f"{'consulta':<58}{'linhas':>7}{'SQLite ms':>11}{'DuckDB ms':>11}{'ganho':>8}  iguais")
+    for r in relatorio["consultas"]:
+        print(f"{r['consulta'][:57]:<58}{r['linhas']:>7}{r['sqlite_ms']:>11.2f}{r['replica_ms']:>11.2f}"
+              f"{r['sqlite_ms'] / r['replica_ms']:>7.1f}x  {'sim' if r['iguais'] else 'NÃO'}")
+    total_sqlite = sum(r["sqlite_ms"] for r in relatorio["consultas"])
+    total_replica = sum(r["replica_ms"] for r in relatorio["consultas"])
+    print(f"{'total':<65}{total_sqlite:>11.2f}{total_replica:>11.2f}{total_sqlite / total_replica:>7.1f}x")
+    novas = {tabela: (info["novas"], info["alteradas"], info["excluidos"])
+             for tabela, info in relatorio["incremental"].items()
+             if info["novas"] or info["alteradas"] or info["excluidos"]}
+    print(f"\nSincronização incremental: {relatorio['incremental_ms']:.0f} ms (novas, alteradas, excluídas) {novas} — "
+          f"conferência com o banco: {'ok' if relatorio['incremental_ok'] else 'DIVERGENTE'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Réplica analítica DuckDB das tabelas de movimento.")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    benchmark = subcomandos.add_parser("benchmark", help="compara SQLite sintético x réplica")
+    benchmark.add_argument("--escala", type=int, default=5)
+    benchmark.add_argument("--repeticoes", type=int, default=5)
+    benchmark.add_argument("--semente", type=int, default=42)
+    sincronizar = subcomandos.add_parser("sincronizar", help="sincroniza a réplica com o SQL Server")
+    sincronizar.add_argument("--pasta", default=".cache/replica")
+    args = parser.parse_args()
+
+    if args.comando == "benchmark":
+        imprimir_comparacao(comparar_caminhos(args.escala, args.repeticoes, args.semente))
+        return
+
+    from recursos import criar_engine, montar_connection_string
+
+    engine = criar_engine(montar_connection_string(os.environ["PROTHEUS_DB_USER"], os.environ["PROTHEUS_DB_PASS"],
+                                                   os.environ["PROTHEUS_DB_HOST"], os.environ["PROTHEUS_DB_NAME"]))
+    for tabela, info in ReplicaAnalitica(args.pasta).sincronizar(engine).items():
+        print(f"{tabela}: {info}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Verificação de sargabilidade: reescreve predicados que anulam os índices do
+Protheus (YEAR(), MONTH(), LEFT(), SUBSTRING(..., 1, n), RTRIM()) em faixas
+equivalentes e avisa quando nenhum índice do SIX tem prefixo nos filtros.
+
+Autoverificação do corpus antes/depois:  python sargabilidade.py
+"""
+import calendar
+import re
+import sys
+
+from consulta_sql import PADRAO_TABELA_FISICA
+
+# Coluna com ou sem alias (SC5.C5_EMISSAO ou C5_EMISSAO)
+COLUNA = r"((?:[A-Z][A-Z0-9]{2}\.)?[A-Z][A-Z0-9]{1,2}_[A-Z0-9_]+)"
+LITERAL = r"'((?:[^']|'')*)'"
+
+# Funções que, aplicadas a uma coluna, impedem o seek e não foram reescritas
+PADRAO_FUNCAO_EM_COLUNA = re.compile(
+    r"\b(YEAR|MONTH|DAY|LEFT|RIGHT|SUBSTRING|RTRIM|LTRIM|UPPER|LOWER|CONVERT|CAST|DATEPART|ISNULL)\s*\(\s*"
+    + r"(?:[A-Z]+(?:\s*\(\s*\d+\s*\))?\s*,\s*)?" + COLUNA,
+    re.IGNORECASE,
+)
+
+# Índices do SIX010 padrão para as tabelas do dicionário (usados quando o SIX não foi lido)
+INDICES_REFERENCIA = {
+    "SA1": [["A1_FILIAL", "A1_COD", "A1_LOJA"], ["A1_FILIAL", "A1_NOME", "A1_LOJA"], ["A1_FILIAL", "A1_CGC"]],
+    "SA2": [["A2_FILIAL", "A2_COD", "A2_LOJA"], ["A2_FILIAL", "A2_NOME", "A2_LOJA"], ["A2_FILIAL", "A2_CGC"]],
+    "SB1": [["B1_FILIAL", "B1_COD"], ["B1_FILIAL", "B1_TIPO", "B1_COD"], ["B1_FILIAL", "B1_DESC", "B1_COD"]],
+    "SB2": [["B2_FILIAL", "B2_COD", "B2_LOCAL"], ["B2_FILIAL", "B2_LOCAL", "B2_COD"]],
+    "SC5": [["C5_FILIAL", "C5_NUM"], ["C5_FILIAL", "C5_EMISSAO", "C5_NUM"], ["C5_FILIAL", "C5_CLIENTE", "C5_LOJACLI", "C5_NUM"]],
+    "SC6": [["C6_FILIAL", "C6_NUM", "C6_ITEM", "C6_PRODUTO"], ["C6_FILIAL", "C6_PRODUTO", "C6_NUM", "C6_ITEM"]],
+    "SF2": [["F2_FILIAL", "F2_DOC", "F2_SERIE", "F2_CLIENTE", "F2_LOJA"], ["F2_FILIAL", "F2_CLIENTE", "F2_LOJA", "F2_DOC"],
+            ["F2_FILIAL", "F2_EMISSAO", "F2_DOC"]],
+    "SD2": [["D2_FILIAL", "D2_COD", "D2_LOCAL", "D2_NUMSEQ"], ["D2_FILIAL", "D2_DOC", "D2_SERIE", "D2_CLIENTE", "D2_LOJA", "D2_COD", "D2_ITEM"],
+            ["D2_FILIAL", "D2_EMISSAO", "D2_DOC"], ["D2_FILIAL", "D2_PEDIDO", "D2_ITEMPV"]],
+}
+
+# (antes, depois): cada reescrita precisa ser reproduzida exatamente
+CORPUS_REESCRITA = [
+    (
+        "SELECT C5_NUM FROM SC5010 WHERE YEAR(C5_EMISSAO) = 2025 AND C5_FILIAL = '01' AND D_E_L_E_T_ = ' '",
+        "SELECT C5_NUM FROM SC5010 WHERE C5_EMISSAO BETWEEN '20250101' AND '20251231' AND C5_FILIAL = '01' AND D_E_L_E_T_ = ' '",
+    ),
+    (
+        "SELECT SUM(SD2.D2_TOTAL) FROM SD2010 SD2 WHERE YEAR(SD2.D2_EMISSAO) = 2024 AND MONTH(SD2.D2_EMISSAO) = 2 AND SD2.D2_FILIAL = '01'",
+        "SELECT SUM(SD2.D2_TOTAL) FROM SD2010 SD2 WHERE SD2.D2_EMISSAO BETWEEN '20240201' AND '20240229' AND SD2.D2_FILIAL = '01'",
+    ),
+    (
+        "SELECT F2_DOC FROM SF2010 WHERE YEAR(F2_EMISSAO) >= 2024 AND F2_FILIAL = '01'",
+        "SELECT F2_DOC FROM SF2010 WHERE F2_EMISSAO >= '20240101' AND F2_FILIAL = '01'",
+    ),
+    (
+        "SELECT F2_DOC FROM SF2010 WHERE YEAR(F2_EMISSAO) BETWEEN 2023 AND 2024 AND F2_FILIAL = '01'",
+        "SELECT F2_DOC FROM SF2010 WHERE F2_EMISSAO BETWEEN '20230101' AND '20241231' AND F2_FILIAL = '01'",
+    ),
+    (
+        "SELECT D2_DOC FROM SD2010 WHERE LEFT(D2_COD, 3) = 'CIM' AND D2_FILIAL = '01'",
+        "SELECT D2_DOC FROM SD2010 WHERE D2_COD LIKE 'CIM%' AND D2_FILIAL = '01'",
+    ),
+    (
+        "SELECT C5_NUM FROM SC5010 WHERE LEFT(C5_EMISSAO, 6) = '202503' AND C5_FILIAL = '01'",
+        "SELECT C5_NUM FROM SC5010 WHERE C5_EMISSAO BETWEEN '20250301' AND '20250331' AND C5_FILIAL = '01'",
+    ),
+    (
+        "SELECT B1_DESC FROM SB1010 WHERE SUBSTRING(B1_COD, 1, 2) = 'A_' AND B1_FILIAL = ''",
+        "SELECT B1_DESC FROM SB1010 WHERE B1_COD LIKE 'A[_]%' AND B1_FILIAL = ''",
+    ),
+    (
+        "SELECT A1_NOME FROM SA1010 WHERE RTRIM(A1_COD) = '000123' AND A1_FILIAL = ''",
+        "SELECT A1_NOME FROM SA1010 WHERE A1_COD = '000123' AND A1_FILIAL = ''",
+    ),
+    (
+        "SELECT YEAR(C5_EMISSAO) AS ANO, COUNT(*) FROM SC5010 WHERE C5_FILIAL = '01' GROUP BY YEAR(C5_EMISSAO)",
+        "SELECT YEAR(C5_EMISSAO) AS ANO, COUNT(*) FROM SC5010 WHERE C5_FILIAL = '01' GROUP BY YEAR(C5_EMISSAO)",
+    ),
+]
+
+# (SQL, tabelas que devem gerar aviso de índice não usado)
+CORPUS_AVISOS = [
+    ("SELECT D2_DOC FROM SD2010 WHERE D2_FILIAL = '01' AND D2_TES = '501'", ["SD2"]),
+    ("SELECT D2_DOC FROM SD2010 WHERE D2_FILIAL = '01' AND D2_EMISSAO BETWEEN '20250101' AND '20250131'", []),
+    ("SELECT SA1.A1_NOME FROM SF2010 SF2 INNER JOIN SA1010 SA1 ON SA1.A1_COD = SF2.F2_CLIENTE AND SA1.A1_LOJA = SF2.F2_LOJA "
+     "WHERE SF2.F2_FILIAL = '01' AND SF2.F2_DOC = '000001234'", []),
+]
+
+
+def tabela_do_campo(campo):
+    """C5_EMISSAO -> SC5; ZZ1_COD -> ZZ1."""
+    prefixo = campo.split(".")[-1].split("_")[0]
+    return f"S{prefixo}" if len(prefixo) == 2 else prefixo
+
+
+def _escapar_like(valor):
+    return re.sub(r"([%_\[])", r"[\1]", valor)
+
+
+def _ultimo_dia(ano, mes):
+    return calendar.monthrange(ano, mes)[1]
+
+
+class VerificadorSargabilidade:
+    """
+    indices: {tabela: [[campos do índice], ...]} (SIX010, na ordem do índice).
+    mapeamento: dicionário SX3 carregado; identifica os campos de data (tipo D).
+    dicionario: DicionarioSobDemanda; tabelas fora do mapeamento usam os detalhes já lidos.
+    """
+
+    def __init__(self, indices=None, mapeamento=None, dicionario=None):
+        self.indices = indices or INDICES_REFERENCIA
+        self.mapeamento = mapeamento or {}
+        self.dicionario = dicionario
+
+    def _sob_demanda(self, tabela):
+        return self.dicionario.em_cache(tabela) if self.dicionario is not None else None
+
+    def campo_data(self, coluna):
+        """Datas do Protheus são CHAR(8) AAAAMMDD; pelo SX3, ou pelo nome se o SX3 não tiver o campo."""
+        campo = coluna.split(".")[-1]
+        tabela = tabela_do_campo(campo)
+        campos = self.mapeamento.get(tabela) or (self._sob_demanda(tabela) or {}).get("campos", {})
+        descricao = campos.get(campo)
+        if descricao is not None:
+            return descricao.startswith("Tipo: D")
+        return bool(re.search(r"_(EMISSAO|DT[A-Z0-9]*|DATA[A-Z0-9]*|ENTREG|EMIS)$", campo))
+
+    # ---------- Reescritas ----------
+
+    def reescrever(self, sql):
+        """Retorna (sql_reescrito, [descrições das reescritas])."""
+        reescritas = []
+
+        def registrar(antes, depois):
+            reescritas.append(f"{antes.strip()} → {depois}")
+            return depois
+
+        # YEAR(X) = a AND MONTH(X) = m  ->  faixa do mês
+        def ano_e_mes(m):
+            if m.group(1).upper() != m.group(3).upper() or not self.campo_data(m.group(1)):
+                return m.group(0)
+            ano, mes = int(m.group(2)), int(m.group(4))
+            if not 1 <= mes <= 12:
+                return m.group(0)
+            return registrar(m.group(0), f"{m.group(1)} BETWEEN '{ano}{mes:02d}01' AND '{ano}{mes:02d}{_ultimo_dia(ano, mes):02d}'")
+
+        sql = re.sub(
+            r"\bYEAR\s*\(\s*" + COLUNA + r"\s*\)\s*=\s*(\d{4})\s+AND\s+MONTH\s*\(\s*" + COLUNA + r"\s*\)\s*=\s*(\d{1,2})\b",
+            ano_e_mes, sql, flags=re.IGNORECASE,
+        )
+
+        # YEAR(X) BETWEEN a AND b
+        def ano_entre(m):
+            if not self.campo_data(m.group(1)):
+                return m.group(0)
+            return registrar(m.group(0), f"{m.group(1)} BETWEEN '{m.group(2)}0101' AND '{m.group(3)}1231'")
+
+        sql = re.sub(r"\bYEAR\s*\(\s*" + COLUNA + r"\s*\)\s+BETWEEN\s+(\d{4})\s+AND\s+(\d{4})\b", ano_entre, sql, flags=re.IGNORECASE)
+
+        # YEAR(X) op a
+        def ano_comparado(m):
+            coluna, operador, ano = m.group(1), m.group(2), int(m.group(3))
+            if not self.campo_data(coluna):
+                return m.group(0)
+            faixas = {
+                "=": f"{coluna} BETWEEN '{ano}0101' AND '{ano}1231'",
+                ">=": f"{coluna} >= '{ano}0101'",
+                ">": f"{coluna} >= '{ano + 1}0101'",
+                "<=": f"{coluna} <= '{ano}1231'",
+                "<": f"{coluna} < '{ano}0101'",
+            }
+            if operador not in faixas:
+                return m.group(0)
+            return registrar(m.group(0), faixas[operador])
+
+        sql = re.sub(r"\bYEAR\s*\(\s*" + COLUNA + r"\s*\)\s*(>=|<=|<>|=|>|<)\s*(\d{4})\b", ano_comparado, sql, flags=re.IGNORECASE)
+
+        # LEFT(X, n) = 'lit' / SUBSTRING(X, 1, n) = 'lit'
+        def prefixo(m):
+            coluna, tamanho, valor = m.group(1), int(m.group(2)), m.group(3)
+            if len(valor.replace("''", "'")) != tamanho:
+                return m.group(0)
+            if self.campo_data(coluna) and re.fullmatch(r"\d{4}(\d{2})?", valor):
+                if len(valor) == 4:
+                    return registrar(m.group(0), f"{coluna} BETWEEN '{valor}0101' AND '{valor}1231'")
+                ano, mes = int(valor[:4]), int(valor[4:])
+                if 1 <= mes <= 12:
+                    return registrar(m.group(0), f"{coluna} BETWEEN '{valor}01' AND '{valor}{_ultimo_dia(ano, mes):02d}'")
+            return registrar(m.group(0), f"{coluna} LIKE '{_escapar_like(valor)}%'")
+
+        sql = re.sub(r"\bLEFT\s*\(\s*" + COLUNA + r"\s*,\s*(\d+)\s*\)\s*=\s*" + LITERAL, prefixo, sql, flags=re.IGNORECASE)
+        sql = re.sub(r"\bSUBSTRING\s*\(\s*" + COLUNA + r"\s*,\s*1\s*,\s*(\d+)\s*\)\s*=\s*" + LITERAL, prefixo, sql, flags=re.IGNORECASE)
+
+        # RTRIM(X) = 'lit': o SQL Server já ignora espaços à direita na comparação
+        def sem_rtrim(m):
+            return registrar(m.group(0), f"{m.group(1)} = '{m.group(2)}'")
+
+        sql = re.sub(r"\bRTRIM\s*\(\s*" + COLUNA + r"\s*\)\s*=\s*" + LITERAL, sem_rtrim, sql, flags=re.IGNORECASE)
+        return sql, reescritas
+
+    # ---------- Avisos ----------
+
+    def _apelidos(self, sql):
+        """{apelido: tabela lógica} a partir de 'FROM SC5010 SC5' / 'JOIN SA1010 AS A'."""
+        apelidos = {}
+        for fisica, apelido in re.findall(r"\b([A-Z][A-Z0-9]{2}010)\b(?:\s+AS)?(?:\s+([A-Z][A-Z0-9_]*))?", sql.upper()):
+            tabela = fisica[:3]
+            apelidos[tabela] = tabela
+            if apelido and apelido not in ("WHERE", "INNER", "LEFT", "RIGHT", "JOIN", "ON", "GROUP", "ORDER", "WITH", "FULL", "CROSS"):
+                apelidos[apelido] = tabela
+        return apelidos
+
+    def colunas_filtradas(self, sql):
+        """Colunas com predicado sargável (=, faixas, IN, LIKE 'prefixo%', igualdade de join), por tabela."""
+        sem_literais = re.sub(LITERAL, "'?'", sql.upper())
+        apelidos = self._apelidos(sql)
+        candidatas = []
+        candidatas += re.findall(COLUNA + r"\s*(?:=|>=|<=|>|<)\s*(?:'|\d|" + COLUNA + r")", sem_literais)
+        candidatas += [(c, "") for c in re.findall(COLUNA + r"\s+(?:BETWEEN|IN\s*\()", sem_literais)]
+        candidatas += [(c, "") for c in re.findall(r"(?:=|>=|<=|>|<)\s*" + COLUNA, sem_literais)]
+        like = re.findall(COLUNA + r"\s+LIKE\s+" + LITERAL, sql.upper())
+        candidatas += [(c, "") for c, valor in like if valor and valor[0] not in "%_["]
+
+        filtradas = {}
+        for grupo in candidatas:
+            for coluna in grupo:
+                if not coluna:
+                    continue
+                if "." in coluna:
+                    apelido, campo = coluna.split(".", 1)
+                    tabela = apelidos.get(apelido, tabela_do_campo(campo))
+                else:
+                    campo, tabela = coluna, tabela_do_campo(coluna)
+                filtradas.setdefault(tabela, set()).add(campo)
+        return filtradas
+
+    def avisos(self, sql):
+        avisos = []
+        for funcao, coluna in PADRAO_FUNCAO_EM_COLUNA.findall(self._clausulas_de_filtro(sql)):
+            avisos.append(f"{funcao.upper()}({coluna}) no filtro impede o uso de índice em {coluna.split('.')[-1]}.")
+
+        filtradas = self.colunas_filtradas(sql)
+        for tabela in sorted(set(PADRAO_TABELA_FISICA.findall(sql.upper()))):
+            indices = self.indices.get(tabela) or (self._sob_demanda(tabela) or {}).get("indices")
+            if not indices:
+                continue
+            campos = filtradas.get(tabela, set())
+            if not any(self._usa_prefixo(indice, campos) for indice in indices):
+                chaves = "; ".join("+".join(indice) for indice in indices)
+                avisos.append(f"{tabela}: nenhum filtro usa o prefixo de um índice do SIX ({chaves}).")
+        return avisos
+
+    @staticmethod
+    def _usa_prefixo(indice, campos):
+        """A filial abre todos os índices do Protheus; o prefixo útil é o primeiro campo depois dela."""
+        for campo in indice:
+            if campo.endswith("_FILIAL"):
+                continue
+            return campo in campos
+        return bool(indice) and indice[0] in campos
+
+    @staticmethod
+    def _clausulas_de_filtro(sql):
+        """Texto de WHERE/ON/HAVING (sem a lista do SELECT e o GROUP BY)."""
+        trechos = re.split(r"\b(WHERE|ON|HAVING|GROUP\s+BY|ORDER\s+BY|SELECT|FROM|JOIN)\b", sql, flags=re.IGNORECASE)
+        filtros, dentro = [], False
+        for trecho in trechos:
+            palavra = re.sub(r"\s+", " ", trecho.strip().upper())
+            if palavra in ("WHERE", "ON", "HAVING"):
+                dentro = True
+            elif palavra in ("GROUP BY", "ORDER BY", "SELECT", "FROM", "JOIN"):
+                dentro = False
+            elif dentro:
+                filtros.append(trecho)
+        return " ".join(filtros)
+
+    def otimizar(self, sql):
+        """Retorna (sql_reescrito, reescritas, avisos)."""
+        reescrito, reescritas = self.reescrever(sql)
+        return reescrito, reescritas, self.avisos(reescrito)
+
+
+if __name__ == "__main__":
+    verificador = VerificadorSargabilidade()
+    falhas = 0
+    for antes, esperado in CORPUS_REESCRITA:
+        obtido, _ = verificador.reescrever(antes)
+        if obtido != esperado:
+            falhas += 1
+            print(f"FALHOU\n  antes:    {antes}\n  esperado: {esperado}\n  obtido:   {obtido}")
+    for sql, esperadas in CORPUS_AVISOS:
+        avisadas = sorted(a.split(":")[0] for a in verificador.avisos(sql) if "prefixo" in a)
+        if avisadas != esperadas:
+            falhas += 1
+            print(f"FALHOU (avisos)\n  sql: {sql}\n  esperado: {esperadas}\n  obtido:   {avisadas}")
+    total = len(CORPUS_REESCRITA) + len(CORPUS_AVISOS)
+    print(f"{total - falhas}/{total} casos do corpus conferem.")
+    sys.exit(1 if falhas else 0)
@@ -0,0 +1,94 @@
+"""
+API HTTP do chatbot (sem Streamlit), para bots e outras ferramentas internas.
+
+    PROTHEUS_DB_HOST=... PROTHEUS_DB_NAME=... PROTHEUS_DB_USER=... PROTHEUS_DB_PASS=... \\
+    GOOGLE_API_KEY=... uvicorn servico:app --port 8000
+
+Rode com um único worker: os caches e a coalescência de perguntas são do processo.
+Opcionais: MOTOR_MAX_LLM, MOTOR_MAX_BANCO, SQL_TIMEOUT, CACHE_CONTEXTO=0.
+
+    POST /perguntas          {"pergunta": "...", "historico": ""}
+    POST /consultas/pagina   {"consulta_id": "...", "offset": 50}   (id devolvido em /perguntas)
+    GET  /saude, /estatisticas
+"""
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import BaseModel, Field
+
+from motor import MAX_CHAMADAS_LLM, MAX_CONSULTAS_BANCO, MotorProtheus, dataframe_para_json, montar_pipeline_producao
+from pipeline import ConsultaBloqueada
+from rastreamento import Rastreador
+
+
+class Pergunta(BaseModel):
+    pergunta: str = Field(min_length=1, max_length=2000)
+    historico: str = Field("", max_length=20000)
+
+
+class Pagina(BaseModel):
+    consulta_id: str = Field(min_length=1, max_length=64)
+    offset: int = Field(0, ge=0)
+
+
+def motor_do_ambiente():
+    """Motor de produção configurado pelas variáveis de ambiente (ver docstring do módulo)."""
+    try:
+        pipeline = montar_pipeline_producao(
+            os.environ["PROTHEUS_DB_HOST"], os.environ["PROTHEUS_DB_NAME"], os.environ["PROTHEUS_DB_USER"],
+            os.environ["PROTHEUS_DB_PASS"], os.environ["GOOGLE_API_KEY"],
+            cache_contexto=os.environ.get("CACHE_CONTEXTO", "1") != "0",
+            timeout_consulta=int(os.environ.get("SQL_TIMEOUT", 30)),
+        )
+    except KeyError as e:
+        raise RuntimeError(f"Variável de ambiente {e} não configurada.") from None
+    return MotorProtheus(
+        pipeline,
+        max_llm=int(os.environ.get("MOTOR_MAX_LLM", MAX_CHAMADAS_LLM)),
+        max_banco=int(os.environ.get("MOTOR_MAX_BANCO", MAX_CONSULTAS_BANCO)),
+        rastreador=Rastreador(caminho=".cache/rastros/rastros_api.jsonl"),
+    )
+
+
+def criar_app(fabrica_motor=motor_do_ambiente):
+    """`fabrica_motor` roda no startup; o teste de carga injeta um motor com banco e LLM locais."""
+
+    @asynccontextmanager
+    async def ciclo_de_vida(app):
+        app.state.motor = fabrica_motor()
+        try:
+            yield
+        finally:
+            app.state.motor.fechar()
+
+    app = FastAPI(title="Chatbot Protheus", lifespan=ciclo_de_vida)
+
+    @app.get("/saude")
+    async def saude():
+        return {"status": "ok"}
+
+    @app.get("/estatisticas")
+    async def estatisticas(request: Request):
+        return request.app.state.motor.estatisticas()
+
+    @app.post("/perguntas")
+    async def perguntar(corpo: Pergunta, request: Request):
+        return await request.app.state.motor.responder(corpo.pergunta, corpo.historico)
+
+    @app.post("/consultas/pagina")
+    async def pagina(corpo: Pagina, request: Request):
+        """Próximas linhas de uma consulta já respondida em /perguntas (mesma validação e governador)."""
+        try:
+            df, ha_mais, limite_governador = await request.app.state.motor.executar_pagina(corpo.consulta_id,
+                                                                                        corpo.offset)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Consulta não encontrada ou expirada: refaça a pergunta.")
+        except ConsultaBloqueada as ve:
+            raise HTTPException(status_code=400, detail=f"Consulta bloqueada: {ve}")
+        return {"resultado": dataframe_para_json(df), "ha_mais": ha_mais, "limite_governador": limite_governador}
+
+    return app
+
+
+app = criar_app()
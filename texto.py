@@ -0,0 +1,42 @@
+import re
+import unicodedata
+
+# Palavras que não mudam o sentido de uma pergunta de dados
+PALAVRAS_VAZIAS = {
+    "a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "no", "na",
+    "nos", "nas", "um", "uma", "por", "para", "pra", "com", "que", "me", "qual",
+    "quais", "mostre", "mostrar", "mostra", "liste", "listar", "lista", "traga",
+    "trazer", "exiba", "exibir", "informe", "quero", "ver", "favor", "poderia",
+    "pode", "gostaria", "sobre", "ao", "aos", "se",
+}
+
+
+def normalizar_texto(texto):
+    """Minúsculas, sem acentos, sem pontuação e com espaços simples."""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"[^a-z0-9_ ]+", " ", texto.lower())
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def tokenizar(texto):
+    """
+    Tokens significativos de uma pergunta: sem palavras vazias
+    e com o plural simples removido ("pedidos" -> "pedido").
+    """
+    tokens = []
+    for token in normalizar_texto(texto).split():
+        if token in PALAVRAS_VAZIAS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.isdigit():
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def estimar_tokens(texto):
+    """
+    Estimativa local de tokens (~4 caracteres por token), suficiente para
+    comparar tamanhos de prompt sem chamar a API de contagem do Gemini.
+    """
+    return (len(texto or "") + 3) // 4